@@ -0,0 +1,129 @@
+import os
+import threading
+
+from cache import QUOTE_CACHE_TTL, history_cache
+from history_plan import record_download
+from ratelimit import rate_limiter
+from replay import recorder
+from resilience import PROVIDER_TIMEOUT
+from tracing import span
+
+# -----------------------------------------
+# **🔹 BATCHED YAHOO HISTORY**
+# -----------------------------------------
+
+# yf.download runs through multitasking, whose pool is sized by CPU count when first created
+# (and runs serially below 2 cores). Downloads are I/O-bound, so install a wider pool first.
+YAHOO_BATCH_THREADS = int(os.getenv("YAHOO_BATCH_THREADS", "16"))
+
+# yf.download keeps its results in module-level state, so overlapping calls corrupt each other
+_download_lock = threading.Lock()
+_pool_ready = False
+
+
+def _yfinance():
+    """Imports yfinance on first use and installs the wide download pool once."""
+    global _pool_ready
+    import multitasking
+    import yfinance as yf
+    if not _pool_ready:
+        multitasking.createPool("yahoo-batch", threads=YAHOO_BATCH_THREADS)
+        _pool_ready = True
+    return yf, multitasking
+
+
+def history_ttl(period):
+    """Intraday-fresh periods such as "1d" stand in for quotes and expire with them."""
+    return QUOTE_CACHE_TTL if period == "1d" else None
+
+
+def to_exchange_tz(frame, tz):
+    """`frame` indexed in its exchange time zone `tz`, as yf.Ticker(t).history() returns it."""
+    if frame.empty or not tz:
+        return frame
+    index = frame.index
+    # A naive index holds exchange-local timestamps; an aware one (UTC after a multi-ticker
+    # concat) is converted
+    frame = frame.copy()
+    frame.index = index.tz_localize(tz) if index.tz is None else index.tz_convert(tz)
+    return frame
+
+
+def split_download(data, tickers, timezones=None):
+    """Splits a group_by="ticker" yf.download frame into one frame per ticker.
+
+    For several tickers yf.download re-indexes the combined frame to UTC; with
+    `timezones` ({ticker: exchange tz}) each frame is converted back so cache
+    entries look the same whichever path fetched them.
+    """
+    import pandas as pd
+    timezones = timezones or {}
+    if len(tickers) == 1:
+        return {tickers[0]: to_exchange_tz(data, timezones.get(tickers[0]))}
+    frames = {}
+    for ticker in tickers:
+        if ticker in data.columns.get_level_values(0):
+            # Concatenation aligns every ticker on one calendar; drop the padding rows again
+            frames[ticker] = to_exchange_tz(data[ticker].dropna(how="all"), timezones.get(ticker))
+        else:
+            frames[ticker] = pd.DataFrame()
+    return frames
+
+
+def _download(tickers, period):
+    """One yf.download call split per ticker; recorded/replayed per ticker like single fetches."""
+    if recorder.mode == "replay":
+        recorder.simulate_latency("Yahoo")  # The batch is one parallel round trip
+        return {t: recorder.load("Yahoo", ["history", t, period]) for t in tickers}
+
+    with span("yfinance.download", tickers=len(tickers), period=period), _download_lock:
+        yf, multitasking = _yfinance()
+        # ignore_tz=False keeps real timestamps through the concat instead of re-labelling
+        # exchange-local midnights as UTC
+        data = yf.download(tickers, period=period, group_by="ticker", auto_adjust=True,
+                           actions=True, threads=True, progress=False, timeout=PROVIDER_TIMEOUT,
+                           ignore_tz=False)
+        # yf.download keeps each ticker's own (exchange time zone) frame until the next call
+        timezones = {t: getattr(frame.index, "tz", None) for t, frame in yf.shared._DFS.items()
+                     if frame is not None}
+        # multitasking never forgets finished threads; drop them so the list stays small
+        multitasking.config["TASKS"] = multitasking.get_active_tasks()
+    frames = split_download(data, tickers, timezones)
+    if recorder.mode == "record":
+        for ticker, frame in frames.items():
+            recorder.save("Yahoo", ["history", ticker, period], frame)
+    return frames
+
+
+def fetch_history_batch(tickers, period="6mo"):
+    """Returns {ticker: history frame}, downloading every uncached ticker in one threaded call.
+
+    Frames match yf.Ticker(t).history(period=period) (adjusted prices with
+    Dividends/Stock Splits, indexed in the ticker's exchange time zone) and are
+    stored in the history cache.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    frames = {}
+    missing = []
+    for ticker in tickers:
+        cached = history_cache.get((ticker, period))
+        if cached is not None:
+            frames[ticker] = cached
+        else:
+            missing.append(ticker)
+    if not missing:
+        return frames
+
+    if not rate_limiter.acquire("Yahoo"):
+        import pandas as pd
+        for ticker in missing:
+            stale = history_cache.get((ticker, period), allow_stale=True)
+            frames[ticker] = stale if stale is not None else pd.DataFrame()
+        return frames
+
+    for ticker, frame in _download(missing, period).items():
+        record_download(frame, "batch")
+        if not frame.empty:
+            history_cache.set((ticker, period), frame, ttl=history_ttl(period))
+        frames[ticker] = frame
+    return frames
@@ -0,0 +1,133 @@
+"""Microbenchmarks for the analytics in collect_advanced_analytics.
+
+Times calculate_moving_averages, calculate_rsi, calculate_bollinger_bands,
+monte_carlo_simulation and calculate_beta on synthetic daily series of
+100, 10k and 1M bars, and records peak allocation with tracemalloc.
+
+    python benchmarks/bench_analytics.py --out analytics.json
+    python benchmarks/bench_analytics.py --compare analytics.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic_history(bars, seed=42):
+    """Geometric random walk shaped like yf.Ticker().history output."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0.0003, 0.015, bars))
+    # A million daily bars would start before pandas' minimum Timestamp (1677)
+    index = pd.date_range(end="2024-06-28", periods=bars, freq="min" if bars > 50_000 else "D")
+    return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99,
+                         "Close": close, "Volume": rng.integers(1_000_000, 5_000_000, bars)},
+                        index=index)
+
+
+def load_cases(app_module, history_cache, sizes):
+    """Returns [(name, bars, fn)]; calculate_beta reads its two series from the history cache."""
+    cases = []
+    for bars in sizes:
+        frame = synthetic_history(bars)
+        benchmark = synthetic_history(bars, seed=7)
+        ticker = f"BENCH{bars}"
+
+        def beta(ticker=ticker, frame=frame, benchmark=benchmark):
+            # Re-seed each call: entries may have been evicted or expired between runs
+            history_cache.set((ticker, "6mo"), frame)
+            history_cache.set(("^GSPC", "6mo"), benchmark)
+            return app_module.calculate_beta(ticker)
+
+        cases += [
+            ("calculate_moving_averages", bars, lambda f=frame: app_module.calculate_moving_averages(f)),
+            ("calculate_rsi", bars, lambda f=frame: app_module.calculate_rsi(f)),
+            ("calculate_bollinger_bands", bars, lambda f=frame: app_module.calculate_bollinger_bands(f)),
+            ("monte_carlo_simulation", bars, lambda f=frame: app_module.monte_carlo_simulation(f)),
+            ("calculate_beta", bars, beta),
+        ]
+    return cases
+
+
+def measure(fn, repeats, min_time):
+    """Best-of timing in ms (loops until min_time per repeat) plus peak traced allocation in KiB."""
+    fn()  # Warm-up
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - start >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        timings.append((time.perf_counter() - start) / loops * 1000)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"min_ms": min(timings), "median_ms": statistics.median(timings),
+            "loops": loops, "peak_kib": peak / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,10000,1000000")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed repeat")
+    parser.add_argument("--filter", default="", help="Only run functions containing this text")
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import main as app_module
+    from cache import history_cache
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = {}
+    print(f"{'function':<28} {'bars':>9} {'min ms':>10} {'median ms':>10} {'peak KiB':>10}")
+    for name, bars, fn in load_cases(app_module, history_cache, sizes):
+        if args.filter not in name:
+            continue
+        stats = measure(fn, args.repeats, args.min_time)
+        results[f"{name}[{bars}]"] = stats
+        print(f"{name:<28} {bars:>9} {stats['min_ms']:>10.3f} {stats['median_ms']:>10.3f} {stats['peak_kib']:>10.1f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"sizes": sizes, "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressed = False
+        print("\nAgainst baseline (min ms, peak KiB):")
+        for key, stats in results.items():
+            old = baseline.get(key)
+            if not old:
+                continue
+            change = (stats["min_ms"] - old["min_ms"]) / old["min_ms"]
+            flag = "  REGRESSION" if change > args.threshold else ""
+            regressed |= bool(flag)
+            print(f"  {key:<40} {old['min_ms']:>10.3f} -> {stats['min_ms']:>10.3f} ({change:+.0%})"
+                  f"  {old['peak_kib']:>10.1f} -> {stats['peak_kib']:>10.1f}{flag}")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Reading period="max" histories: cached DataFrame decode vs the memory-mapped archive.
+
+For a synthetic history of B daily bars, times
+  - decoding the whole frame from a shared cache entry (codec.loads), which
+    is what a period="max" history cache hit costs on the sqlite/redis backends;
+  - opening the archive and taking a one-year range as a zero-copy view;
+  - the same range copied into a DataFrame (fetch_historical_data_from_yahoo_finance);
+  - a nearest-date lookup (binary search of the date index).
+
+    python benchmarks/bench_archive.py --bars 11000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import codec  # noqa: E402
+from bench_cache import yahoo_like_history  # noqa: E402
+from history_archive import HistoryArchive  # noqa: E402
+
+
+def best_us(fn, repeats, loops):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bars", type=int, default=11000, help="11000 daily bars is ~44 years, AAPL's max")
+    parser.add_argument("--price-dtype", default="float64", choices=["float64", "float32"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--loops", type=int, default=200)
+    args = parser.parse_args()
+
+    # Daily bars back from 2024 stay within pandas' Timestamp range up to ~80k bars
+    frame = yahoo_like_history(args.bars)
+    blob = codec.dumps(frame)
+    start = str(frame.index[-252].date())
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = HistoryArchive(tmp, price_dtype=args.price_dtype)
+        archive.sync("BENCH", frame, today="2100-01-01")
+        files = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+        view = archive.open("BENCH")
+        rows = [
+            ("decode whole cached frame", best_us(lambda: codec.loads(blob), args.repeats, args.loops)),
+            ("archive: open + 1y view", best_us(lambda: archive.open("BENCH").slice(start), args.repeats, args.loops)),
+            ("archive: 1y DataFrame", best_us(lambda: archive.open("BENCH").to_frame(start),
+                                              args.repeats, args.loops)),
+            ("archive: nearest-date lookup", best_us(lambda: view.bounds(start, start),
+                                                     args.repeats, args.loops)),
+        ]
+    print(f"{args.bars} bars; cache entry {len(blob)} B, archive files {files} B ({args.price_dtype})")
+    for name, us in rows:
+        print(f"  {name:<30} {us:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Per-ticker yf.Ticker().history loop vs one batched yf.download, offline.
+
+Yahoo is replaced by a canned-response stub that sleeps --latency-ms per
+history request, so the numbers reflect request fan-out, not the network.
+
+    python benchmarks/bench_batch_history.py --latency-ms 120
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from yfinance.base import TickerBase
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_history import fetch_history_batch  # noqa: E402
+from cache import history_cache  # noqa: E402
+
+BENCHMARK = "^GSPC"
+
+
+def canned_history(rows=126, seed=0):
+    """Six months of daily bars shaped like Ticker.history(auto_adjust=True, actions=True)."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, rows))
+    index = pd.bdate_range(end="2024-06-28", periods=rows, tz="America/New_York", name="Date")
+    return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                         "Volume": rng.integers(1_000_000, 5_000_000, rows),
+                         "Dividends": 0.0, "Stock Splits": 0.0}, index=index)
+
+
+def install_stub(latency):
+    frame = canned_history()
+
+    def history(self, *args, **kwargs):
+        time.sleep(latency)
+        return frame.copy()
+
+    TickerBase.history = history
+
+
+def run_loop(tickers):
+    return {t: yf.Ticker(t).history(period="6mo") for t in tickers + [BENCHMARK]}
+
+
+def run_batch(tickers):
+    history_cache.clear()
+    return fetch_history_batch(tickers + [BENCHMARK], period="6mo")
+
+
+def best_of(fn, tickers, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(tickers)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=120.0)
+    parser.add_argument("--sizes", default="1,5,25")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    install_stub(args.latency_ms / 1000.0)
+    universe = [f"T{i:03d}" for i in range(max(int(n) for n in args.sizes.split(",")))]
+    results = []
+    print(f"{'tickers':>8} {'loop ms':>10} {'batch ms':>10} {'speedup':>8}")
+    for size in (int(n) for n in args.sizes.split(",")):
+        tickers = universe[:size]
+        loop = best_of(run_loop, tickers, args.repeats)
+        batch = best_of(run_batch, tickers, args.repeats)
+        results.append({"tickers": size, "loop_ms": loop * 1000, "batch_ms": batch * 1000})
+        print(f"{size:>8} {loop * 1000:>10.1f} {batch * 1000:>10.1f} {loop / batch:>7.1f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
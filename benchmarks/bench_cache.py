@@ -0,0 +1,115 @@
+"""Cache backend and value-encoding costs: memory vs SQLite vs Redis, codec vs pickle.
+
+Times get/set of a quote dict and of 6mo (126 bars) and max (10k bars)
+histories on each backend. Redis runs against --redis-url, or an in-process
+fake server (benchmarks/fake_redis.py) when none is given. Also reports the
+encoded size and encode/decode time of a history with codec.dumps against
+pickle.
+
+    python benchmarks/bench_cache.py
+    python benchmarks/bench_cache.py --redis-url redis://localhost:6379/0 --out cache.json
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import codec  # noqa: E402
+from bench_analytics import synthetic_history  # noqa: E402
+from cache import RedisTTLCache, SQLiteTTLCache, TTLCache  # noqa: E402
+from fake_redis import FakeRedisServer  # noqa: E402
+
+QUOTE = {"source": "Yahoo Finance", "price": 189.84, "volume": 48_123_000, "high": 190.32,
+         "low": 188.19, "open": 189.26, "timestamp": "2024-06-28 00:00:00"}
+
+
+def yahoo_like_history(bars):
+    """synthetic_history with yfinance's exchange-local index and corporate-action columns."""
+    frame = synthetic_history(bars).tz_localize("America/New_York")
+    frame["Dividends"] = 0.0
+    frame["Stock Splits"] = 0.0
+    return frame
+
+
+def best_us(fn, repeats, loops):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best * 1e6
+
+
+def bench_backend(cache, values, repeats, loops):
+    rows = {}
+    for label, value in values.items():
+        key = ("BENCH", label)
+        set_us = best_us(lambda: cache.set(key, value), repeats, loops)
+        get_us = best_us(lambda: cache.get(key), repeats, loops)
+        rows[label] = {"set_us": set_us, "get_us": get_us}
+    return rows
+
+
+def bench_codec(frame, repeats, loops):
+    encoded = codec.dumps(frame)
+    pickled = pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)
+    assert codec.loads(encoded).equals(frame)
+    return {
+        "codec_bytes": len(encoded), "pickle_bytes": len(pickled),
+        "codec_encode_us": best_us(lambda: codec.dumps(frame), repeats, loops),
+        "pickle_encode_us": best_us(lambda: pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL),
+                                    repeats, loops),
+        "codec_decode_us": best_us(lambda: codec.loads(encoded), repeats, loops),
+        "pickle_decode_us": best_us(lambda: pickle.loads(pickled), repeats, loops),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--loops", type=int, default=200)
+    parser.add_argument("--redis-url", help="Real Redis-compatible server; default is the fake")
+    parser.add_argument("--out", help="Write results JSON here")
+    args = parser.parse_args()
+
+    values = {"quote": QUOTE, "history_6mo": yahoo_like_history(126),
+              "history_max": yahoo_like_history(10_000)}
+    redis_url = args.redis_url or FakeRedisServer().start().url
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": TTLCache("bench", 60),
+            "sqlite": SQLiteTTLCache("bench", 60, path=os.path.join(tmp, "cache.sqlite3")),
+            "redis" if args.redis_url else "redis (fake)": RedisTTLCache("bench", 60, url=redis_url),
+        }
+        report = {"backends": {name: bench_backend(cache, values, args.repeats, args.loops)
+                               for name, cache in backends.items()}}
+        backends["redis" if args.redis_url else "redis (fake)"].clear()
+
+    print(f"{'backend':<14} {'value':<12} {'set us':>10} {'get us':>10}")
+    for name, rows in report["backends"].items():
+        for label, row in rows.items():
+            print(f"{name:<14} {label:<12} {row['set_us']:>10.1f} {row['get_us']:>10.1f}")
+
+    report["codec"] = {label: bench_codec(values[label], args.repeats, max(1, args.loops // 4))
+                       for label in ("history_6mo", "history_max")}
+    print(f"\n{'history':<12} {'codec B':>10} {'pickle B':>10} {'enc us':>16} {'dec us':>16}")
+    for label, row in report["codec"].items():
+        print(f"{label:<12} {row['codec_bytes']:>10} {row['pickle_bytes']:>10} "
+              f"{row['codec_encode_us']:>7.1f} /{row['pickle_encode_us']:>7.1f} "
+              f"{row['codec_decode_us']:>7.1f} /{row['pickle_decode_us']:>7.1f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Cold-start cost of the app: `import main` and the first request in a fresh interpreter.
+
+Runs `python -X importtime -c "import main"` in new processes, reports the
+median total import time and the heaviest modules, and optionally times the
+first /generate-response (stub LLM, synthetic providers), where deferred
+imports are paid instead.
+
+    python benchmarks/bench_import.py --out import.json
+    python benchmarks/bench_import.py --first-request --compare import.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+FIRST_REQUEST = """
+import sys, time
+sys.path.insert(0, {bench_dir!r})
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from bench_pipeline import install_synthetic_providers
+install_synthetic_providers({{}}, ["AAPL"])
+patched = time.perf_counter()
+main.app.test_client().post("/generate-response", json={{"query": "Should I buy Apple for the long term?"}})
+done = time.perf_counter()
+# Stubbing imports yfinance, which a real first request would pay for, so the total includes it
+print("TIMES", imported - start, done - patched, done - start)
+"""
+
+
+def env():
+    environment = dict(os.environ, LLM_BACKEND="stub", PREFETCH_ENABLED="0", LOG_LEVEL="WARNING")
+    environment.pop("PYTHONPROFILEIMPORTTIME", None)
+    return environment
+
+
+def import_profile():
+    """One fresh `import main`; returns (total microseconds, {module: (self us, cumulative us)})."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=ROOT, env=env(), capture_output=True, text=True, check=True)
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        modules[name] = (int(self_us), int(cumulative_us))
+        if name == "main":
+            total = int(cumulative_us)
+    return total, modules
+
+
+def first_request():
+    """Seconds for `import main`, the first request, and both plus stubbing, in a fresh interpreter."""
+    code = FIRST_REQUEST.format(bench_dir=BENCH_DIR)
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env(),
+                            capture_output=True, text=True, check=True)
+    line = next(l for l in result.stdout.splitlines() if l.startswith("TIMES"))
+    return tuple(float(x) for x in line.split()[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15, help="Heaviest modules to list")
+    parser.add_argument("--first-request", action="store_true", help="Also time the first request")
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    totals = []
+    modules = {}
+    for _ in range(args.runs):
+        total, run_modules = import_profile()
+        totals.append(total / 1000.0)
+        modules = run_modules  # The last (warm page cache) run gives the module breakdown
+    report = {"import_main_ms": statistics.median(totals), "runs": args.runs,
+              "heaviest": sorted(((name, cum / 1000.0) for name, (_, cum) in modules.items()
+                                  if name != "main"), key=lambda m: -m[1])[:args.top]}
+    print(f"import main: median {report['import_main_ms']:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f})")
+    print("Heaviest imports (cumulative ms):")
+    for name, ms in report["heaviest"]:
+        print(f"  {name:<40} {ms:>8.1f}")
+
+    if args.first_request:
+        samples = [first_request() for _ in range(max(1, args.runs // 2))]
+        report["first_request_ms"] = statistics.median(r for _, r, _ in samples) * 1000
+        report["import_to_first_response_ms"] = statistics.median(t for _, _, t in samples) * 1000
+        print(f"first request: median {report['first_request_ms']:.1f} ms; "
+              f"import + first request {report['import_to_first_response_ms']:.1f} ms")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = False
+        for key in ("import_main_ms", "first_request_ms", "import_to_first_response_ms"):
+            if key in baseline and key in report:
+                change = (report[key] - baseline[key]) / baseline[key]
+                flag = "  REGRESSION" if change > args.threshold else ""
+                regressed |= bool(flag)
+                print(f"{key:<30} {baseline[key]:>8.1f} -> {report[key]:>8.1f} ({change:+.0%}){flag}")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
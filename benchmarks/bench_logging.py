@@ -0,0 +1,157 @@
+"""Request-thread cost of the old print() logging versus the queued structured logger.
+
+Each simulated request logs what /generate-response logs: the query, the
+extracted tickers, and the real-time and analytics payloads for a few tickers.
+Output goes to a file (or --sink-delay-ms per write to mimic a slow terminal
+or pipe), and only the time spent on the calling threads is measured.
+
+    python benchmarks/bench_logging.py --tickers 5 --requests 2000 --threads 8
+"""
+import argparse
+import io
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import logs  # noqa: E402
+
+
+class SlowFile(io.TextIOBase):
+    """File wrapper that sleeps on every write, like a terminal that cannot keep up."""
+
+    def __init__(self, f, delay):
+        self.f = f
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.f.write(text)
+
+    def flush(self):
+        self.f.flush()
+
+
+def payloads(n_tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    tickers = [f"TCK{i}" for i in range(n_tickers)]
+    real_time = {t: {"Yahoo": {"source": "Yahoo Finance", "price": np.float64(rng.uniform(10, 500)),
+                               "volume": np.int64(rng.integers(1e5, 1e7)), "high": np.float64(1.0),
+                               "low": np.float64(1.0), "open": np.float64(1.0),
+                               "timestamp": "2024-06-28 00:00:00"},
+                     "Polygon": {"source": "Polygon.io", "price": float(rng.uniform(10, 500)),
+                                 "volume": 1000000, "high": 1.0, "low": 1.0, "open": 1.0,
+                                 "timestamp": "2024-06-28 00:00:00"}} for t in tickers}
+    analytics = {t: {"Moving Averages": {"SMA_50": np.float64(1.0), "SMA_200": np.float64(1.0)},
+                     "RSI": np.float64(rng.uniform(0, 100)),
+                     "Monte Carlo Simulation": {"5th Percentile": np.float64(1.0),
+                                                "50th Percentile (Median)": np.float64(1.0),
+                                                "95th Percentile": np.float64(1.0)},
+                     "Beta Coefficient": 1.1,
+                     "Bollinger Bands": {"Upper Band": np.float64(1.0), "Lower Band": np.float64(1.0)}}
+                 for t in tickers}
+    return "Compare " + " and ".join(tickers) + " for the long term", tickers, real_time, analytics
+
+
+def print_request(out, query, tickers, real_time, analytics):
+    # The statements main.py used to run on every request
+    print("Extracting tickers:", query, file=out)
+    print("Extracted tickers:", tickers, file=out)
+    print("Collected real-time data:", real_time, file=out)
+    print("Extracting tickers:", query, file=out)
+    print("Extracted tickers:", tickers, file=out)
+    print("Collected advanced analytics data:", analytics, file=out)
+
+
+def logging_request(logger, query, tickers, real_time, analytics):
+    for payload_message, payload in (("Collected real-time data", real_time),
+                                     ("Collected advanced analytics data", analytics)):
+        logger.debug("Extracted tickers", extra={"tickers": tickers, "query_chars": len(query)})
+        logs.log_payload(logger, payload_message, payload)
+
+
+def configure(name, stream, queued, level):
+    logger = logging.getLogger(f"bench.{name}")
+    logger.propagate = False
+    logger.setLevel(level)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logs.JSONFormatter())
+    if not queued:
+        logger.handlers = [handler]
+        return logger, None
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    logger.handlers = [logs.DeferredQueueHandler(records)]
+    return logger, listener
+
+
+def run(fn, n_requests, threads):
+    """Returns mean and p99 per-request milliseconds spent on the request threads."""
+    spent = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        with lock:
+            spent.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(n_requests)))
+    spent.sort()
+    return {"mean_ms": sum(spent) / len(spent) * 1000, "p99_ms": spent[int(0.99 * (len(spent) - 1))] * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--sink-delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    query, tickers, real_time, analytics = payloads(args.tickers)
+    with tempfile.TemporaryFile("w+") as raw:
+        sink = SlowFile(raw, args.sink_delay_ms / 1000.0)
+        lock = threading.Lock()
+
+        def printed():
+            with lock:  # sys.stdout is shared; print() holds its buffer lock the same way
+                print_request(sink, query, tickers, real_time, analytics)
+
+        cases = [("print (before)", printed, None, None)]
+        for name, queued, level, rate in (("logging sync, all payloads", False, logging.DEBUG, 1.0),
+                                          ("logging queued, all payloads", True, logging.DEBUG, 1.0),
+                                          ("logging queued, 1% payloads", True, logging.DEBUG, 0.01),
+                                          ("logging queued, INFO level", True, logging.INFO, 0.01)):
+            logger, listener = configure(name, sink, queued, level)
+            cases.append((name, lambda lg=logger: logging_request(lg, query, tickers, real_time, analytics),
+                          listener, rate))
+
+        print(f"{args.requests} requests, {args.threads} threads, {args.tickers} tickers, "
+              f"sink delay {args.sink_delay_ms} ms/write")
+        print(f"{'strategy':<32} {'mean ms':>9} {'p99 ms':>9}")
+        for name, fn, listener, rate in cases:
+            if rate is not None:
+                logs.LOG_PAYLOAD_SAMPLE_RATE = rate
+            result = run(fn, args.requests, args.threads)
+            print(f"{name:<32} {result['mean_ms']:>9.4f} {result['p99_ms']:>9.4f}")
+            if listener:
+                listener.stop()  # Drain before the next case shares the sink
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""End-to-end benchmark for /generate-response with stubbed providers.
+
+Drives the pipeline through the Flask test client (default) or over HTTP
+against a running server (e.g. gunicorn started with PROVIDER_REPLAY_MODE=replay
+and LLM_BACKEND=stub), and reports p50/p95/p99 latency per stage plus
+throughput at each concurrency level.
+
+    python benchmarks/bench_pipeline.py --out bench.json
+    python benchmarks/bench_pipeline.py --recordings recordings --compare bench.json
+    python benchmarks/bench_pipeline.py --target http://127.0.0.1:8000 --concurrency 8,64
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+QUERIES = [
+    "What is the price of Apple?",
+    "RSI of Tesla",
+    "Bollinger bands and beta for Nvidia",
+    "Should I buy Microsoft or Amazon for the long term?",
+    "Compare Meta, Alphabet and Netflix risk",
+    "How should I diversify a retirement portfolio?",
+]
+
+# -----------------------------------------
+# **🔹 IN-PROCESS SETUP**
+# -----------------------------------------
+
+def configure_environment(args):
+    """Must run before the app is imported: modules read their settings at import."""
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ["LLM_STUB_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["PREFETCH_ENABLED"] = "0"
+    # Stubs cost nothing upstream; real limits would turn the run into a rate-limit test
+    for provider in ("POLYGON", "YAHOO"):
+        os.environ[f"RATE_LIMIT_{provider}_PER_MIN"] = "1e9"
+        os.environ[f"RATE_LIMIT_{provider}_BURST"] = "1e9"
+    if args.recordings:
+        os.environ["PROVIDER_REPLAY_MODE"] = "replay"
+        os.environ["PROVIDER_REPLAY_DIR"] = os.path.abspath(args.recordings)
+        os.environ["PROVIDER_REPLAY_LATENCY_MS"] = args.provider_latency_ms
+
+
+def install_synthetic_providers(latencies, tickers):
+    """Canned Yahoo history and Polygon bars with per-call sleeps, for runs without recordings."""
+    import requests
+    from yfinance.base import TickerBase
+
+    from bench_batch_history import canned_history
+
+    frame = canned_history()
+    yahoo_latency = latencies.get("Yahoo", 0.0)
+    polygon_latency = latencies.get("Polygon", 0.0)
+    bar = {"o": 100.0, "h": 102.0, "l": 99.0, "c": 101.0, "v": 1_000_000, "t": 1719576000000}
+
+    def history(self, *a, **kw):
+        time.sleep(yahoo_latency)
+        return frame.copy()
+
+    class Response:
+        status_code = 200
+
+        def __init__(self, body):
+            self.body = body
+
+        def json(self):
+            return self.body
+
+        def raise_for_status(self):
+            pass
+
+    def get(url, *a, **kw):
+        time.sleep(polygon_latency)
+        if "/grouped/" in url:
+            return Response({"results": [dict(bar, T=t) for t in tickers]})
+        return Response({"results": [bar]})
+
+    TickerBase.history = history
+    requests.get = get
+
+
+def load_app(args):
+    configure_environment(args)
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, BENCH_DIR)
+    os.chdir(ROOT)  # main.py loads companies.json relative to the working directory
+    from replay import parse_latencies
+
+    if not args.recordings:
+        # Patch before main imports so every module sees the stubs
+        with open(os.path.join(ROOT, "companies.json")) as f:
+            tickers = list(json.load(f).values())
+        install_synthetic_providers(parse_latencies(args.provider_latency_ms), tickers)
+    import main as app_module
+    return app_module
+
+# -----------------------------------------
+# **🔹 DRIVERS**
+# -----------------------------------------
+
+class InProcessDriver:
+    def __init__(self, app_module, cold):
+        self.app_module = app_module
+        self.cold = cold
+        self.local = threading.local()
+
+    def post(self, query):
+        if self.cold:
+            from cache import analytics_cache, history_cache, llm_cache, quote_cache
+            for cache in (quote_cache, history_cache, analytics_cache, llm_cache):
+                cache.clear()
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app_module.app.test_client()
+        return client.post("/generate-response", json={"query": query},
+                           headers={"X-Stage-Timings": "1"}).get_json()
+
+
+class HTTPDriver:
+    def __init__(self, base_url):
+        self.url = base_url.rstrip("/") + "/generate-response"
+        self.local = threading.local()
+
+    def post(self, query):
+        import requests
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session.post(self.url, json={"query": query},
+                            headers={"X-Stage-Timings": "1"}, timeout=120).json()
+
+# -----------------------------------------
+# **🔹 MEASUREMENT**
+# -----------------------------------------
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "n": 0}
+    ordered = sorted(values)
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99), "n": len(ordered)}
+
+
+def run_level(driver, concurrency, total):
+    samples = []
+    lock = threading.Lock()
+
+    def one(i):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        body = driver.post(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            samples.append((elapsed, body))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    stages = {}
+    for _, body in samples:
+        for name, ms in body.get("timings_ms", {}).items():
+            stages.setdefault(name, []).append(ms)
+    return {
+        "requests": total,
+        "throughput_rps": total / wall,
+        "errors": sum(1 for _, body in samples
+                      if str(body.get("response", "")).startswith("An error occurred")),
+        "total_ms": percentiles([elapsed for elapsed, _ in samples]),
+        "stages_ms": {name: percentiles(values) for name, values in sorted(stages.items())},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def print_level(concurrency, result):
+    total = result["total_ms"]
+    print(f"\nconcurrency={concurrency}: {result['throughput_rps']:.1f} req/s, "
+          f"{result['errors']} errors, total p50/p95/p99 = "
+          f"{total['p50']:.1f}/{total['p95']:.1f}/{total['p99']:.1f} ms")
+    for name, stats in result["stages_ms"].items():
+        print(f"  {name:<28} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f}  (n={stats['n']})")
+
+
+def compare(baseline, current, threshold, min_delta_ms):
+    """Prints p95 deltas against a saved run; returns True if any got slower than threshold."""
+    regressed = False
+    print(f"\nComparison against baseline {baseline['meta'].get('revision')} (p95, ms):")
+    for level, result in current["results"].items():
+        base = baseline["results"].get(level)
+        if not base:
+            continue
+        rows = [("total", base["total_ms"], result["total_ms"])]
+        rows += [(name, base["stages_ms"].get(name), stats) for name, stats in result["stages_ms"].items()]
+        for name, old, new in rows:
+            if not old or not old.get("p95") or new.get("p95") is None:
+                continue
+            change = (new["p95"] - old["p95"]) / old["p95"]
+            slower = change > threshold and new["p95"] - old["p95"] > min_delta_ms
+            flag = "  REGRESSION" if slower else ""
+            regressed |= bool(flag)
+            print(f"  c={level:<3} {name:<28} {old['p95']:>9.2f} -> {new['p95']:>9.2f} ({change:+.0%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="inproc", help="'inproc' or a base URL such as http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", default="1,8,64")
+    parser.add_argument("--requests", type=int, default=120, help="Requests per concurrency level")
+    parser.add_argument("--provider-latency-ms", default="Yahoo=150,Polygon=90")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--recordings", help="Replay recorded responses from this directory")
+    parser.add_argument("--cold", action="store_true", help="Clear every cache before every request")
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 slowdown counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    if args.target == "inproc":
+        driver = InProcessDriver(load_app(args), args.cold)
+    else:
+        driver = HTTPDriver(args.target)
+
+    results = {}
+    for level in (int(c) for c in args.concurrency.split(",")):
+        results[str(level)] = run_level(driver, level, args.requests)
+        print_level(level, results[str(level)])
+
+    report = {
+        "meta": {"revision": git_revision(), "target": args.target, "python": platform.python_version(),
+                 "provider_latency_ms": args.provider_latency_ms, "llm_latency_ms": args.llm_latency_ms,
+                 "recordings": args.recordings, "cold": args.cold, "timestamp": time.time()},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(json.load(f), report, args.threshold, args.min_delta_ms):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
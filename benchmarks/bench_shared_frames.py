@@ -0,0 +1,144 @@
+"""Cost of handing price histories to a process pool: pickled frames vs shared-memory descriptors.
+
+For N tickers of B daily bars (default 20 years), times
+  - the transfer alone: pickle.dumps + loads of every frame, against
+    publishing them once with SharedFrames() and against attaching a
+    DataFrame to every descriptor afterwards;
+  - the round trip through a ProcessPoolExecutor running --fan-out tasks
+    per ticker (one per indicator, say), submitted with the frame (pickled
+    by the pool for every task) or with its descriptor via
+    shared_frames.run_on_shared: once publishing the batch for the round
+    (pool_shared), and once reusing a batch published earlier, as cached
+    histories are between requests (pool_shared_reused: segments and
+    frames already attached in the workers).
+The task is a last-close read by default, so the pool numbers are almost
+all transport; --task rsi runs main.calculate_rsi instead.
+
+    python benchmarks/bench_shared_frames.py --tickers 50 --bars 5040 --fan-out 5
+"""
+import argparse
+import json
+import os
+import pickle
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_cache import yahoo_like_history  # noqa: E402
+from shared_frames import AttachedFrame, SharedFrames, attached_frame, run_on_shared  # noqa: E402
+
+
+def last_close(frame):
+    return float(frame["Close"].iloc[-1])
+
+
+def rsi(frame):
+    import main
+    return float(main.calculate_rsi(frame))
+
+
+TASKS = {"last_close": last_close, "rsi": rsi}
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples), statistics.median(samples)
+
+
+def transfer_pickle(frames):
+    for frame in frames.values():
+        pickle.loads(pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def publish(frames):
+    SharedFrames(frames).close()
+
+
+def attach_all(descriptors):
+    for descriptor in descriptors.values():
+        AttachedFrame(descriptor).frame
+
+
+def reattach_all(descriptors):
+    for descriptor in descriptors.values():
+        attached_frame(descriptor)
+
+
+def pool_pickle(pool, task, frames, fan_out):
+    futures = [pool.submit(task, frame) for frame in frames.values() for _ in range(fan_out)]
+    return [f.result() for f in futures]
+
+
+def run_shared(pool, task, shared, fan_out):
+    futures = [pool.submit(run_on_shared, task, d) for d in shared.descriptors.values()
+               for _ in range(fan_out)]
+    return [f.result() for f in futures]
+
+
+def pool_shared(pool, task, frames, fan_out):
+    with SharedFrames(frames) as shared:
+        return run_shared(pool, task, shared, fan_out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--bars", type=int, default=5040, help="Daily bars per ticker (5040 is ~20 years)")
+    parser.add_argument("--fan-out", type=int, default=1, help="Pool tasks per ticker")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--task", choices=sorted(TASKS), default="last_close")
+    parser.add_argument("--out", help="Write results JSON here")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ.setdefault("PREFETCH_ENABLED", "0")
+    frames = {f"T{i}": yahoo_like_history(args.bars) for i in range(args.tickers)}
+    task = TASKS[args.task]
+    payload = sum(len(pickle.dumps(f, protocol=pickle.HIGHEST_PROTOCOL)) for f in frames.values())
+    with SharedFrames({"x": frames["T0"]}) as shared:
+        descriptor = len(pickle.dumps(shared.descriptors["x"]))
+
+    report = {"tickers": args.tickers, "bars": args.bars, "task": args.task, "fan_out": args.fan_out,
+              "pickled_bytes_per_ticker": payload // args.tickers, "descriptor_bytes": descriptor}
+    report["transfer_pickle_ms"] = timed(lambda: transfer_pickle(frames), args.repeats)
+    report["publish_shared_ms"] = timed(lambda: publish(frames), args.repeats)
+    with SharedFrames(frames) as shared:
+        attach_all(shared.descriptors)  # Steady state: the segment is already mapped here
+        report["attach_shared_ms"] = timed(lambda: attach_all(shared.descriptors), args.repeats)
+        reattach_all(shared.descriptors)
+        report["reattach_shared_ms"] = timed(lambda: reattach_all(shared.descriptors), args.repeats)
+    with ProcessPoolExecutor(args.workers) as pool:
+        pool_pickle(pool, task, frames, args.fan_out)  # Warm the workers (and their imports) first
+        assert pool_pickle(pool, task, frames, 1) == pool_shared(pool, task, frames, 1)
+        report["pool_pickle_ms"] = timed(lambda: pool_pickle(pool, task, frames, args.fan_out), args.repeats)
+        report["pool_shared_ms"] = timed(lambda: pool_shared(pool, task, frames, args.fan_out), args.repeats)
+        with SharedFrames(frames) as shared:
+            run_shared(pool, task, shared, args.fan_out)  # Attach in every worker first
+            report["pool_shared_reused_ms"] = timed(lambda: run_shared(pool, task, shared, args.fan_out),
+                                                    args.repeats)
+
+    print(f"{args.tickers} tickers x {args.bars} bars, {args.fan_out} task(s) per ticker; "
+          f"pickled frame {report['pickled_bytes_per_ticker']} B, descriptor {descriptor} B")
+    print(f"{'':<22} {'best ms':>10} {'median ms':>10}")
+    for key in ("transfer_pickle_ms", "publish_shared_ms", "attach_shared_ms", "reattach_shared_ms",
+                "pool_pickle_ms", "pool_shared_ms", "pool_shared_reused_ms"):
+        best, median = report[key]
+        print(f"{key[:-3]:<22} {best:>10.2f} {median:>10.2f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
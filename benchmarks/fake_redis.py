@@ -0,0 +1,120 @@
+"""In-process Redis stand-in speaking RESP, for exercising cache.RedisTTLCache without a server.
+
+Supports the commands the cache uses (GET, SET with PX/EX, DEL, SCAN,
+PING, SELECT, AUTH, DBSIZE, FLUSHDB) with lazy key expiry.
+
+    python benchmarks/fake_redis.py --port 6399
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://localhost:6399/0 gunicorn -c gunicorn.conf.py main:app
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+
+class FakeRedisStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}  # key -> (value, expires_at or None)
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, args):
+        command = args[0].upper()
+        with self.lock:
+            if command == b"PING":
+                return b"+PONG"
+            if command in (b"SELECT", b"AUTH"):
+                return b"+OK"
+            if command == b"GET":
+                entry = self._live(args[1])
+                return entry[0] if entry else None
+            if command == b"SET":
+                expires = None
+                options = [a.upper() for a in args[3::2]]
+                for option, value in zip(options, args[4::2]):
+                    if option == b"PX":
+                        expires = time.monotonic() + int(value) / 1000.0
+                    elif option == b"EX":
+                        expires = time.monotonic() + int(value)
+                self.data[args[1]] = (args[2], expires)
+                return b"+OK"
+            if command == b"DEL":
+                return sum(1 for key in args[1:] if self._live(key) and self.data.pop(key, None))
+            if command == b"SCAN":
+                pattern = b"*"
+                for option, value in zip(args[2::2], args[3::2]):
+                    if option.upper() == b"MATCH":
+                        pattern = value
+                keys = [k for k in list(self.data) if self._live(k) and fnmatch.fnmatchcase(k, pattern)]
+                return [b"0", keys]  # Whole keyspace in one page
+            if command == b"DBSIZE":
+                return sum(1 for k in list(self.data) if self._live(k))
+            if command == b"FLUSHDB":
+                self.data.clear()
+                return b"+OK"
+        return ValueError(f"ERR unknown command '{command.decode()}'")
+
+
+def _encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, ValueError):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    if value.startswith(b"+"):
+        return value + b"\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            count = int(line[1:-2])
+            args = []
+            for _ in range(count):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(_encode(self.server.store.execute(args)))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.store = FakeRedisStore()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-redis", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    server = FakeRedisServer(args.port)
+    print(f"Fake Redis listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
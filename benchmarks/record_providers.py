@@ -0,0 +1,47 @@
+"""Captures live Yahoo, Polygon and OpenAI responses for offline replay.
+
+Runs each query through /generate-response with PROVIDER_REPLAY_MODE=record,
+so every provider call the pipeline makes is saved under PROVIDER_REPLAY_DIR.
+Needs network access and the usual POLYGON_API_KEY / OPENAI_API_KEY.
+
+    python benchmarks/record_providers.py --dir recordings
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_QUERIES = [
+    "What is the price of Apple?",
+    "RSI of Tesla",
+    "Bollinger bands and beta for Nvidia",
+    "Should I buy Microsoft or Amazon for the long term?",
+    "Compare Meta, Alphabet and Netflix risk",
+    "How should I diversify a retirement portfolio?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default="recordings")
+    parser.add_argument("queries", nargs="*", help="Queries to record (default: a built-in mix)")
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.dir)
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)  # main.py loads companies.json relative to the working directory
+    import main as app_module
+    from replay import recorder
+
+    recorder.mode = "record"
+    recorder.directory = directory
+
+    client = app_module.app.test_client()
+    for query in args.queries or DEFAULT_QUERIES:
+        response = client.post("/generate-response", json={"query": query}).get_json()
+        print(f"Recorded: {query!r} -> {response['response'][:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from urllib.parse import urlparse
+
+import codec
+from popularity import ticker_popularity
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# **🔹 CACHE CONFIGURATION**
+# -----------------------------------------
+
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", "60"))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "3600"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "300"))
+GROUPED_CACHE_TTL = float(os.getenv("GROUPED_CACHE_TTL", "86400"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+# How many least-recently-used entries are compared by popularity on eviction
+CACHE_EVICTION_SAMPLE = int(os.getenv("CACHE_EVICTION_SAMPLE", "8"))
+# memory: one cache per worker; sqlite: one file shared by every worker on the host;
+# redis: one server shared by every host. <NAME>_CACHE_BACKEND overrides it per cache.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "/tmp/rag_cache.sqlite3")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Caches that keep an in-process copy in front of a shared backend: histories are read
+# several times per request (and preloaded before fork), so they are served from memory
+CACHE_LOCAL_TIER = set(os.getenv("CACHE_LOCAL_TIER", "history").split(","))
+# How long shared backends keep an expired entry as a stale fallback
+CACHE_STALE_SECONDS = float(os.getenv("CACHE_STALE_SECONDS", "86400"))
+# After a shared backend fails, skip it for this many seconds (every read misses, every write
+# is dropped) instead of making each request wait on it
+CACHE_ERROR_BACKOFF = float(os.getenv("CACHE_ERROR_BACKOFF", "5"))
+
+# -----------------------------------------
+# **🔹 IN-PROCESS TTL CACHE**
+# -----------------------------------------
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    When full, expired entries go first; otherwise the least popular of the
+    oldest CACHE_EVICTION_SAMPLE entries is evicted, as scored by `priority_fn`.
+    """
+
+    def __init__(self, name, ttl, maxsize=CACHE_MAX_ENTRIES, priority_fn=None):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.priority_fn = priority_fn  # key -> score, higher is kept longer
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None, allow_stale=False):
+        """Returns a fresh value; with allow_stale=True an expired one is returned too.
+
+        Expired entries stay until evicted so they can serve as a fallback when
+        a provider is rate limited or down.
+        """
+        with self.lock:
+            entry = self.entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            if entry[0] < time.monotonic():
+                if allow_stale:
+                    self.stale_hits += 1
+                    return entry[1]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self._evict_one()
+
+    def _evict_one(self):
+        oldest = list(islice(self.entries.items(), CACHE_EVICTION_SAMPLE))
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _) in oldest if expires_at < now]
+        if expired:
+            victim = expired[0]
+        elif self.priority_fn is not None:
+            victim = min((k for k, _ in oldest), key=self.priority_fn)
+        else:
+            victim = oldest[0][0]
+        del self.entries[victim]
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits,
+                    "stale_hits": self.stale_hits, "misses": self.misses}
+
+# -----------------------------------------
+# **🔹 SHARED CACHES**
+# -----------------------------------------
+
+class SharedTTLCache:
+    """TTLCache interface over a store other processes can read.
+
+    Values cross process boundaries as bytes (codec.dumps: DataFrames as raw
+    column arrays, everything else JSON, never pickle) and expire on the wall clock,
+    because monotonic clocks are not comparable across processes. Subclasses
+    provide _load(key) -> (expires, blob) or None, _store, _delete, _clear and
+    _size. Hit/miss counters are per worker.
+
+    The cache fails open: a backend error is logged and counted, reads miss,
+    writes are dropped, and the backend is left alone for CACHE_ERROR_BACKOFF
+    seconds so requests never wait on a store that is down.
+    """
+
+    def __init__(self, name, ttl):
+        self.name = name
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.down_until = 0.0
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key, default=str)
+
+    def _count(self, field):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _guarded(self, operation, *args, default=None):
+        """Runs a backend operation, or returns `default` if the backend fails or is backing off."""
+        if time.monotonic() < self.down_until:
+            return default
+        try:
+            return operation(*args)
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+                self.down_until = time.monotonic() + CACHE_ERROR_BACKOFF
+            logger.warning("Cache %s backend failed, bypassing it for %.0fs: %s",
+                           self.name, CACHE_ERROR_BACKOFF, e)
+            return default
+
+    def get(self, key, default=None, allow_stale=False):
+        entry = self.get_entry(key, allow_stale)
+        return default if entry is None else entry[0]
+
+    def get_entry(self, key, allow_stale=False):
+        """(value, expires wall-clock time) for `key`, or None; counted like get."""
+        row = self._guarded(self._load, self._key(key))
+        if row is None:
+            self._count("misses")
+            return None
+        expires, blob = row
+        stale = expires < time.time()
+        if stale and not allow_stale:
+            self._count("misses")
+            return None
+        try:
+            value = codec.loads(blob)
+        except (ValueError, TypeError, KeyError, struct.error) as e:  # Another version wrote it, or not us
+            logger.warning("Cache %s holds an undecodable value, treating it as a miss: %s", self.name, e)
+            self._count("misses")
+            return None
+        self._count("stale_hits" if stale else "hits")
+        return value, expires
+
+    def set(self, key, value, ttl=None):
+        try:
+            blob = codec.dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.warning("Cache %s cannot store %s: %s", self.name, type(value).__name__, e)
+            return
+        self._guarded(self._store, self._key(key), blob, self.ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        self._guarded(self._delete, self._key(key))
+
+    def clear(self):
+        self._guarded(self._clear)
+
+    def stats(self):
+        entries = self._guarded(self._size, default=0)
+        with self.lock:
+            return {"entries": entries, "hits": self.hits, "stale_hits": self.stale_hits,
+                    "misses": self.misses, "errors": self.errors}
+
+
+class SQLiteTTLCache(SharedTTLCache):
+    """Cache in a local SQLite file (one table per cache), shared by the workers on a host.
+
+    Eviction drops expired rows, then the entries written longest ago, and
+    only runs every `maxsize // 16` writes.
+    """
+
+    def __init__(self, name, ttl, path=CACHE_DB_PATH, maxsize=CACHE_MAX_ENTRIES):
+        super().__init__(name, ttl)
+        self.path = path
+        self.maxsize = maxsize
+        self.local = threading.local()
+        self.writes = 0
+        self._connect().execute(f"CREATE TABLE IF NOT EXISTS {self.name} "
+                                "(key TEXT PRIMARY KEY, expires REAL, written REAL, value BLOB)")
+
+    def _connect(self):
+        # SQLite connections must not cross a fork, so they are per thread and per process
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def _load(self, key):
+        return self._connect().execute(f"SELECT expires, value FROM {self.name} WHERE key = ?",
+                                       (key,)).fetchone()
+
+    def _store(self, key, blob, ttl):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(f"INSERT OR REPLACE INTO {self.name} (key, expires, written, value) VALUES (?, ?, ?, ?)",
+                     (key, now + ttl, now, blob))
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % max(1, self.maxsize // 16) == 0
+        if evict:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()
+        excess = count - self.maxsize
+        if excess <= 0:
+            return
+        conn.execute(f"DELETE FROM {self.name} WHERE key IN (SELECT key FROM {self.name} "
+                     "ORDER BY expires >= ?, written LIMIT ?)", (now, excess))
+
+    def _delete(self, key):
+        self._connect().execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+
+    def _clear(self):
+        self._connect().execute(f"DELETE FROM {self.name}")
+
+    def _size(self):
+        return self._connect().execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+
+
+class RedisError(Exception):
+    """An error reply from the Redis server."""
+
+
+class RESPConnection:
+    """Minimal blocking Redis protocol client: enough for GET/SET/DEL/SCAN, no dependency."""
+
+    def __init__(self, url, timeout=2.0):
+        parsed = urlparse(url)
+        self.sock = socket.create_connection((parsed.hostname or "localhost", parsed.port or 6379),
+                                             timeout=timeout)
+        self.reader = self.sock.makefile("rb")
+        if parsed.password:
+            self.command("AUTH", *([parsed.username] if parsed.username else []), parsed.password)
+        if parsed.path.strip("/"):
+            self.command("SELECT", parsed.path.strip("/"))
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+        return self._reply()
+
+    def _reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def close(self):
+        self.sock.close()
+
+
+class RedisTTLCache(SharedTTLCache):
+    """Cache on a Redis-compatible server (Redis, Valkey, KeyDB, Dragonfly), shared by every host.
+
+    Each value is prefixed with its expiry time; the server's own TTL is
+    longer by CACHE_STALE_SECONDS so expired entries remain as a stale
+    fallback, and the server's maxmemory policy does the eviction.
+    """
+
+    _EXPIRES = struct.Struct("<d")
+
+    def __init__(self, name, ttl, url=CACHE_REDIS_URL):
+        super().__init__(name, ttl)
+        self.url = url
+        self.prefix = f"rag:{name}:"
+        self.local = threading.local()
+
+    def _command(self, *args):
+        # One connection per thread and process; a broken one is replaced and the command retried once
+        for attempt in (0, 1):
+            conn = getattr(self.local, "conn", None)
+            if conn is None or self.local.pid != os.getpid():
+                conn = RESPConnection(self.url)
+                self.local.conn, self.local.pid = conn, os.getpid()
+            try:
+                return conn.command(*args)
+            except (OSError, ConnectionError):
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+
+    def _load(self, key):
+        blob = self._command("GET", self.prefix + key)
+        if blob is None:
+            return None
+        return self._EXPIRES.unpack_from(blob)[0], blob[self._EXPIRES.size:]
+
+    def _store(self, key, blob, ttl):
+        self._command("SET", self.prefix + key, self._EXPIRES.pack(time.time() + ttl) + blob,
+                      "PX", int((ttl + CACHE_STALE_SECONDS) * 1000))
+
+    def _delete(self, key):
+        self._command("DEL", self.prefix + key)
+
+    def _scan(self):
+        cursor = b"0"
+        while True:
+            cursor, keys = self._command("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+            yield from keys
+            if cursor == b"0":
+                return
+
+    def _clear(self):
+        keys = list(self._scan())
+        for i in range(0, len(keys), 500):
+            self._command("DEL", *keys[i:i + 500])
+
+    def _size(self):
+        return sum(1 for _ in self._scan())
+
+# -----------------------------------------
+# **🔹 TIERED CACHE**
+# -----------------------------------------
+
+class TieredTTLCache:
+    """An in-process TTLCache in front of a shared cache.
+
+    Reads try process memory, then the shared store; a shared hit is kept in
+    memory until the shared entry expires. Writes go to both. A worker thus
+    reads its own (or its preloading master's, copy-on-write) values at
+    memory speed and still sees what other workers fetched.
+    """
+
+    def __init__(self, name, ttl, shared, priority_fn=None):
+        self.name = name
+        self.ttl = ttl
+        self.local = TTLCache(name, ttl, priority_fn=priority_fn)
+        self.shared = shared
+
+    def get(self, key, default=None, allow_stale=False):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        entry = self.shared.get_entry(key, allow_stale=allow_stale)
+        if entry is not None:
+            value, expires = entry
+            remaining = expires - time.time()
+            if remaining > 0:
+                self.local.set(key, value, ttl=remaining)
+            return value
+        if allow_stale:  # The shared store may be down or have evicted it
+            return self.local.get(key, default, allow_stale=True)
+        return default
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl)
+        self.shared.set(key, value, ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        local, shared = self.local.stats(), self.shared.stats()
+        return {"entries": shared["entries"], "local_entries": local["entries"],
+                "hits": local["hits"] + shared["hits"], "local_hits": local["hits"],
+                "stale_hits": local["stale_hits"] + shared["stale_hits"],
+                "misses": shared["misses"], "errors": shared["errors"]}
+
+# -----------------------------------------
+# **🔹 CACHE INSTANCES**
+# -----------------------------------------
+
+SHARED_BACKENDS = {"sqlite": SQLiteTTLCache, "redis": RedisTTLCache}
+
+
+def make_cache(name, ttl, priority_fn=None):
+    """Builds the cache `name` on CACHE_BACKEND, or on <NAME>_CACHE_BACKEND if set.
+
+    On a shared backend, caches listed in CACHE_LOCAL_TIER get an in-process
+    tier in front (TieredTTLCache). `priority_fn` only applies in memory;
+    shared backends evict by age.
+    """
+    backend = os.getenv(f"{name.upper()}_CACHE_BACKEND", CACHE_BACKEND)
+    if backend == "memory":
+        return TTLCache(name, ttl, priority_fn=priority_fn)
+    if backend not in SHARED_BACKENDS:
+        raise ValueError(f"Unknown cache backend '{backend}' for {name}, "
+                         f"expected memory or one of {sorted(SHARED_BACKENDS)}")
+    shared = SHARED_BACKENDS[backend](name, ttl)
+    if name in CACHE_LOCAL_TIER:
+        return TieredTTLCache(name, ttl, shared, priority_fn=priority_fn)
+    return shared
+
+
+# Quote keys are (provider, ticker); history and analytics keys start with (ticker, period)
+quote_cache = make_cache("quotes", QUOTE_CACHE_TTL,
+                         priority_fn=lambda key: ticker_popularity.estimate(key[1]))
+history_cache = make_cache("history", HISTORY_CACHE_TTL,
+                           priority_fn=lambda key: ticker_popularity.estimate(key[0]))
+analytics_cache = make_cache("analytics", ANALYTICS_CACHE_TTL,
+                             priority_fn=lambda key: ticker_popularity.estimate(key[0]))
+# Keyed by a digest of the model, messages and sampling parameters
+llm_cache = make_cache("llm", LLM_CACHE_TTL)
+# Keyed by the session a Polygon grouped-daily table was loaded for; one entry per day
+grouped_cache = make_cache("grouped", GROUPED_CACHE_TTL)
@@ -0,0 +1,130 @@
+import json
+import struct
+
+# -----------------------------------------
+# **🔹 CACHE VALUE ENCODING**
+# -----------------------------------------
+
+# Shared caches store bytes. DataFrames (price histories) are written as raw
+# little-endian arrays behind a small JSON header, which needs no pickle opcodes
+# and no matching pandas version to read. Constant columns (Dividends and Stock
+# Splits are almost always 0) are stored as one value and integer columns in
+# the narrowest type that holds them (Volume fits in uint32).
+# Everything else (quote dicts, analytics, LLM text) is JSON. Nothing read back
+# can run code, so a shared store need not be trusted more than its data.
+FRAME_MAGIC = b"DF2\x00"
+JSON_MAGIC = b"JS1\x00"
+_HEADER = struct.Struct("<I")  # JSON header length
+
+# Dtypes written as raw buffers; frames with object or extension columns are not cacheable
+_RAW_KINDS = "biufM"
+
+
+def _frame_encodable(frame):
+    if frame.columns.nlevels != 1 or frame.index.nlevels != 1 or frame.columns.has_duplicates:
+        return False
+    import numpy as np
+    if not all(isinstance(dtype, np.dtype) and dtype.kind in _RAW_KINDS for dtype in frame.dtypes):
+        return False
+    index = frame.index
+    return index.dtype.kind in _RAW_KINDS or str(index.dtype).startswith("datetime64[ns,")
+
+
+def _narrow(values):
+    """Smallest integer dtype holding every value, or the original dtype."""
+    import numpy as np
+    if values.dtype.kind not in "iu" or not len(values):
+        return values.dtype
+    return np.result_type(np.min_scalar_type(values.min()), np.min_scalar_type(values.max()))
+
+
+def encode_frame(frame):
+    """Serializes a DataFrame with a numeric or datetime index and numeric columns."""
+    import numpy as np
+    index = frame.index
+    tz = str(index.tz) if getattr(index, "tz", None) is not None else None
+    index_values = index.tz_convert("UTC").tz_localize(None).values if tz else index.values
+
+    columns, stored = [], []
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        column = {"name": str(name), "dtype": values.dtype.str}
+        if values.dtype.kind in "biuf" and len(values) and (values[0] == values).all():
+            column["const"] = values[0].item()
+        else:
+            column["stored"] = _narrow(values).str
+            stored.append((column, values))
+        columns.append(column)
+
+    header = json.dumps({
+        "rows": len(frame),
+        "index": {"name": index.name, "tz": tz, "dtype": index_values.dtype.str},
+        "columns": columns,
+    }).encode("utf-8")
+    buffers = [np.ascontiguousarray(index_values).tobytes()]
+    buffers += [np.ascontiguousarray(values, dtype=column["stored"]).tobytes() for column, values in stored]
+    return b"".join([FRAME_MAGIC, _HEADER.pack(len(header)), header] + buffers)
+
+
+def _raw_dtype(name):
+    import numpy as np
+    dtype = np.dtype(name)
+    if dtype.kind not in _RAW_KINDS:
+        raise ValueError(f"Unexpected dtype {name} in cached frame")
+    return dtype
+
+
+def decode_frame(blob):
+    import numpy as np
+    import pandas as pd
+    view = memoryview(blob)
+    (header_len,) = _HEADER.unpack_from(view, len(FRAME_MAGIC))
+    offset = len(FRAME_MAGIC) + _HEADER.size
+    header = json.loads(bytes(view[offset:offset + header_len]))
+    offset += header_len
+    rows = header["rows"]
+
+    index_dtype = _raw_dtype(header["index"]["dtype"])
+    index_values = np.frombuffer(view, dtype=index_dtype, count=rows, offset=offset).copy()
+    offset += index_dtype.itemsize * rows
+    if header["index"]["tz"]:
+        index = pd.DatetimeIndex(index_values, name=header["index"]["name"]).tz_localize("UTC") \
+            .tz_convert(header["index"]["tz"])
+    else:
+        index = pd.Index(index_values, name=header["index"]["name"])
+
+    values = {}
+    for column in header["columns"]:
+        if "const" in column:
+            values[column["name"]] = np.full(rows, column["const"], dtype=column["dtype"])
+        else:
+            dtype = _raw_dtype(column["stored"])
+            values[column["name"]] = np.frombuffer(view, dtype=dtype, count=rows, offset=offset) \
+                .astype(column["dtype"])  # Also copies out of the blob, so the frame owns its memory
+            offset += dtype.itemsize * rows
+    return pd.DataFrame(values, index=index, copy=False)
+
+
+def _json_default(value):
+    if hasattr(value, "item"):  # NumPy scalars, e.g. an int64 volume in a quote
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not cacheable")
+
+
+def dumps(value):
+    """Encodes a cache value; raises TypeError for values neither codec can hold."""
+    if type(value).__name__ == "DataFrame":
+        if not _frame_encodable(value):
+            raise TypeError("DataFrame with non-numeric columns or a MultiIndex is not cacheable")
+        return encode_frame(value)
+    return JSON_MAGIC + json.dumps(value, default=_json_default).encode("utf-8")
+
+
+def loads(blob):
+    """Decodes a cache value; raises ValueError for anything dumps did not write (old pickles too)."""
+    magic = bytes(blob[:len(FRAME_MAGIC)])
+    if magic == FRAME_MAGIC:
+        return decode_frame(blob)
+    if magic == JSON_MAGIC:
+        return json.loads(bytes(blob[len(JSON_MAGIC):]))
+    raise ValueError("Unknown cache value encoding")
@@ -0,0 +1,158 @@
+import calendar
+import re
+from datetime import date, timedelta
+
+# -----------------------------------------
+# **🔹 DATE EXPRESSION GRAMMAR**
+# -----------------------------------------
+
+_NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+                 "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12}
+_MONTHS = {name: i for i, names in enumerate(
+    ["", "jan january", "feb february", "mar march", "apr april", "may", "jun june", "jul july",
+     "aug august", "sep sept september", "oct october", "nov november", "dec december"]) for name in names.split()}
+
+_N = r"\d+|" + "|".join(_NUMBER_WORDS)
+_UNIT = r"(?:trading\s+|business\s+)?day|week|month|quarter|year"
+_MONTH = r"(?:" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+_ORD = r"(?:st|nd|rd|th)?"
+# An explicit date: 2020-03-15, 2020-03, 3/15/2020, March 15(th), 2020, 15 March 2020, March 2020
+_DATE = (rf"\d{{4}}-\d{{1,2}}(?:-\d{{1,2}})?|\d{{1,2}}/\d{{1,2}}/\d{{4}}|{_MONTH}\s+\d{{1,2}}{_ORD},?\s+\d{{4}}"
+         rf"|\d{{1,2}}{_ORD}\s+(?:of\s+)?{_MONTH},?\s+\d{{4}}|{_MONTH},?\s+\d{{4}}")
+# After "since", "during", "between", ... a bare year is a date too
+_YEAR_ALONE = r"(?:19|20)\d{2}"
+_DATE_OR_YEAR = rf"{_DATE}|{_YEAR_ALONE}"
+# After "in" or an open "from", a number followed by a noun is a count ("in 2000 shares",
+# "from 2000 stores"), so the bare year must not be followed by a word other than these
+_CONNECTIVES = r"and|or|but|to|on|onwards?|vs|versus|compared|when|while|until|till|through|before|after|was|were|is|did"
+_DATE_OR_LONE_YEAR = rf"{_DATE}|{_YEAR_ALONE}(?!\s+(?!(?:{_CONNECTIVES})\b)[a-z])"
+
+# One alternation scanned once over the query; earlier alternatives win at the same position,
+# so "from X to Y" is a range before "from X" is an open one
+_EXPRESSIONS = re.compile(rf"""\b(?:
+      (?P<ago>(?P<ago_n>{_N})\s+(?P<ago_unit>{_UNIT})s?\s+(?:ago|back|earlier))
+    | (?P<last>(?:last|past|previous|prior|trailing)\s+(?:(?P<last_n>{_N})\s+)?(?P<last_unit>{_UNIT})s?)
+    | (?P<ytd>ytd|year[\s-]to[\s-]date|this\s+year)
+    | (?P<mtd>mtd|month[\s-]to[\s-]date|this\s+month)
+    | (?P<yesterday>yesterday)
+    | (?P<between>(?:between|from)\s+(?P<from_date>{_DATE_OR_YEAR})\s+(?:and|to|until|till|through|-)\s+
+                  (?P<to_date>{_DATE_OR_YEAR}))
+    | (?P<since>(?:since|starting(?:\s+in)?)\s+(?P<since_date>{_DATE_OR_YEAR})
+                | from\s+(?P<from_date_open>{_DATE_OR_LONE_YEAR}))
+    | (?P<within>(?:during|throughout)\s+(?P<within_date>{_DATE_OR_YEAR})
+                 | in\s+(?P<in_date>{_DATE_OR_LONE_YEAR})
+                 | for\s+(?P<for_date>{_DATE}))
+    | (?P<on>{_DATE})
+)\b""", re.IGNORECASE | re.VERBOSE)
+
+_ISO = re.compile(r"(\d{4})-(\d{1,2})(?:-(\d{1,2}))?")
+_US = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+_MONTH_FIRST = re.compile(rf"({_MONTH})(?:\s+(\d{{1,2}}){_ORD})?,?\s+(\d{{4}})", re.IGNORECASE)
+_DAY_FIRST = re.compile(rf"(\d{{1,2}}){_ORD}\s+(?:of\s+)?({_MONTH}),?\s+(\d{{4}})", re.IGNORECASE)
+_YEAR = re.compile(r"\d{4}")
+
+# -----------------------------------------
+# **🔹 NORMALISATION**
+# -----------------------------------------
+
+def _count(token):
+    token = token.lower()
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token]
+
+
+def _shift_months(day, months):
+    """`day` moved back by `months` calendar months, clamped to the end of the month."""
+    year, month = divmod(day.year * 12 + day.month - 1 - months, 12)
+    month += 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _go_back(today, n, unit):
+    unit = unit.lower()
+    if unit.endswith("day"):
+        # Five trading days span a calendar week
+        return today - timedelta(days=n if unit == "day" else -(-n * 7 // 5))
+    if unit == "week":
+        return today - timedelta(weeks=n)
+    return _shift_months(today, n * {"month": 1, "quarter": 3, "year": 12}[unit])
+
+
+def _span(year, month=None, day=None):
+    """First and last day of a year, a month or a single day."""
+    if day is not None:
+        return date(year, month, day), date(year, month, day)
+    if month is not None:
+        return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def _parse_date(text):
+    """(first, last) day an explicit date token covers, or None if it is not a real date."""
+    text = text.strip()
+    try:
+        if match := _ISO.fullmatch(text):
+            year, month, day = match.groups()
+            return _span(int(year), int(month), int(day) if day else None)
+        if match := _US.fullmatch(text):
+            month, day, year = match.groups()
+            return _span(int(year), int(month), int(day))
+        if match := _MONTH_FIRST.fullmatch(text):
+            month, day, year = match.groups()
+            return _span(int(year), _MONTHS[month.rstrip(".").lower()], int(day) if day else None)
+        if match := _DAY_FIRST.fullmatch(text):
+            day, month, year = match.groups()
+            return _span(int(year), _MONTHS[month.rstrip(".").lower()], int(day))
+        if _YEAR.fullmatch(text):
+            return _span(int(text))
+    except ValueError:  # Month 13, February 30, ...
+        return None
+    return None
+
+
+def _resolve(match, today):
+    """(start, end) dates of one matched expression, or None."""
+    kind = match.lastgroup
+    if kind == "ago":
+        day = _go_back(today, _count(match["ago_n"]), match["ago_unit"])
+        return day, day
+    if kind == "last":
+        return _go_back(today, _count(match["last_n"] or "1"), match["last_unit"]), today
+    if kind == "ytd":
+        return date(today.year, 1, 1), today
+    if kind == "mtd":
+        return date(today.year, today.month, 1), today
+    if kind == "yesterday":
+        return today - timedelta(days=1), today - timedelta(days=1)
+    if kind == "between":
+        first, last = _parse_date(match["from_date"]), _parse_date(match["to_date"])
+        return (first[0], last[1]) if first and last else None
+    if kind == "since":
+        span = _parse_date(match["since_date"] or match["from_date_open"])
+        return (span[0], today) if span else None
+    if kind == "within":
+        return _parse_date(match["within_date"] or match["in_date"] or match["for_date"])
+    return _parse_date(match["on"])
+
+# -----------------------------------------
+# **🔹 PUBLIC API**
+# -----------------------------------------
+
+def parse_date_ranges(text, today=None):
+    """Every date expression in `text`, in order, as ("YYYY-MM-DD", "YYYY-MM-DD") inclusive ranges.
+
+    A single day ("3 weeks ago", "2020-03-15") has start == end; periods
+    ("since March 2020", "YTD", "last 5 years", "in 2020") span several. Ranges
+    are clipped to end at `today` (default: the local date); ones wholly in
+    the future are dropped.
+    """
+    today = today or date.today()
+    if isinstance(today, str):
+        today = date.fromisoformat(today)
+    ranges = []
+    for match in _EXPRESSIONS.finditer(text):
+        span = _resolve(match, today)
+        if span is None or span[0] > today:
+            continue
+        start, end = span
+        ranges.append((start.isoformat(), min(end, today).isoformat()))
+    return ranges
@@ -0,0 +1,172 @@
+import numbers
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import submit
+
+# -----------------------------------------
+# **🔹 DATA-LOOKUP INTENT DETECTION**
+# -----------------------------------------
+
+# field -> (pattern, section the value is read from)
+LOOKUP_FIELDS = OrderedDict([
+    ("price", (re.compile(r"\b(price|quote|trading at|worth|cost|how much|close|closing)\b", re.IGNORECASE), "real_time")),
+    ("open", (re.compile(r"\bopen(ed|ing)?\b", re.IGNORECASE), "real_time")),
+    ("high", (re.compile(r"\bhigh\b", re.IGNORECASE), "real_time")),
+    ("low", (re.compile(r"\blow\b", re.IGNORECASE), "real_time")),
+    ("volume", (re.compile(r"\bvolume\b", re.IGNORECASE), "real_time")),
+    ("sma", (re.compile(r"\b(sma|moving averages?)\b", re.IGNORECASE), "analytics")),
+    ("rsi", (re.compile(r"\brsi\b", re.IGNORECASE), "analytics")),
+    ("bollinger", (re.compile(r"\bbollinger\b", re.IGNORECASE), "analytics")),
+    ("beta", (re.compile(r"\bbeta\b", re.IGNORECASE), "analytics")),
+    ("monte_carlo", (re.compile(r"\bmonte carlo\b", re.IGNORECASE), "analytics")),
+])
+
+
+def detect_lookup_fields(user_query):
+    """Returns the data fields a lookup query asks for, or [] if it is not a pure lookup."""
+    return [field for field, (pattern, _) in LOOKUP_FIELDS.items() if pattern.search(user_query)]
+
+
+def needs_analytics(fields):
+    """True when any requested field comes from collect_advanced_analytics."""
+    return any(LOOKUP_FIELDS[field][1] == "analytics" for field in fields)
+
+# -----------------------------------------
+# **🔹 DETERMINISTIC ANSWER RENDERING**
+# -----------------------------------------
+
+def _fmt(value, prefix=""):
+    if isinstance(value, numbers.Real):
+        return f"{prefix}{value:,.2f}"
+    return "N/A"
+
+
+def _quote(sources):
+    """Picks the first available provider quote for a ticker."""
+    for name in ("Yahoo", "Polygon"):
+        quote = sources.get(name) if isinstance(sources, dict) else None
+        if quote:
+            return quote
+    return None
+
+
+def _render_real_time(ticker, field, sources):
+    quote = _quote(sources)
+    if quote is None or not isinstance(quote.get(field), numbers.Real):
+        return None
+    if field == "volume":
+        return f"🔹 **{ticker}** volume: {int(quote['volume']):,} ({quote['source']}, as of {quote['timestamp']})"
+    label = "price" if field == "price" else f"{field} price"
+    return f"🔹 **{ticker}** {label}: {_fmt(quote[field], '$')} ({quote['source']}, as of {quote['timestamp']})"
+
+
+def _render_analytics(ticker, field, data):
+    if not isinstance(data, dict) or "error" in data:
+        return None
+    if field == "sma":
+        sma = data.get("Moving Averages", {})
+        return (f"🔹 **{ticker}** SMA: 7-day {_fmt(sma.get('SMA_7'), '$')}, "
+                f"30-day {_fmt(sma.get('SMA_30'), '$')}, 90-day {_fmt(sma.get('SMA_90'), '$')}")
+    if field == "rsi":
+        return f"🔹 **{ticker}** RSI (14): {_fmt(data.get('RSI'))}"
+    if field == "bollinger":
+        bands = data.get("Bollinger Bands", {})
+        return (f"🔹 **{ticker}** Bollinger Bands: upper {_fmt(bands.get('Upper Band'), '$')}, "
+                f"middle {_fmt(bands.get('Middle Band (SMA)'), '$')}, lower {_fmt(bands.get('Lower Band'), '$')}")
+    if field == "beta":
+        return f"🔹 **{ticker}** Beta vs S&P 500: {_fmt(data.get('Beta Coefficient'))}"
+    if field == "monte_carlo":
+        mc = data.get("Monte Carlo Simulation", {})
+        return (f"🔹 **{ticker}** 30-day Monte Carlo: 5th pct {_fmt(mc.get('5th Percentile'), '$')}, "
+                f"median {_fmt(mc.get('50th Percentile (Median)'), '$')}, 95th pct {_fmt(mc.get('95th Percentile'), '$')}")
+    return None
+
+
+def render_lookup_answer(fields, real_time_data, analysis_data):
+    """Renders an answer straight from the collected dicts; None if any value is missing."""
+    if "error" in real_time_data:
+        return None
+    lines = []
+    for ticker in real_time_data:
+        for field in fields:
+            if LOOKUP_FIELDS[field][1] == "real_time":
+                line = _render_real_time(ticker, field, real_time_data[ticker])
+            else:
+                line = _render_analytics(ticker, field, analysis_data.get(ticker))
+            if line is None:
+                return None  # Incomplete data: let the LLM explain instead
+            lines.append(line)
+    return "\n".join(lines) if lines else None
+
+# Lookup field -> bar field, for questions about a past date
+HISTORICAL_FIELDS = {"price": "close", "open": "open", "high": "high", "low": "low", "volume": "volume"}
+
+
+def is_historical_lookup(fields):
+    """True when every requested field can be read off a past daily bar."""
+    return bool(fields) and all(field in HISTORICAL_FIELDS for field in fields)
+
+
+def render_historical_answer(fields, historical_data):
+    """Renders past bars from collect_historical_data; None unless every field is a bar field."""
+    if not is_historical_lookup(fields):
+        return None
+    lines = []
+    for ticker, bar in historical_data.items():
+        if "error" in bar:
+            return None
+        day = bar["date"] if bar["date"] == bar["requested"] else \
+            f"{bar['date']} (nearest trading day to {bar['requested']})"
+        for field in fields:
+            if field == "volume":
+                lines.append(f"🔹 **{ticker}** volume on {day}: {bar['volume']:,}")
+            else:
+                label = "close" if field == "price" else f"{field} price"
+                lines.append(f"🔹 **{ticker}** {label} on {day}: {_fmt(bar[HISTORICAL_FIELDS[field]], '$')}")
+        if bar.get("through"):
+            lines.append(f"🔹 **{ticker}** change {bar['date']} to {bar['through']}: {bar['change_pct']:+.2f}% "
+                         f"(close {_fmt(bar['now'], '$')})")
+        else:
+            lines.append(f"🔹 **{ticker}** change since {bar['date']}: {bar['change_pct']:+.2f}% "
+                         f"(now {_fmt(bar['now'], '$')}, {bar['now_as_of']})")
+    return "\n".join(lines) if lines else None
+
+# -----------------------------------------
+# **🔹 BACKGROUND PROSE JOBS**
+# -----------------------------------------
+
+MAX_PROSE_JOBS = 256
+
+_prose_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prose")
+_prose_jobs = OrderedDict()
+_prose_lock = threading.Lock()
+
+
+def submit_prose_job(fn, *args):
+    """Runs fn(*args) in the background and returns a job id to poll."""
+    job_id = uuid.uuid4().hex
+    # The job's spans join the request's trace even though they end after it
+    future = submit(_prose_executor, fn, *args)
+    with _prose_lock:
+        _prose_jobs[job_id] = future
+        while len(_prose_jobs) > MAX_PROSE_JOBS:
+            _prose_jobs.popitem(last=False)
+    return job_id
+
+
+def get_prose_job(job_id):
+    """Returns {"status": ...} for a job, with "response" once it is done; None if unknown."""
+    with _prose_lock:
+        future = _prose_jobs.get(job_id)
+    if future is None:
+        return None
+    if not future.done():
+        return {"status": "pending"}
+    try:
+        return {"status": "done", "response": future.result()}
+    except Exception as e:
+        return {"status": "error", "response": str(e)}
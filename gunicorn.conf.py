@@ -0,0 +1,38 @@
+"""gunicorn settings: gunicorn -c gunicorn.conf.py main:app
+
+With GUNICORN_PRELOAD=1 (the default) the app is imported once in the master,
+which then builds the ticker index and history store (preload.py) before
+forking, so workers share those pages copy-on-write instead of each building
+their own. Caches (quotes, histories, analytics, LLM answers) and rate-limit
+buckets go through SQLite files on local disk so every worker sees the
+others' fetches and token usage; CACHE_BACKEND=redis shares them across hosts.
+The history cache also keeps an in-process tier in front of the shared store
+(cache.CACHE_LOCAL_TIER), so preloaded frames are still read copy-on-write.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+# Read by main.py at import, which happens after this file is loaded
+os.environ["GUNICORN_PRELOAD"] = "1" if preload_app else "0"
+os.environ.setdefault("CACHE_BACKEND", "sqlite")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "sqlite")
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported and before any worker forks
+    if preload_app:
+        import main
+        from preload import preload
+        preload(main)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import main
+        main.start_background_tasks()
@@ -0,0 +1,304 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# **🔹 ARCHIVE CONFIGURATION**
+# -----------------------------------------
+
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "history_archive")
+# float64 keeps Yahoo's adjusted prices exactly; float32 halves the record (48 -> 32 bytes)
+HISTORY_ARCHIVE_PRICE_DTYPE = os.getenv("HISTORY_ARCHIVE_PRICE_DTYPE", "float64")
+# How long a synced archive answers period="max" before the next incremental download
+HISTORY_ARCHIVE_TTL = float(os.getenv("HISTORY_ARCHIVE_TTL", "3600"))
+# A stored close differing from Yahoo's by more than this means prices were re-adjusted
+# (a split or dividend), so the archive is rewritten instead of appended to
+HISTORY_ARCHIVE_ADJUST_TOLERANCE = float(os.getenv("HISTORY_ARCHIVE_ADJUST_TOLERANCE", "1e-4"))
+
+ARCHIVE_VERSION = 1
+# Yahoo periods and the calendar days each is sure to cover, for incremental downloads
+CATCH_UP_PERIODS = [("5d", 4), ("1mo", 28), ("3mo", 89), ("6mo", 180), ("1y", 364),
+                    ("2y", 729), ("5y", 1825), ("10y", 3650)]
+PRICE_FIELDS = ("open", "high", "low", "close")
+FRAME_COLUMNS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+
+def record_dtype(price_dtype=HISTORY_ARCHIVE_PRICE_DTYPE):
+    """One fixed-width bar: trading date, OHLC in `price_dtype`, integer volume."""
+    import numpy as np
+    price = np.dtype(price_dtype).newbyteorder("<")
+    return np.dtype([("date", "<M8[D]")] + [(f, price) for f in PRICE_FIELDS] + [("volume", "<i8")])
+
+
+def catch_up_period(last_date, today):
+    """Shortest Yahoo period reaching back to `last_date` (kept as the overlap), else "max"."""
+    import numpy as np
+    gap = int((np.datetime64(today, "D") - np.datetime64(last_date, "D")).astype(int))
+    return next((period for period, days in CATCH_UP_PERIODS if gap <= days), "max")
+
+
+def window_period(start, today):
+    """Shortest Yahoo period covering `start`..today and the first day it surely covers.
+
+    ("max", None) when `start` is None (the whole history) or further back than 10y.
+    """
+    import numpy as np
+    if start is None:
+        return "max", None
+    period = catch_up_period(start, today)
+    days = dict(CATCH_UP_PERIODS).get(period)
+    return period, None if days is None else str(np.datetime64(today, "D") - days)
+
+# -----------------------------------------
+# **🔹 PER-TICKER ARCHIVE**
+# -----------------------------------------
+
+class ArchiveView:
+    """Read-only memory maps of one ticker's archive as of one committed record count.
+
+    `records` is the structured bar array and `dates` the contiguous date
+    index; slices of either are views into the page cache, so a range read
+    touches only the pages it covers.
+    """
+
+    def __init__(self, meta, records, dates):
+        self.meta = meta
+        self.records = records
+        self.dates = dates
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def tz(self):
+        return self.meta.get("tz")
+
+    def covers(self, start):
+        """True if every bar from `start` on was downloaded (a "since" of None is the whole history)."""
+        since = self.meta.get("since")
+        return since is None or (start is not None and str(start) >= since)
+
+    def bounds(self, start=None, end=None):
+        """Record positions [lo, hi) of bars dated start..end inclusive (dates, strings or None)."""
+        import numpy as np
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "D"), "left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "D"), "right"))
+        return lo, max(lo, hi)
+
+    def nearest(self, date):
+        """Position of the last trading day on or before `date` (the first bar if earlier); None if empty."""
+        import numpy as np
+        if not len(self.dates):
+            return None
+        position = int(np.searchsorted(self.dates, np.datetime64(date, "D"), "right")) - 1
+        return max(position, 0)
+
+    def bar_at(self, date):
+        """The bar of the trading day nearest to `date` (see nearest) as a plain dict, or None."""
+        position = self.nearest(date)
+        if position is None:
+            return None
+        record = self.records[position]
+        bar = {field: float(record[field]) for field in PRICE_FIELDS}
+        bar["volume"] = int(record["volume"])
+        bar["date"] = str(record["date"])
+        return bar
+
+    def slice(self, start=None, end=None):
+        """Structured records dated start..end inclusive, as a zero-copy view."""
+        lo, hi = self.bounds(start, end)
+        return self.records[lo:hi]
+
+    def column(self, field, start=None, end=None):
+        """One field over start..end as a (strided) zero-copy view."""
+        return self.slice(start, end)[field]
+
+    def to_frame(self, start=None, end=None):
+        """Copies start..end into a yfinance-shaped frame (exchange-local midnight index)."""
+        import pandas as pd
+        records = self.slice(start, end)
+        index = pd.DatetimeIndex(records["date"].astype("M8[ns]"), name="Date")
+        if self.tz:
+            index = index.tz_localize(self.tz)
+        return pd.DataFrame({column: records[field].astype("float64" if field != "volume" else "int64")
+                             for field, column in FRAME_COLUMNS.items()}, index=index)
+
+
+class HistoryArchive:
+    """Append-only daily bar archives, one set of files per ticker:
+
+        <TICKER>.dat   fixed-width records (record_dtype), oldest first
+        <TICKER>.idx   the same dates as one contiguous datetime64[D] array
+        <TICKER>.json  metadata: committed record count, dtype, time zone, sync time,
+                       and the day from which the history is complete ("since")
+
+    Appends write records and dates first and commit by atomically replacing
+    the metadata, so readers only ever see whole bars, and bytes left by an
+    interrupted append are truncated by the next one. A cross-process file
+    lock serialises writers (every gunicorn worker may sync). Only completed
+    sessions are stored; a re-adjustment of past prices rewrites the files.
+    """
+
+    def __init__(self, root=HISTORY_ARCHIVE_DIR, price_dtype=HISTORY_ARCHIVE_PRICE_DTYPE):
+        self.root = root
+        self.price_dtype = price_dtype
+        self.lock = threading.Lock()
+        self.views = {}  # ticker -> (meta mtime_ns, ArchiveView)
+
+    def _path(self, ticker, suffix):
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", ticker)
+        return os.path.join(self.root, f"{safe}{suffix}")
+
+    def _read_meta(self, ticker):
+        try:
+            with open(self._path(ticker, ".json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_meta(self, ticker, meta):
+        path = self._path(ticker, ".json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def open(self, ticker):
+        """Returns the committed ArchiveView, or None if the ticker was never archived.
+
+        Maps are reused until the metadata changes, so repeated lookups cost a
+        stat() plus whatever pages the lookup touches.
+        """
+        import numpy as np
+        try:
+            mtime = os.stat(self._path(ticker, ".json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self.views.get(ticker)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        meta = self._read_meta(ticker)
+        if meta is None:
+            return None
+        dtype = np.dtype([tuple(f) for f in meta["dtype"]])
+        count = meta["count"]
+        # A rewrite may have replaced the data after this metadata was read; never map past the end
+        count = min(count, os.path.getsize(self._path(ticker, ".dat")) // dtype.itemsize,
+                    os.path.getsize(self._path(ticker, ".idx")) // 8)
+        if count == 0:
+            records = np.zeros(0, dtype=dtype)
+            dates = np.zeros(0, dtype="<M8[D]")
+        else:
+            records = np.memmap(self._path(ticker, ".dat"), dtype=dtype, mode="r", shape=(count,))
+            dates = np.memmap(self._path(ticker, ".idx"), dtype="<M8[D]", mode="r", shape=(count,))
+        view = ArchiveView(meta, records, dates)
+        with self.lock:
+            self.views[ticker] = (mtime, view)
+        return view
+
+    def is_fresh(self, ticker, ttl=HISTORY_ARCHIVE_TTL):
+        meta = self._read_meta(ticker)
+        return meta is not None and time.time() - meta.get("synced_at", 0) < ttl
+
+    def _to_records(self, frame, today):
+        """Completed sessions of a yfinance frame as records; returns (records, tz)."""
+        import numpy as np
+        index = frame.index
+        tz = str(index.tz) if getattr(index, "tz", None) is not None else None
+        dates = np.asarray(index.tz_localize(None) if tz else index, dtype="M8[D]")
+        keep = dates < np.datetime64(today, "D")  # Today's bar is still moving
+        records = np.zeros(int(keep.sum()), dtype=record_dtype(self.price_dtype))
+        records["date"] = dates[keep]
+        for field in PRICE_FIELDS:
+            records[field] = frame[FRAME_COLUMNS[field]].to_numpy()[keep]
+        records["volume"] = np.nan_to_num(frame["Volume"].to_numpy()[keep]).astype("int64")
+        return records, tz
+
+    def sync(self, ticker, frame, full=False, today=None, since=None):
+        """Stores the bars of `frame` newer than the archive; returns the number of bars written.
+
+        A partial `frame` must overlap the last stored bar, which is compared
+        to detect re-adjusted prices. Without an overlap, or on a mismatch, the
+        archive has to be rebuilt: with full=True (`frame` is the whole
+        history) it is rewritten, otherwise nothing is written and None is
+        returned so the caller can download the full history. A ticker with
+        no archive yet is written from whatever `frame` covers. A rewrite records
+        `since`, the first day `frame` was requested from (None for "max").
+        """
+        import numpy as np
+        import pandas as pd
+        if frame is None or frame.empty:
+            return 0
+        if today is None:
+            tz = getattr(frame.index, "tz", None)
+            today = pd.Timestamp.now(tz=tz).strftime("%Y-%m-%d")
+        records, tz = self._to_records(frame, today)
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path(ticker, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            meta = self._read_meta(ticker)
+            view = self.open(ticker) if meta is not None else None
+            rewrite = (full or view is None or len(view) == 0 or meta.get("version") != ARCHIVE_VERSION
+                       or meta.get("dtype") != [[n, records.dtype[n].str] for n in records.dtype.names])
+            new = records
+            if not rewrite:
+                last = view.records[-1]
+                overlap = records[records["date"] == last["date"]]
+                if not len(overlap) or not np.isclose(overlap["close"][0], last["close"],
+                                                      rtol=HISTORY_ARCHIVE_ADJUST_TOLERANCE):
+                    rewrite = True
+                    if not len(overlap):
+                        logger.info("History archive has no overlap with download, rewriting",
+                                    extra={"ticker": ticker})
+                    else:
+                        logger.info("Archived prices were re-adjusted, rewriting", extra={"ticker": ticker})
+                else:
+                    new = records[records["date"] > last["date"]]
+            if rewrite:
+                if not full and view is not None and len(view):
+                    return None  # Would drop stored bars that `frame` does not cover
+                self._rewrite(ticker, records, tz, since)
+            else:
+                self._append(ticker, meta, new)
+            return len(records) if rewrite else len(new)
+
+    def _append(self, ticker, meta, records):
+        itemsize = records.dtype.itemsize
+        for suffix, data, width in ((".dat", records, itemsize), (".idx", records["date"], 8)):
+            with open(self._path(ticker, suffix), "r+b") as f:
+                f.truncate(meta["count"] * width)  # Drops bytes of an interrupted append
+                f.seek(0, os.SEEK_END)
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self._write_meta(ticker, dict(meta, count=meta["count"] + len(records), synced_at=time.time()))
+
+    def _rewrite(self, ticker, records, tz, since=None):
+        import numpy as np
+        for suffix, data in ((".dat", records), (".idx", np.ascontiguousarray(records["date"]))):
+            path = self._path(ticker, suffix)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        self._write_meta(ticker, {"version": ARCHIVE_VERSION, "count": len(records), "tz": tz,
+                                  "dtype": [[name, records.dtype[name].str] for name in records.dtype.names],
+                                  "since": since, "synced_at": time.time()})
+
+    def stats(self):
+        with self.lock:
+            return {"open_tickers": len(self.views),
+                    "mapped_bytes": sum(v.records.nbytes + v.dates.nbytes for _, v in self.views.values())}
+
+
+history_archive = HistoryArchive()
@@ -0,0 +1,102 @@
+import contextvars
+from contextlib import contextmanager
+
+from metrics import history_downloaded_bytes, history_downloaded_rows, history_processed_rows
+
+# -----------------------------------------
+# **🔹 INDICATOR LOOKBACKS**
+# -----------------------------------------
+
+# indicator -> (lookback bars, warm-up bars) that the last value depends on. The indicators
+# are simple rolling windows, so the warm-up is only the extra bar a first difference eats;
+# Monte Carlo and Beta estimate from the last ~6 months (120) of daily returns.
+INDICATOR_WINDOWS = {
+    "sma": (90, 0),
+    "rsi": (14, 1),
+    "monte_carlo": (120, 1),
+    "beta": (120, 1),
+    "bollinger": (20, 0),
+}
+
+# Yahoo periods and the trading bars each surely holds, holidays included
+PERIOD_BARS = [("5d", 3), ("1mo", 19), ("3mo", 60), ("6mo", 122), ("1y", 248),
+               ("2y", 499), ("5y", 1250), ("10y", 2500)]
+
+# Longest cached history worth slicing instead of downloading a shorter one; prefetch and
+# the full analytics path keep 6mo warm for every popular ticker
+HISTORY_REUSE_PERIOD = "6mo"
+
+
+def indicator_bars(name):
+    lookback, warmup = INDICATOR_WINDOWS[name]
+    return lookback + warmup
+
+
+def period_for_bars(bars):
+    """Shortest Yahoo period sure to hold `bars` daily bars ("max" beyond 10 years)."""
+    return next((period for period, held in PERIOD_BARS if held >= bars), "max")
+
+
+def reusable_periods(period):
+    """`period` followed by the longer cached periods a window of it can be sliced from."""
+    names = [name for name, _ in PERIOD_BARS]
+    if period not in names:
+        return [period]
+    start = names.index(period)
+    stop = max(start, names.index(HISTORY_REUSE_PERIOD))
+    return names[start:stop + 1]
+
+
+def plan_history(indicators=None, ranges=()):
+    """The least history a query needs: which indicators, how many bars, which period.
+
+    `indicators` are lookup field names (None means all, as the LLM path shows
+    every one); non-indicator fields are ignored. `ranges` are parsed date
+    ranges, served from the history archive from the earliest "start" on.
+    """
+    names = list(INDICATOR_WINDOWS) if indicators is None else \
+        [name for name in INDICATOR_WINDOWS if name in indicators]
+    bars = {name: indicator_bars(name) for name in names}
+    window = max(bars.values(), default=0)
+    return {"indicators": bars, "bars": window, "period": period_for_bars(window) if window else None,
+            "start": min((start for start, _ in ranges), default=None)}
+
+# -----------------------------------------
+# **🔹 HISTORY TRANSFER ACCOUNTING**
+# -----------------------------------------
+
+# Totals of the request being handled, or None outside a tracked request
+_usage = contextvars.ContextVar("history_usage", default=None)
+
+
+@contextmanager
+def track_history_usage():
+    """Collects this context's history traffic; yields {downloaded_bytes, downloaded_rows, processed_rows}."""
+    usage = {"downloaded_bytes": 0, "downloaded_rows": 0, "processed_rows": 0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def _add(key, amount):
+    usage = _usage.get()
+    if usage is not None:
+        usage[key] += amount
+
+
+def record_download(frame, kind):
+    """Counts a history frame received from Yahoo; `kind` is "single", "batch", "archive" or "quote"."""
+    if frame is None or frame.empty:
+        return
+    nbytes = int(frame.memory_usage(index=True).sum())
+    history_downloaded_bytes.inc(kind, amount=nbytes)
+    history_downloaded_rows.inc(kind, amount=len(frame))
+    _add("downloaded_bytes", nbytes)
+    _add("downloaded_rows", len(frame))
+
+
+def record_processed(indicator, rows):
+    history_processed_rows.inc(indicator, amount=rows)
+    _add("processed_rows", rows)
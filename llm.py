@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import time
+
+from replay import ReplayLLMBackend, recorder
+from tracing import span
+
+# -----------------------------------------
+# **🔹 LLM CLIENT CONFIGURATION**
+# -----------------------------------------
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # openai | http | stub
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:8000/v1")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Bound on all attempts of one call together, backoff included; keep it under the gunicorn timeout
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "90"))
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+
+
+class LLMError(Exception):
+    """Raised when a backend fails after all retries."""
+
+
+def _make_session():
+    """Builds a pooled HTTP session so connections are reused across calls."""
+    import requests
+    import requests.adapters
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# -----------------------------------------
+# **🔹 BACKENDS**
+# -----------------------------------------
+
+class OpenAISDKBackend:
+    """Calls the installed openai SDK (0.28 ChatCompletion API)."""
+
+    name = "openai"
+
+    def __init__(self, api_key=None):
+        import openai
+        self.openai = openai
+        self.openai.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        # openai 0.28 honours a module-level session, which keeps TLS connections warm
+        self.openai.requestssession = _make_session()
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        response = self.openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            request_timeout=timeout
+        )
+        return {
+            "content": response['choices'][0]['message']['content'],
+            "model": response.get('model', model),
+            "usage": dict(response.get('usage', {}))
+        }
+
+    def stream(self, messages, model, max_tokens, temperature, timeout):
+        chunks = self.openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            request_timeout=timeout,
+            stream=True
+        )
+        for chunk in chunks:
+            text = chunk['choices'][0].get('delta', {}).get('content')
+            if text:
+                yield text
+
+
+class OpenAICompatibleBackend:
+    """Talks to any server exposing the OpenAI /chat/completions HTTP API."""
+
+    name = "http"
+
+    def __init__(self, base_url=None, api_key=None):
+        self.base_url = (base_url or LLM_BASE_URL).rstrip("/")
+        self.session = _make_session()
+        key = api_key or os.getenv("OPENAI_API_KEY")
+        if key:
+            self.session.headers["Authorization"] = f"Bearer {key}"
+
+    def _post(self, payload, timeout, stream=False):
+        response = self.session.post(f"{self.base_url}/chat/completions",
+                                     json=payload, timeout=timeout, stream=stream)
+        response.raise_for_status()
+        return response
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        payload = {"model": model, "messages": messages,
+                   "max_tokens": max_tokens, "temperature": temperature}
+        body = self._post(payload, timeout).json()
+        return {
+            "content": body["choices"][0]["message"]["content"],
+            "model": body.get("model", model),
+            "usage": body.get("usage", {})
+        }
+
+    def stream(self, messages, model, max_tokens, temperature, timeout):
+        payload = {"model": model, "messages": messages, "max_tokens": max_tokens,
+                   "temperature": temperature, "stream": True}
+        with self._post(payload, timeout, stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                text = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if text:
+                    yield text
+
+
+class StubBackend:
+    """Deterministic offline model: same prompt in, same answer out."""
+
+    name = "stub"
+
+    def __init__(self, latency_ms=None):
+        self.latency_ms = LLM_STUB_LATENCY_MS if latency_ms is None else latency_ms
+
+    def _answer(self, messages, max_tokens):
+        prompt = messages[-1]["content"] if messages else ""
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        words = f"[stub-{digest}] Deterministic analysis for: {prompt[:200]}".split()
+        return " ".join(words[:max_tokens])
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        content = self._answer(messages, max_tokens)
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        completion_tokens = len(content.split())
+        return {
+            "content": content,
+            "model": f"stub:{model}",
+            "usage": {"prompt_tokens": prompt_tokens,
+                      "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        }
+
+    def stream(self, messages, model, max_tokens, temperature, timeout):
+        for i, word in enumerate(self.complete(messages, model, max_tokens,
+                                               temperature, timeout)["content"].split()):
+            yield word if i == 0 else " " + word
+
+
+BACKENDS = {
+    "openai": OpenAISDKBackend,
+    "http": OpenAICompatibleBackend,
+    "stub": StubBackend,
+}
+
+# -----------------------------------------
+# **🔹 CLIENT WITH TIMEOUTS & RETRIES**
+# -----------------------------------------
+
+# openai 0.28 error classes worth another attempt; auth and invalid-request errors are not
+_TRANSIENT_OPENAI_ERRORS = {"Timeout", "APIConnectionError", "RateLimitError", "ServiceUnavailableError",
+                            "TryAgain"}
+
+
+def is_transient(error):
+    """True for timeouts, connection failures, 429 and 5xx responses; other errors will not go away."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _TRANSIENT_OPENAI_ERRORS:
+        return True
+    try:
+        import requests
+        if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+            return True
+    except ImportError:
+        pass
+    response = getattr(error, "response", None)
+    status = getattr(error, "http_status", None) or getattr(response, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+class LLMClient:
+    """Backend-agnostic chat client with timeouts and retry/backoff.
+
+    Only transient errors (is_transient) are retried, and every attempt of
+    one call, backoff included, fits in `deadline` seconds.
+    """
+
+    def __init__(self, backend, model=None, timeout=None, max_retries=None, backoff=0.5, deadline=None):
+        self.backend = backend
+        self.model = model or LLM_MODEL
+        self.timeout = LLM_TIMEOUT if timeout is None else timeout
+        self.max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = backoff
+        self.deadline = LLM_DEADLINE if deadline is None else deadline
+
+    def _attempts(self):
+        """Yields (attempt, timeout) while retries and the deadline allow; backs off in between."""
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self.backoff * (2 ** (attempt - 1))
+                if time.monotonic() + delay >= deadline:
+                    return
+                time.sleep(delay)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            yield attempt, min(self.timeout, remaining)
+
+    def complete(self, messages, model=None, max_tokens=1000, temperature=0.7):
+        """Returns {"content", "model", "usage"}; raises LLMError when retries run out."""
+        last_error = None
+        with span("llm.chat_completion", backend=self.backend.name, model=model or self.model,
+                  max_tokens=max_tokens or 0) as s:
+            for attempt, timeout in self._attempts():
+                s.set_attribute("attempts", attempt + 1)
+                try:
+                    response = self.backend.complete(messages, model or self.model,
+                                                     max_tokens, temperature, timeout)
+                    usage = response.get("usage") or {}
+                    s.set_attribute("prompt_tokens", usage.get("prompt_tokens", 0))
+                    s.set_attribute("completion_tokens", usage.get("completion_tokens", 0))
+                    return response
+                except Exception as e:
+                    last_error = e
+                    if not is_transient(e):
+                        break
+            raise LLMError(f"{self.backend.name} backend failed: {last_error or 'deadline exceeded'}")
+
+    def stream(self, messages, model=None, max_tokens=1000, temperature=0.7):
+        """Yields text chunks; only the connection setup is retried."""
+        last_error = None
+        for _, timeout in self._attempts():
+            try:
+                chunks = self.backend.stream(messages, model or self.model,
+                                             max_tokens, temperature, timeout)
+                first = next(chunks, None)
+                break
+            except Exception as e:
+                last_error = e
+                if not is_transient(e):
+                    raise LLMError(f"{self.backend.name} backend failed: {e}") from e
+        else:
+            raise LLMError(f"{self.backend.name} backend failed: {last_error or 'deadline exceeded'}")
+        if first is not None:
+            yield first
+            yield from chunks
+
+
+_client = None
+
+
+def get_llm_client():
+    """Returns the process-wide client for the backend selected by LLM_BACKEND.
+
+    Under PROVIDER_REPLAY_MODE=record/replay, real backends are wrapped so
+    completions are saved or served from disk; the stub is already offline.
+    """
+    global _client
+    if _client is None:
+        if LLM_BACKEND not in BACKENDS:
+            raise LLMError(f"Unknown LLM_BACKEND '{LLM_BACKEND}', expected one of {sorted(BACKENDS)}")
+        if LLM_BACKEND != "stub" and recorder.mode == "replay":
+            backend = ReplayLLMBackend(None)
+        elif LLM_BACKEND != "stub" and recorder.mode == "record":
+            backend = ReplayLLMBackend(BACKENDS[LLM_BACKEND]())
+        else:
+            backend = BACKENDS[LLM_BACKEND]()
+        _client = LLMClient(backend)
+    return _client
+
+
+def set_llm_client(client):
+    """Swaps the process-wide client (used by benchmarks to install the stub)."""
+    global _client
+    _client = client
@@ -0,0 +1,124 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+# -----------------------------------------
+# **🔹 LOGGING CONFIGURATION**
+# -----------------------------------------
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Per-logger overrides, e.g. "prefetch=WARNING,main=DEBUG"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# Applied before LOG_LEVELS; yfinance turns off threaded downloads when its logger is at DEBUG
+DEFAULT_LOG_LEVELS = "yfinance=INFO,urllib3=INFO,peewee=INFO"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+# Fraction of requests whose full data payloads are logged (at DEBUG)
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# -----------------------------------------
+# **🔹 FORMATTERS**
+# -----------------------------------------
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                  .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs; extra fields are appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extra = " ".join(f"{k}={v!r}" for k, v in record.__dict__.items() if k not in _RESERVED)
+        return f"{line} {extra}" if extra else line
+
+# -----------------------------------------
+# **🔹 NON-BLOCKING HANDLER**
+# -----------------------------------------
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted so the message and payload reprs are built off the request thread.
+
+    The stock QueueHandler formats in prepare(), on the caller's thread.
+    Objects passed as args or extra must therefore not be mutated after logging.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+
+
+def setup_logging(stream=None):
+    """Routes all logging through a queue drained by one background writer thread.
+
+    Safe to call more than once; only the first call configures handlers.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # Flushes whatever is still queued
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(records)]
+    root.setLevel(LOG_LEVEL.upper())
+    for part in filter(None, (p.strip() for p in f"{DEFAULT_LOG_LEVELS},{LOG_LEVELS}".split(","))):
+        name, level = part.split("=", 1)
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+    return _listener
+
+
+def _restart_after_fork():
+    """The writer thread does not survive fork (gunicorn preload); give the child its own."""
+    records = queue.SimpleQueue()  # Records still queued in the parent are the parent's to write
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, DeferredQueueHandler):
+            handler.queue = records
+    _listener.queue = records
+    _listener._thread = None
+    _listener.start()
+
+
+def log_payload(logger, message, payload, **fields):
+    """Logs a large data payload at DEBUG for a sampled fraction of calls.
+
+    The level check and the sampling draw come first, so unsampled calls
+    cost a comparison and a random number.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug(message, extra={"payload": payload, **fields})
@@ -1,12 +1,38 @@
-import openai
-import yfinance as yf
-import requests
-from flask import Flask, request, jsonify, render_template, session
+# yfinance, pandas, numpy and requests are imported where they are used: together they
+# are most of the import cost, and a worker should not pay it before its first request
+from flask import Flask, request, jsonify, render_template, session, Response
 import os
-import pandas as pd
-import numpy as np
+import functools
 import json
-from datetime import datetime, timedelta
+import threading
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from datetime import datetime
+
+from router import choose_route, complete_routed, route_metrics
+from fast_answers import (detect_lookup_fields, is_historical_lookup, needs_analytics, render_lookup_answer,
+                          render_historical_answer, submit_prose_job, get_prose_job)
+from cache import quote_cache, history_cache, analytics_cache, llm_cache
+from prefetch import PREFETCH_ENABLED, PrefetchScheduler
+from popularity import ticker_popularity
+from ratelimit import rate_limiter
+from resilience import PROVIDER_DEADLINE, PROVIDER_TIMEOUT, providers
+from quotes import resolve_quotes
+from polygon_grouped import POLYGON_GROUPED_ENABLED, grouped_daily
+from batch_history import fetch_history_batch, history_ttl
+from history_archive import catch_up_period, history_archive, window_period
+from date_ranges import parse_date_ranges
+from history_plan import plan_history, record_download, record_processed, reusable_periods, track_history_usage
+from replay import recorder
+from timing import add_sink, stage, timed, timed_request
+from metrics import add_collector, record_stage, render as render_metrics, request_latency
+from logs import log_payload, setup_logging
+from tracing import extract as extract_trace_context, set_attribute, span, submit, traced, trace_stats
+from profiling import request_profile
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Flask app initialization
 app = Flask(__name__)
@@ -14,83 +40,216 @@ app.secret_key = os.urandom(24)  # Enables session memory
 
 @app.route('/')
 def index():
-    print("Rendering index page")
+    logger.debug("Rendering index page")
     return render_template('index.html')
 
 # Load API Keys
 POLYGON_API_KEY = os.getenv("POLYGON_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Load Global Ticker Mapping from JSON File
-TICKER_MAP = {}
-
-try:
-    with open("companies.json", "r") as f:
-        TICKER_MAP = json.load(f)
-        print("Ticker map successfully loaded!")
-except Exception as e:
-    print(f"Error loading ticker map: {str(e)}")
+# Global Ticker Mapping, loaded from JSON on first use
+TICKER_MAP_PATH = os.getenv("TICKER_MAP_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "companies.json"))
+_ticker_map = None
+_ticker_index = ()  # (lowercased company name, ticker) pairs, so queries skip re-lowercasing
+_ticker_map_lock = threading.Lock()
+
+def load_ticker_map():
+    """Returns the company -> ticker map, reading TICKER_MAP_PATH the first time."""
+    global _ticker_map, _ticker_index
+    if _ticker_map is None:
+        with _ticker_map_lock:
+            if _ticker_map is None:
+                ticker_map = {}
+                try:
+                    with open(TICKER_MAP_PATH, "r") as f:
+                        ticker_map = json.load(f)
+                    logger.info("Ticker map loaded", extra={"companies": len(ticker_map)})
+                except Exception as e:
+                    logger.error("Error loading ticker map: %s", e)
+                _ticker_index = tuple((company.lower(), ticker) for company, ticker in ticker_map.items())
+                _ticker_map = ticker_map
+    return _ticker_map
 
 # -----------------------------------------
 # **🔹 STEP 1: REAL-TIME DATA RETRIEVAL**
 # -----------------------------------------
 
-def fetch_real_time_data_polygon(ticker):
+def _polygon_get(url):
+    """GETs a Polygon endpoint; 5xx raises (a provider failure), other statuses come back in the body."""
+    import requests
+    response = requests.get(url, timeout=PROVIDER_TIMEOUT)
+    if response.status_code >= 500:
+        response.raise_for_status()
+    return dict(response.json(), http_status=response.status_code)
+
+def cached_quote(provider, ticker):
+    """The last quote from `provider`, fresh or stale; what is served while its breaker is open."""
+    return quote_cache.get((provider, ticker), allow_stale=True)
+
+@traced()
+def fetch_real_time_data_polygon(ticker, use_cache=True):
     """Fetches real-time stock data from Polygon.io."""
-    print(f"Fetching Polygon data for {ticker}")
+    if use_cache:
+        cached = quote_cache.get(("Polygon", ticker))
+        if cached is not None:
+            return cached
+
+    # One grouped-daily call per session serves every US ticker's previous close; it loads
+    # in the background (or from prefetch), so until then tickers fall back to /prev
+    if POLYGON_GROUPED_ENABLED and grouped_daily.refresh_in_background():
+        quote = grouped_daily.lookup(ticker)
+        if quote is not None:
+            quote_cache.set(("Polygon", ticker), quote)
+            return quote
+
+    if not rate_limiter.acquire("Polygon"):
+        # Queue timed out: fall back to the last known quote instead of failing
+        stale = quote_cache.get(("Polygon", ticker), allow_stale=True)
+        return stale if stale is not None else {"error": "Polygon rate limit reached", "kind": "rate_limited"}
+
+    logger.debug("Fetching Polygon data", extra={"ticker": ticker})
     polygon_url = f"https://api.polygon.io/v2/aggs/ticker/{ticker}/prev?apiKey={POLYGON_API_KEY}"
     try:
-        response = requests.get(polygon_url)
-        data = response.json().get("results", [{}])[0]
-        return {
+        body = recorder.call("Polygon", ["prev", ticker], lambda: _polygon_get(polygon_url))
+        if body.get("http_status") == 429:
+            stale = quote_cache.get(("Polygon", ticker), allow_stale=True)
+            return stale if stale is not None else {"error": "Polygon rate limit reached", "kind": "rate_limited"}
+        if not body.get("results"):
+            return {"error": body.get("error") or body.get("message") or "No Polygon data found",
+                    "kind": "no_data"}
+        data = body["results"][0]
+        quote = {
             "source": "Polygon.io",
             "price": data.get("c", "N/A"),
             "volume": data.get("v", "N/A"),
             "high": data.get("h", "N/A"),
             "low": data.get("l", "N/A"),
             "open": data.get("o", "N/A"),
-            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            # Bar time from Polygon; wall clock only if the bar lacks one
+            "timestamp": (datetime.fromtimestamp(data["t"] / 1000.0) if "t" in data
+                          else datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
         }
+        quote_cache.set(("Polygon", ticker), quote)
+        return quote
     except Exception as e:
         return {"error": str(e)}
 
-def fetch_historical_data_from_yahoo_finance(ticker):
-    """Fetches full historical stock data from Yahoo Finance."""
+def yahoo_history(ticker, period, kind="single"):
+    """The single place Yahoo history is requested; recorded/replayed under PROVIDER_REPLAY_MODE."""
+    import yfinance as yf
+    with span("yfinance.history", ticker=ticker, period=period):
+        data = recorder.call("Yahoo", ["history", ticker, period],
+                             lambda: yf.Ticker(ticker).history(period=period, timeout=PROVIDER_TIMEOUT))
+        record_download(data, kind)
+        return data
+
+def fetch_history(ticker, period="6mo", use_cache=True):
+    """Fetches daily price history from Yahoo Finance through the history cache."""
+    if use_cache:
+        cached = history_cache.get((ticker, period))
+        if cached is not None:
+            return cached
+
+    if not rate_limiter.acquire("Yahoo"):
+        import pandas as pd
+        stale = history_cache.get((ticker, period), allow_stale=True)
+        return stale if stale is not None else pd.DataFrame()
+
+    data = yahoo_history(ticker, period)
+    if not data.empty:
+        history_cache.set((ticker, period), data, ttl=history_ttl(period))
+    return data
+
+def cached_history(ticker, period):
+    """A cached history of `period`, or of a longer period it can be sliced from; None if neither is."""
+    for candidate in reusable_periods(period):
+        cached = history_cache.get((ticker, candidate))
+        if cached is not None:
+            return cached
+    return None
+
+def history_window(ticker, period):
+    """History holding at least `period`'s bars: a cached one of that length or longer, else fetched."""
+    cached = cached_history(ticker, period)
+    return cached if cached is not None else fetch_history(ticker, period=period)
+
+def sync_history_archive(ticker, start=None):
+    """Returns the ticker's archive view covering `start` onwards, downloading only the bars it lacks.
+
+    A fresh archive (synced within HISTORY_ARCHIVE_TTL) that reaches back to
+    `start` is served as is. Otherwise the shortest Yahoo period overlapping the
+    last stored bar is fetched and appended. A ticker with no archive, or one
+    whose archive starts after `start`, downloads the shortest period covering
+    `start` ("max" when `start` is None); so does a price re-adjustment, over
+    the range already archived.
+    """
+    view = history_archive.open(ticker)
+    covered = view is not None and len(view) > 0 and view.covers(start)
+    if covered and history_archive.is_fresh(ticker):
+        return view
+    if not rate_limiter.acquire("Yahoo"):
+        return view  # A stale archive beats none
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    if covered:
+        period, since = catch_up_period(view.dates[-1], today), None
+    else:
+        if start is not None and view is not None and len(view):
+            start = min(start, view.meta["since"])  # Never narrow what is archived
+        period, since = window_period(start, today)
     try:
-        stock = yf.Ticker(ticker)
-        data = stock.history(period="max")  # Fetch full available historical data
-        if data.empty:
+        data = yahoo_history(ticker, period, kind="archive")
+    except Exception as e:
+        if view is None or not len(view):
+            raise
+        logger.warning("History archive sync failed, serving stored bars: %s", e, extra={"ticker": ticker})
+        return view
+    if history_archive.sync(ticker, data, full=not covered, since=since) is None:
+        period, since = window_period(view.meta.get("since"), today)
+        history_archive.sync(ticker, yahoo_history(ticker, period, kind="archive"), full=True, since=since)
+    return history_archive.open(ticker)
+
+def fetch_historical_data_from_yahoo_finance(ticker, start=None, end=None):
+    """Fetches historical stock data for start..end (all of it by default) from the local archive."""
+    try:
+        view = sync_history_archive(ticker, start)
+        if view is None or not len(view):
             return {"error": "No historical data found"}
-        return data
+        return view.to_frame(start, end)  # Copies only the requested bars out of the map
     except Exception as e:
         return {"error": str(e)}
 
 # **🔹 Extract specific date or keywords for historical data from user query**
 def extract_historical_date(user_query):
-    """Extracts specific historical timeframes from user query."""
-    if "one year ago" in user_query.lower():
-        return (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
-    elif "six months ago" in user_query.lower():
-        return (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d')
-    elif "three months ago" in user_query.lower():
-        return (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d')
-    elif "last month" in user_query.lower():
-        return (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-    else:
-        return None
+    """Extracts the first date the query refers to ("3 weeks ago", "since March 2020", ...), or None."""
+    ranges = parse_date_ranges(user_query)
+    return ranges[0][0] if ranges else None
 
-def fetch_real_time_data_yahoo(ticker):
+@traced()
+def fetch_real_time_data_yahoo(ticker, use_cache=True):
     """Fetches real-time stock data from Yahoo Finance."""
-    print(f"Fetching Yahoo Finance data for {ticker}")
+    if use_cache:
+        cached = quote_cache.get(("Yahoo", ticker))
+        if cached is not None:
+            return cached
+
+    # Multi-ticker queries warm the 1d history in one batched download beforehand
+    data = history_cache.get((ticker, "1d")) if use_cache else None
+    if data is None and not rate_limiter.acquire("Yahoo"):
+        stale = quote_cache.get(("Yahoo", ticker), allow_stale=True)
+        return stale if stale is not None else {"error": "Yahoo Finance rate limit reached", "kind": "rate_limited"}
+
     try:
-        stock = yf.Ticker(ticker)
-        data = stock.history(period="1d")
+        if data is None:
+            logger.debug("Fetching Yahoo Finance data", extra={"ticker": ticker})
+            data = yahoo_history(ticker, period="1d", kind="quote")
         latest_data = data.iloc[-1] if not data.empty else None
 
         if latest_data is None:
-            return {"error": "No real-time data found"}
+            return {"error": "No real-time data found", "kind": "no_data"}
 
-        return {
+        quote = {
             "source": "Yahoo Finance",
             "price": latest_data["Close"],
             "volume": latest_data["Volume"],
@@ -99,50 +258,92 @@ def fetch_real_time_data_yahoo(ticker):
             "open": latest_data["Open"],
             "timestamp": latest_data.name.strftime('%Y-%m-%d %H:%M:%S')
         }
+        quote_cache.set(("Yahoo", ticker), quote)
+        return quote
     except Exception as e:
         return {"error": str(e)}
 
 # **🔹 Facilitator: Extract Tickers from Query**
-def extract_tickers(query):
-    """Extracts stock tickers from the user query using a predefined dictionary."""
-    tickers = []
-    print("Extracting tickers:", query)
+@timed("extract_tickers")
+def extract_tickers(query, record=False):
+    """Extracts stock tickers from the user query using a predefined dictionary.
+
+    With record=True the tickers are counted towards popularity, which drives
+    prefetch order and cache eviction; only the request entry point records.
+    """
+    load_ticker_map()
+    query = query.lower()
+    tickers = [ticker for company, ticker in _ticker_index if company in query]
+
+    logger.debug("Extracted tickers", extra={"tickers": tickers, "query_chars": len(query)})
+    if record and tickers:
+        ticker_popularity.record(tickers)
+    return tickers
 
-    for company, ticker in TICKER_MAP.items():
-        if company.lower() in query.lower():
-            tickers.append(ticker)
+# **🔹 Facilitator: Warm Yahoo Quotes in One Download**
+_quote_batch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quote-batch")
 
-    print("Extracted tickers:", tickers)
-    return tickers
+def warm_yahoo_quotes(tickers):
+    """One batched 1d download for the tickers without a fresh Yahoo quote, when there are several.
+
+    Skipped while the Yahoo breaker is not closed, and waited on for at most
+    PROVIDER_DEADLINE; a slower download keeps filling the cache, and the
+    per-ticker fetches go ahead without it.
+    """
+    missing = [t for t in tickers if quote_cache.get(("Yahoo", t)) is None]
+    if len(missing) < 2 or not providers["Yahoo"].breaker.is_closed():
+        return
+    future = submit(_quote_batch_executor, fetch_history_batch, missing, "1d")
+    try:
+        future.result(timeout=PROVIDER_DEADLINE)
+    except FuturesTimeout:
+        logger.warning("Batched Yahoo quote download exceeded %ss, fetching per ticker", PROVIDER_DEADLINE)
+    except Exception as e:
+        logger.warning("Batched Yahoo quote download failed, fetching per ticker: %s", e)
 
 # **🔹 Facilitator: Collect & Validate Real-Time Data**
+@timed("real_time_fetch")
 def collect_real_time_data(query):
     """Fetches real-time data for all detected stock tickers in a query."""
     tickers = extract_tickers(query)
     if not tickers:
         return {"error": "No valid stock ticker found in query."}
 
+    warm_yahoo_quotes(tickers)
+
+    # All providers are queried concurrently; QUOTE_POLICY decides how long to wait for each
+    quotes = resolve_quotes(tickers, {"Yahoo": fetch_real_time_data_yahoo,
+                                      "Polygon": fetch_real_time_data_polygon},
+                            fallbacks={name: functools.partial(cached_quote, name) for name in ("Yahoo", "Polygon")})
+
     real_time_data = {}
     for ticker in tickers:
-        yahoo_data = fetch_real_time_data_yahoo(ticker)
-        polygon_data = fetch_real_time_data_polygon(ticker)
+        yahoo_data = quotes[ticker]["Yahoo"]
+        polygon_data = quotes[ticker]["Polygon"]
 
         real_time_data[ticker] = {
             "Yahoo": yahoo_data if "error" not in yahoo_data else None,
             "Polygon": polygon_data if "error" not in polygon_data else None
         }
+        # Keep the reason a provider is missing instead of a bare None
+        errors = {name: data["error"] for name, data in
+                  (("Yahoo", yahoo_data), ("Polygon", polygon_data)) if "error" in data}
+        if errors:
+            real_time_data[ticker]["Errors"] = errors
 
-    print("Collected real-time data:", real_time_data)
+    log_payload(logger, "Collected real-time data", real_time_data)
     return real_time_data if real_time_data else {"error": "No real-time data available."}
 
 # -----------------------------------------
 # **🔹 STEP 2: ADVANCED ANALYTICS (AAG)**
 # -----------------------------------------
+@timed("indicator.moving_averages")
 def calculate_moving_averages(data):
     """Calculates moving averages."""
     return {f"SMA_{period}": data["Close"].rolling(window=period).mean().dropna().iloc[-1]
             for period in [7, 30, 90]}
 
+@timed("indicator.rsi")
 def calculate_rsi(data, period=14):
     """Calculates RSI."""
     delta = data["Close"].diff()
@@ -153,8 +354,10 @@ def calculate_rsi(data, period=14):
 
 
 
+@timed("indicator.monte_carlo")
 def monte_carlo_simulation(data):
     """Runs Monte Carlo simulations for stock price forecasting."""
+    import numpy as np
     returns = data['Close'].pct_change().dropna()
     mean = returns.mean()
     std_dev = returns.std()
@@ -175,13 +378,16 @@ def monte_carlo_simulation(data):
         "95th Percentile": np.percentile(simulations, 95)
     }
 
-def calculate_beta(ticker):
-    """Calculates Beta Coefficient against S&P 500 (^GSPC)."""
+@timed("indicator.beta")
+def calculate_beta(ticker, period="6mo", bars=None):
+    """Calculates Beta Coefficient against S&P 500 (^GSPC), over the last `bars` bars if given."""
+    import numpy as np
     try:
-        stock = yf.Ticker(ticker)
-        sp500 = yf.Ticker("^GSPC")
-        stock_data = stock.history(period="6mo")['Close']
-        sp500_data = sp500.history(period="6mo")['Close']
+        stock_data = history_window(ticker, period)['Close']
+        sp500_data = history_window("^GSPC", period)['Close']
+        if bars is not None:
+            stock_data, sp500_data = stock_data.iloc[-bars:], sp500_data.iloc[-bars:]
+            record_processed("beta", len(stock_data) + len(sp500_data))
 
         if stock_data.empty or sp500_data.empty:
             return "Insufficient data for Beta calculation"
@@ -193,6 +399,7 @@ def calculate_beta(ticker):
     except Exception as e:
         return {"error": f"Failed to calculate Beta: {str(e)}"}
 
+@timed("indicator.bollinger")
 def calculate_bollinger_bands(data, window=20, num_std=2):
     """Calculates Bollinger Bands."""
     rolling_mean = data["Close"].rolling(window=window).mean()
@@ -206,18 +413,104 @@ def calculate_bollinger_bands(data, window=20, num_std=2):
         "Lower Band": lower_band.iloc[-1]
     }
 
+# **🔹 Facilitator: Look Up Historical Bars**
+@timed("historical_lookup")
+def collect_historical_data(query, real_time_data=None):
+    """Fetches each ticker's bar on the date the query refers to and its change since then.
+
+    Returns {} when the query names no date. The first date expression is used:
+    its start resolves to the nearest trading day by binary search over the
+    archive's date index. A range ending in the past ("in 2020") is measured to
+    its last trading day ("through"); otherwise "now" is the collected live
+    quote when there is one, else the last archived close.
+    """
+    ranges = parse_date_ranges(query)
+    if not ranges:
+        return {}
+    date, end = ranges[0]
+    closed = end < datetime.now().strftime('%Y-%m-%d')
+    start = plan_history((), ranges)["start"]  # One sync covers every date the query names
+
+    historical_data = {}
+    for ticker in extract_tickers(query):
+        try:
+            view = sync_history_archive(ticker, start=start)  # Downloads only back to `start`
+            bar = view.bar_at(date) if view is not None else None
+        except Exception as e:
+            historical_data[ticker] = {"error": str(e)}
+            continue
+        if bar is None or bar["date"] > end:  # Empty, or the range ends before the first bar
+            historical_data[ticker] = {"error": "No historical data found"}
+            continue
+
+        sources = (real_time_data or {}).get(ticker)
+        quote = next((q for q in ((sources or {}).get(name) for name in ("Yahoo", "Polygon"))
+                      if isinstance(q, dict) and isinstance(q.get("price"), (int, float))), None)
+        through = None
+        if closed and end != date:
+            last = view.bar_at(end)
+            now, through = last["close"], last["date"]
+            as_of = f"close of {through}"
+        elif quote is not None:
+            now, as_of = float(quote["price"]), f"{quote['source']} as of {quote['timestamp']}"
+        else:
+            now, as_of = float(view.records[-1]["close"]), f"close of {view.dates[-1]}"
+        bar.update(requested=date, now=now, now_as_of=as_of, through=through,
+                   change_pct=(now / bar["close"] - 1) * 100 if bar["close"] else None)
+        historical_data[ticker] = bar
+
+    log_payload(logger, "Collected historical data", historical_data)
+    return historical_data
+
 # **🔹 Facilitator: Collect & Validate Advanced Analytics**
-def collect_advanced_analytics(query):
-    """Fetches advanced analytics for all detected stock tickers in a query."""
+# Lookup field -> (analysis key, indicator over a price history); Beta fetches its own two series
+INDICATORS = {
+    "sma": ("Moving Averages", calculate_moving_averages),
+    "rsi": ("RSI", calculate_rsi),
+    "monte_carlo": ("Monte Carlo Simulation", monte_carlo_simulation),
+    "beta": ("Beta Coefficient", None),
+    "bollinger": ("Bollinger Bands", calculate_bollinger_bands),
+}
+
+def _compute_indicator(name, ticker, historical_data, period, bars):
+    """One indicator over the last `bars` bars of the history."""
+    if name == "beta":
+        return calculate_beta(ticker, period, bars)
+    window = historical_data.iloc[-bars:]
+    record_processed(name, len(window))
+    return INDICATORS[name][1](window)
+
+def collect_advanced_analytics(query, fields=None):
+    """Fetches advanced analytics for all detected stock tickers in a query.
+
+    Only the indicators in `fields` (lookup field names; all when None) are
+    computed, each over just the bars it reads (history_plan), and the history
+    fetched is the shortest Yahoo period holding the longest of those windows,
+    or a longer one already cached.
+    """
     tickers = extract_tickers(query)
     if not tickers:
         return {"error": "No valid stock ticker found in query."}
+    plan = plan_history(fields)
+    if not plan["indicators"]:
+        return {}
+    period = plan["period"]
+
+    # One threaded download for every uncached ticker (plus the Beta benchmark); the loop reads the cache
+    with stage("history_fetch"):
+        wanted = tickers + (["^GSPC"] if "beta" in plan["indicators"] else [])
+        missing = [t for t in wanted if cached_history(t, period) is None]
+        if missing:
+            try:
+                fetch_history_batch(missing, period=period)
+            except Exception as e:
+                logger.warning("Batched Yahoo history download failed, fetching per ticker: %s", e)
 
     analysis_data = {}
 
     for ticker in tickers:
-        stock = yf.Ticker(ticker)
-        historical_data = stock.history(period="6mo")
+        with stage("history_fetch"):
+            historical_data = history_window(ticker, period)
 
         if historical_data.empty:
             analysis_data[ticker] = {
@@ -227,14 +520,19 @@ def collect_advanced_analytics(query):
             }
             continue  # Ensures missing data doesn’t break analysis
 
+        # Keyed by the last bar so a refreshed history is never paired with stale indicators;
+        # per indicator, so a full analysis also answers later single-indicator lookups
+        last_bar = str(historical_data.index[-1])
+        analysis_data[ticker] = {}
         try:
-            analysis_data[ticker] = {
-                "Moving Averages": calculate_moving_averages(historical_data),
-                "RSI": calculate_rsi(historical_data),
-                "Monte Carlo Simulation": monte_carlo_simulation(historical_data),
-                "Beta Coefficient": calculate_beta(ticker),
-                "Bollinger Bands": calculate_bollinger_bands(historical_data)
-            }
+            for name, bars in plan["indicators"].items():
+                cache_key = (ticker, name, last_bar)
+                value = analytics_cache.get(cache_key)
+                if value is None:
+                    value = _compute_indicator(name, ticker, historical_data, period, bars)
+                    if not isinstance(value, dict) or "error" not in value:
+                        analytics_cache.set(cache_key, value)
+                analysis_data[ticker][INDICATORS[name][0]] = value
         except Exception as e:
             analysis_data[ticker] = {
                 "error": f"Analytics error: {str(e)}",
@@ -242,17 +540,17 @@ def collect_advanced_analytics(query):
                 "Bollinger Bands": {"Upper Band": "N/A", "Lower Band": "N/A"}
             }
 
-    print("Collected advanced analytics data:", analysis_data)
+    log_payload(logger, "Collected advanced analytics data", analysis_data)
     return analysis_data
 
 
 def handle_general_financial_query(user_query):
     """Handles general financial queries that do not require stock data."""
-    openai.api_key = OPENAI_API_KEY
-
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
+        route_name, route = choose_route(user_query)
+        return complete_routed(
+            route_name,
+            route,
             messages=[
                 {"role": "system", "content": "You are a world-class financial analyst specializing in investment strategies, macroeconomic trends, risk management, and stock market insights. YOU MUST CREATE AN ACTIONABLE DETAILED PLAN."},
                 {"role": "user", "content": user_query}
@@ -260,32 +558,195 @@ def handle_general_financial_query(user_query):
             max_tokens=750,
             temperature=0.9
         )
-        return response['choices'][0]['message']['content']
     except Exception as e:
         return f"An error occurred while handling the general query: {str(e)}"
 
 # -----------------------------------------
 # **🔹 FLASK API ROUTE**
 # -----------------------------------------
+def answer_data_lookup(user_query):
+    """Answers pure data lookups from collected data without an LLM call; None if not possible."""
+    route_name, route = choose_route(user_query)
+    if route["mode"] != "template":
+        return None
+    fields = detect_lookup_fields(user_query)
+    if not fields:
+        return None
+
+    start = time.perf_counter()
+    real_time_data = collect_real_time_data(user_query)
+    analysis_data = collect_advanced_analytics(user_query, fields) if needs_analytics(fields) else {}
+    # Dates only change the answer for bar fields; "RSI over the last 30 days" is today's RSI
+    historical_data = collect_historical_data(user_query, real_time_data) if is_historical_lookup(fields) else {}
+    with stage("template_render"):
+        if historical_data:
+            answer = render_historical_answer(fields, historical_data)
+        else:
+            answer = render_lookup_answer(fields, real_time_data, analysis_data)
+    if answer is None:
+        return None
+    route_metrics.record(f"{route_name}_template", time.perf_counter() - start)
+    return answer, real_time_data, analysis_data, historical_data
+
+
 @app.route('/generate-response', methods=['POST'])
 def generate_response():
+    start = time.perf_counter()
+    # Joins the caller's trace when it sends a W3C traceparent header
+    parent = extract_trace_context(request.headers.get('traceparent'))
+    # Profiled when sampled, or on demand with X-Profile: <PROFILE_TOKEN> (or ?profile=<token>)
+    profile_flag = request.headers.get('X-Profile') or request.args.get('profile')
+    with span("generate_response", parent=parent) as root, timed_request() as timings, \
+            track_history_usage() as history_usage:
+        with request_profile(profile_flag, getattr(root, "trace_id", None)) as profile:
+            result = _generate_response()
+        outcome = "error" if str(result.get('response', '')).startswith("An error occurred") else "ok"
+        root.set_attribute("outcome", outcome)
+        for key, value in history_usage.items():
+            root.set_attribute(f"history_{key}", value)
+    request_latency.observe(time.perf_counter() - start, outcome)
+    # Benchmarks ask for the per-stage breakdown of a request with this header
+    if request.headers.get('X-Stage-Timings'):
+        result['timings_ms'] = {name: seconds * 1000 for name, seconds in timings.items()}
+        result['history'] = history_usage
+    response = jsonify(result)
+    if getattr(root, "trace_id", None):
+        response.headers['X-Trace-Id'] = root.trace_id  # Look up in the trace export or slow log
+    if profile.path:
+        response.headers['X-Profile-Output'] = profile.path
+    return response
+
+def _generate_response():
     try:
         user_query = request.json.get('query', '')
-        tickers = extract_tickers(user_query)  # Extract potential stock tickers
+        tickers = extract_tickers(user_query, record=True)  # Extract potential stock tickers
+        set_attribute("tickers", ",".join(tickers))
+
+        # ⚡ Fast path: price/indicator lookups are rendered straight from the data
+        lookup = answer_data_lookup(user_query) if tickers else None
+        if lookup:
+            ai_response, real_time_data, analysis_data, historical_data = lookup
+            result = {'response': ai_response}
+            if request.json.get('prose'):
+                # Prose is optional; the LLM runs in the background and is polled via /prose/<id>
+                result['prose_job'] = submit_prose_job(
+                    generate_financial_analysis, real_time_data, analysis_data, user_query, historical_data)
+            return result
 
         if tickers:
             # ✅ If tickers are found, process real-time stock data analysis
             real_time_data = collect_real_time_data(user_query)
             analysis_data = collect_advanced_analytics(user_query)
-            ai_response = generate_financial_analysis(real_time_data, analysis_data, user_query)
+            historical_data = collect_historical_data(user_query, real_time_data)
+            ai_response = generate_financial_analysis(real_time_data, analysis_data, user_query,
+                                                      historical_data)
         else:
             # ✅ If no tickers are found, treat it as a general financial question
             ai_response = handle_general_financial_query(user_query)
 
-        return jsonify({'response': ai_response})
+        return {'response': ai_response}
     
     except Exception as e:
-        return jsonify({'response': f"An error occurred: {str(e)}"})
+        return {'response': f"An error occurred: {str(e)}"}
+
+@app.route('/prose/<job_id>', methods=['GET'])
+def prose(job_id):
+    """Polls a background prose job started by a fast-path lookup."""
+    job = get_prose_job(job_id)
+    if job is None:
+        return jsonify({'status': 'unknown'}), 404
+    return jsonify(job)
+
+@app.route('/popular-tickers', methods=['GET'])
+def popular_tickers():
+    """Most-queried tickers over a sliding window (?window=<seconds>&n=<count>)."""
+    window = request.args.get('window', default=3600, type=int)
+    n = request.args.get('n', default=10, type=int)
+    return jsonify({
+        'window_seconds': window,
+        'tickers': [{'ticker': t, 'queries': c} for t, c in ticker_popularity.top(n, window)]
+    })
+
+@app.route('/rate-limits', methods=['GET'])
+def rate_limits():
+    """Per-provider token wait-time histograms and rejection counts."""
+    return jsonify(rate_limiter.snapshot())
+
+@app.route('/resilience', methods=['GET'])
+def resilience_status():
+    """Circuit breaker state plus hedge, timeout and failure counts per provider."""
+    return jsonify({name: provider.snapshot() for name, provider in providers.items()})
+
+@app.route('/router-metrics', methods=['GET'])
+def router_metrics():
+    """Per-route request counts, latency percentiles and token usage."""
+    return jsonify(route_metrics.snapshot())
+
+# -----------------------------------------
+# **🔹 PROMETHEUS /metrics**
+# -----------------------------------------
+
+def _cache_metrics():
+    caches = [quote_cache, history_cache, analytics_cache, llm_cache]
+    stats = {c.name: c.stats() for c in caches}
+    return [
+        ("rag_cache_lookups_total", "counter", "Cache lookups by cache and result.",
+         [({"cache": name, "result": result}, s[key])
+          for name, s in stats.items()
+          for result, key in (("hit", "hits"), ("stale_hit", "stale_hits"), ("miss", "misses"))]),
+        ("rag_cache_entries", "gauge", "Entries currently held per cache.",
+         [({"cache": name}, s["entries"]) for name, s in stats.items()]),
+        ("rag_cache_errors_total", "counter", "Shared cache backend failures, served as misses.",
+         [({"cache": name}, s["errors"]) for name, s in stats.items() if "errors" in s]),
+    ]
+
+def _llm_metrics():
+    routes = route_metrics.snapshot()
+    return [
+        ("rag_llm_requests_total", "counter", "Routed requests (LLM calls and template answers) per route.",
+         [({"route": r}, s["requests"]) for r, s in routes.items()]),
+        ("rag_llm_errors_total", "counter", "Failed LLM calls per route.",
+         [({"route": r}, s["errors"]) for r, s in routes.items()]),
+        ("rag_llm_tokens_total", "counter", "LLM tokens used per route and kind.",
+         [({"route": r, "kind": kind}, s[f"{kind}_tokens"])
+          for r, s in routes.items() for kind in ("prompt", "completion")]),
+    ]
+
+def _provider_metrics():
+    snapshots = {name: provider.snapshot() for name, provider in providers.items()}
+    waits = rate_limiter.snapshot()
+    states = ("closed", "half_open", "open")
+    return [
+        ("rag_provider_breaker_state", "gauge", "1 for each provider's current circuit breaker state.",
+         [({"provider": name, "state": state}, int(s["breaker"]["state"] == state))
+          for name, s in snapshots.items() for state in states]),
+        ("rag_provider_hedges_total", "counter", "Hedged second attempts fired per provider.",
+         [({"provider": name}, s.get("hedges", 0)) for name, s in snapshots.items()]),
+        ("rag_rate_limit_rejected_total", "counter", "Calls refused by the rate limiter per provider.",
+         [({"provider": name}, w["rejected"]) for name, w in waits.items()]),
+        ("rag_rate_limit_deferred_total", "counter", "Background (prefetch) calls refused to keep the requests' reserve.",
+         [({"provider": name}, w["deferred"]) for name, w in waits.items()]),
+        ("rag_rate_limit_wait_seconds_total", "counter", "Total time spent queued for rate-limit tokens.",
+         [({"provider": name}, w["sum_seconds"]) for name, w in waits.items()]),
+    ]
+
+def _trace_metrics():
+    stats = trace_stats()
+    return [
+        ("rag_slow_traces_total", "counter", "Traces kept whole in the slow-request log.",
+         [({}, stats["slow_traces"])]),
+        ("rag_slow_trace_threshold_ms", "gauge", "Current slow-trace latency threshold per root span.",
+         [({"root": name}, ms) for name, ms in stats["slow_threshold_ms"].items() if ms is not None]),
+    ]
+
+add_sink(record_stage)
+for _collector in (_cache_metrics, _llm_metrics, _provider_metrics, _trace_metrics):
+    add_collector(_collector)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage, request and provider latency histograms plus cache, LLM and provider counters."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 # -----------------------------------------
 # **🔹 SYSTEM MESSAGE for GPT-4**
@@ -305,53 +766,68 @@ Your goal is to provide accurate, **data-driven** financial insights using **rea
 ✅ **Always analyze data from Yahoo Finance & Polygon.io to provide insights.**  
 """
 
-def generate_financial_analysis(real_time_data, analysis_data, user_query):
+def generate_financial_analysis(real_time_data, analysis_data, user_query, historical_data=None):
     """Generates AI response using GPT-4 for multi-company analysis."""
-    openai.api_key = OPENAI_API_KEY
-
     try:
-        real_time_summary = ""
-        analysis_summary = ""
-
-        for company, data in real_time_data.items():
-            if isinstance(data, dict) and "error" not in data:
-                real_time_summary += (
-                    f"\n📊 **{company} - Real-Time Stock Data:**\n"
-                    f"🔹 **Yahoo Finance**: ${data.get('Yahoo', {}).get('price', 'N/A')} "
-                    f"(as of {data.get('Yahoo', {}).get('timestamp', 'N/A')})\n"
-                    f"🔹 **Polygon.io**: ${data.get('Polygon', {}).get('price', 'N/A')} "
-                    f"(as of {data.get('Polygon', {}).get('timestamp', 'N/A')})\n"
-                )
-
-        for company, data in analysis_data.items():
-            if isinstance(data, dict) and "error" not in data:
-                analysis_summary += (
-                    f"\n📈 **{company} - Advanced Analytics:**\n"
-                    f"🔹 7-day SMA: ${data.get('Moving Averages', {}).get('SMA_7', 'N/A')}\n"
-                    f"🔹 30-day SMA: ${data.get('Moving Averages', {}).get('SMA_30', 'N/A')}\n"
-                    f"🔹 90-day SMA: ${data.get('Moving Averages', {}).get('SMA_90', 'N/A')}\n"
-                    f"🔹 RSI: {data.get('RSI', 'N/A')}\n"
-                    f"🔹 Beta Coefficient: {data.get('Beta Coefficient', 'N/A')}\n"
-                    f"🔹 Bollinger Bands: Upper ${data.get('Bollinger Bands', {}).get('Upper Band', 'N/A')}, "
-                    f"Lower ${data.get('Bollinger Bands', {}).get('Lower Band', 'N/A')}\n"
-                    f"🔹 Monte Carlo Prediction (Median): ${data.get('Monte Carlo Simulation', {}).get('50th Percentile (Median)', 'N/A')}\n"
-                )
-
-        if not real_time_summary and not analysis_summary:
-            return "No valid financial data was retrieved. Please check your ticker symbols or try again later."
-
-        prompt = (
-            "You are a world-class AI finance analyst. Use the following real-time stock data and analytics "
-            "to provide a financial assessment. Do NOT say you don't have real-time data. "
-            "Instead, base your response on the given data. \n\n"
-            f"{real_time_summary}\n{analysis_summary}\n\n"
-            f"User Query: {user_query}\n"
-            "🔹 Provide a professional financial assessment, including trends and risk factors."
-        )
-
-        # ✅ Ensure GPT-4 is correctly prompted with structured real-time data
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
+        with stage("prompt_build"):
+            real_time_summary = ""
+            analysis_summary = ""
+            historical_summary = ""
+
+            for company, data in real_time_data.items():
+                if isinstance(data, dict) and "error" not in data:
+                    real_time_summary += (
+                        f"\n📊 **{company} - Real-Time Stock Data:**\n"
+                        f"🔹 **Yahoo Finance**: ${(data.get('Yahoo') or {}).get('price', 'N/A')} "
+                        f"(as of {(data.get('Yahoo') or {}).get('timestamp', 'N/A')})\n"
+                        f"🔹 **Polygon.io**: ${(data.get('Polygon') or {}).get('price', 'N/A')} "
+                        f"(as of {(data.get('Polygon') or {}).get('timestamp', 'N/A')})\n"
+                    )
+
+            for company, data in analysis_data.items():
+                if isinstance(data, dict) and "error" not in data:
+                    analysis_summary += (
+                        f"\n📈 **{company} - Advanced Analytics:**\n"
+                        f"🔹 7-day SMA: ${data.get('Moving Averages', {}).get('SMA_7', 'N/A')}\n"
+                        f"🔹 30-day SMA: ${data.get('Moving Averages', {}).get('SMA_30', 'N/A')}\n"
+                        f"🔹 90-day SMA: ${data.get('Moving Averages', {}).get('SMA_90', 'N/A')}\n"
+                        f"🔹 RSI: {data.get('RSI', 'N/A')}\n"
+                        f"🔹 Beta Coefficient: {data.get('Beta Coefficient', 'N/A')}\n"
+                        f"🔹 Bollinger Bands: Upper ${data.get('Bollinger Bands', {}).get('Upper Band', 'N/A')}, "
+                        f"Lower ${data.get('Bollinger Bands', {}).get('Lower Band', 'N/A')}\n"
+                        f"🔹 Monte Carlo Prediction (Median): ${data.get('Monte Carlo Simulation', {}).get('50th Percentile (Median)', 'N/A')}\n"
+                    )
+
+            for company, bar in (historical_data or {}).items():
+                if "error" not in bar:
+                    change = f"{bar['change_pct']:+.2f}%" if bar.get('change_pct') is not None else "N/A"
+                    day = bar['date'] if bar['date'] == bar['requested'] else \
+                        f"{bar['date']}, nearest trading day to {bar['requested']}"
+                    historical_summary += (
+                        f"\n🕰️ **{company} - Historical Data ({day}):**\n"
+                        f"🔹 Open ${bar['open']:.2f}, High ${bar['high']:.2f}, Low ${bar['low']:.2f}, "
+                        f"Close ${bar['close']:.2f}, Volume {bar['volume']:,}\n"
+                        f"🔹 Change {'to ' + bar['through'] if bar.get('through') else 'since then'}: {change} "
+                        f"({'then' if bar.get('through') else 'now'} ${bar['now']:.2f}, {bar['now_as_of']})\n"
+                    )
+
+            if not real_time_summary and not analysis_summary and not historical_summary:
+                return "No valid financial data was retrieved. Please check your ticker symbols or try again later."
+
+            prompt = (
+                "You are a world-class AI finance analyst. Use the following real-time stock data and analytics "
+                "to provide a financial assessment. Do NOT say you don't have real-time data. "
+                "Instead, base your response on the given data. \n\n"
+                f"{real_time_summary}\n{analysis_summary}{historical_summary}\n\n"
+                f"User Query: {user_query}\n"
+                "🔹 Provide a professional financial assessment, including trends and risk factors."
+            )
+
+        # ✅ Route simple lookups to a faster model; open-ended questions stay on GPT-4
+        route_name, route = choose_route(user_query)
+        return complete_routed(
+            route_name,
+            route,
             messages=[
                 {"role": "system", "content": SYSTEM_MESSAGE},
                 {"role": "user", "content": prompt}
@@ -360,11 +836,42 @@ def generate_financial_analysis(real_time_data, analysis_data, user_query):
             temperature=0.7
         )
 
-        return response['choices'][0]['message']['content']
-
     except Exception as e:
         return f"An error occurred: {str(e)}"
 
+# -----------------------------------------
+# **🔹 BACKGROUND PREFETCH**
+# -----------------------------------------
+
+def _prefetch_yahoo_quote(ticker):
+    fetch_real_time_data_yahoo(ticker, use_cache=False)
+
+def _prefetch_yahoo_history(ticker):
+    fetch_history(ticker, period="6mo", use_cache=False)
+
+def _prefetch_polygon(ticker):
+    """Refreshes a Polygon quote; returns False when no HTTP call was needed."""
+    if ticker.startswith("^"):  # Index symbols such as ^GSPC are Yahoo-only
+        return False
+    served_from_table = (POLYGON_GROUPED_ENABLED and grouped_daily.ensure_fresh()
+                         and grouped_daily.lookup(ticker) is not None)
+    fetch_real_time_data_polygon(ticker, use_cache=False)
+    return not served_from_table
+
+prefetch_scheduler = PrefetchScheduler(
+    universe_fn=lambda: list(load_ticker_map().values()) + ["^GSPC"],
+    jobs={"Yahoo": [_prefetch_yahoo_quote, _prefetch_yahoo_history], "Polygon": [_prefetch_polygon]}
+)
+def start_background_tasks():
+    """Starts this process's background threads (gunicorn's post_fork hook calls it when preloading)."""
+    if PREFETCH_ENABLED:
+        prefetch_scheduler.start()
+
+# Threads do not survive fork, so under gunicorn preload each worker starts its own; of those,
+# only the worker holding PREFETCH_LOCK_FILE actually prefetches
+if os.getenv("GUNICORN_PRELOAD") != "1":
+    start_background_tasks()
+
 if __name__ == '__main__':
-    print("Starting Flask app")
+    logger.info("Starting Flask app")
     app.run(debug=True)
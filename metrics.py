@@ -0,0 +1,138 @@
+import bisect
+import threading
+
+# -----------------------------------------
+# **🔹 PROMETHEUS METRICS**
+# -----------------------------------------
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        return [(self.name, _labels(self.labelnames, labels), value)
+                for labels, value in sorted(values.items())]
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions under a lock."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.bounds = list(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # labels -> [per-bucket counts (last is +Inf), sum]
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.bounds) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self.lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self.series.items()}
+        out = []
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + [float("inf")], counts):
+                cumulative += count
+                le = (("le", _number(bound)),)
+                out.append((f"{self.name}_bucket", _labels(self.labelnames, labels, le), cumulative))
+            out.append((f"{self.name}_sum", _labels(self.labelnames, labels), total))
+            out.append((f"{self.name}_count", _labels(self.labelnames, labels), cumulative))
+        return out
+
+
+def add_collector(fn):
+    """Registers fn() -> [(name, kind, help, [(labels dict, value)])], called at scrape time.
+
+    Used for state other modules already count (cache stats, route tokens),
+    so the hot path pays nothing extra for it.
+    """
+    _collectors.append(fn)
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+    for collector in _collectors:
+        for name, kind, help, samples in collector():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+# -----------------------------------------
+# **🔹 APPLICATION METRICS**
+# -----------------------------------------
+
+stage_latency = Histogram("rag_stage_duration_seconds",
+                          "Time spent in each pipeline stage of /generate-response.", ("stage",))
+request_latency = Histogram("rag_request_duration_seconds",
+                            "End-to-end /generate-response latency.", ("outcome",))
+provider_latency = Histogram("rag_provider_call_duration_seconds",
+                             "Provider calls including hedging, by provider and outcome.",
+                             ("provider", "outcome"))
+history_downloaded_bytes = Counter("rag_history_downloaded_bytes_total",
+                                   "Bytes of price history received from Yahoo (as decoded arrays).", ("kind",))
+history_downloaded_rows = Counter("rag_history_downloaded_rows_total",
+                                  "Daily bars of price history received from Yahoo.", ("kind",))
+history_processed_rows = Counter("rag_history_processed_rows_total",
+                                 "Bars read by each indicator computation.", ("indicator",))
+
+
+def record_stage(name, seconds):
+    """timing sink: feeds every completed stage into the stage histogram."""
+    stage_latency.observe(seconds, name)
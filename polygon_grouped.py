@@ -0,0 +1,184 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from cache import grouped_cache
+from ratelimit import background, rate_limiter
+from replay import recorder
+from resilience import PROVIDER_TIMEOUT
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# **🔹 GROUPED DAILY CONFIGURATION**
+# -----------------------------------------
+
+POLYGON_GROUPED_ENABLED = os.getenv("POLYGON_GROUPED_ENABLED", "1") == "1"
+POLYGON_GROUPED_RETRY = float(os.getenv("POLYGON_GROUPED_RETRY", "300"))  # Seconds after a failed load
+POLYGON_GROUPED_URL = "https://api.polygon.io/v2/aggs/grouped/locale/us/market/stocks/{day}"
+MAX_LOOKBACK_DAYS = 7  # Covers weekends plus a holiday
+
+
+def last_completed_session(today=None):
+    """Most recent weekday before today; holidays are handled by stepping back on empty results."""
+    day = (today or date.today()) - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+# -----------------------------------------
+# **🔹 IN-MEMORY BAR TABLE**
+# -----------------------------------------
+
+class GroupedDailyTable:
+    """Previous-session OHLCV for every US ticker, loaded in one grouped-daily call.
+
+    Bars live in one float64 matrix (48 bytes per ticker) with a ticker -> row
+    index, instead of one dict per ticker.
+    """
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.getenv("POLYGON_API_KEY")
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.index = {}
+        self.bars = None  # (n, 6) float64: open, high, low, close, volume, timestamp_ms
+        self.session = None  # Trading day the bars belong to
+        self.checked_for = None  # Expected session the last successful load was for
+        self.failed_at = float("-inf")
+        self.loads = 0  # Tables pulled from Polygon by this process
+        self.adopted = 0  # Tables read from grouped_cache instead
+
+    def _fetch_day(self, day):
+        url = POLYGON_GROUPED_URL.format(day=day.isoformat())
+
+        def fetch():
+            import requests
+            response = requests.get(url, params={"adjusted": "true", "apiKey": self.api_key},
+                                    timeout=PROVIDER_TIMEOUT * 4)  # Payload covers ~10k tickers
+            response.raise_for_status()
+            return response.json()
+
+        return recorder.call("Polygon", ["grouped", day.isoformat()], fetch).get("results") or []
+
+    def _install(self, index, bars, day, expected):
+        with self.lock:
+            self.index, self.bars = index, bars
+            self.session, self.checked_for = day, expected
+
+    def _adopt_shared(self, expected):
+        """Installs the table another process loaded for `expected`; True if there was one."""
+        shared = grouped_cache.get(expected.isoformat())
+        if shared is None:
+            return False
+        import numpy as np
+        bars = np.array(shared["bars"], dtype=np.float64).reshape(-1, 6)
+        self._install({ticker: row for row, ticker in enumerate(shared["tickers"])}, bars,
+                      date.fromisoformat(shared["session"]), expected)
+        with self.lock:
+            self.adopted += 1
+        return True
+
+    @traced("polygon.grouped_daily")
+    def load(self, expected=None):
+        """Pulls the newest grouped-daily bars at or before `expected`; returns True on success.
+
+        A table another worker (or the preloading master) already loaded for
+        `expected` is read from grouped_cache instead of calling Polygon, and a
+        fresh load is written there for the others.
+        """
+        expected = expected or last_completed_session()
+        if self._adopt_shared(expected):
+            return True
+        day = expected
+        for _ in range(MAX_LOOKBACK_DAYS):
+            if not rate_limiter.acquire("Polygon", max_wait=60):
+                return False
+            results = self._fetch_day(day)
+            if results:
+                break
+            day -= timedelta(days=1)
+        else:
+            return False
+
+        import numpy as np
+        index = {}
+        bars = np.empty((len(results), 6))
+        for row, bar in enumerate(results):
+            index[bar["T"]] = row
+            bars[row] = (bar.get("o", np.nan), bar.get("h", np.nan), bar.get("l", np.nan),
+                         bar.get("c", np.nan), bar.get("v", np.nan), bar.get("t", np.nan))
+        self._install(index, bars, day, expected)
+        with self.lock:
+            self.loads += 1
+        grouped_cache.set(expected.isoformat(), {"session": day.isoformat(), "tickers": list(index),
+                                                 "bars": bars.tolist()})
+        logger.info("Loaded Polygon grouped daily bars", extra={"session": str(day), "tickers": len(index)})
+        return True
+
+    def ensure_fresh(self):
+        """Reloads once per new session; returns True if a table is available.
+
+        Only one thread loads at a time; the others keep using the current
+        table (or the per-ticker fallback) instead of queueing behind it.
+        After a failure the load is retried every POLYGON_GROUPED_RETRY seconds.
+        """
+        expected = last_completed_session()
+        if not self._due(expected):
+            return self.checked_for is not None
+        if not self.load_lock.acquire(blocking=False):
+            return self.checked_for is not None
+        try:
+            if self.checked_for != expected and not self.load(expected):
+                self.failed_at = time.monotonic()
+        except Exception as e:
+            logger.warning("Polygon grouped daily load failed: %s", e)
+            self.failed_at = time.monotonic()
+        finally:
+            self.load_lock.release()
+        return self.checked_for is not None
+
+    def _due(self, expected):
+        return self.checked_for != expected and time.monotonic() - self.failed_at >= POLYGON_GROUPED_RETRY
+
+    def refresh_in_background(self):
+        """Request-thread form of ensure_fresh: never loads inline; returns True if a table is available.
+
+        A due load runs on a daemon thread as rate-limit background work, so it
+        neither blocks the request nor takes tokens the requests' reserve needs.
+        """
+        if self._due(last_completed_session()) and not self.load_lock.locked():
+            threading.Thread(target=self._load_in_background, name="polygon-grouped", daemon=True).start()
+        return self.checked_for is not None
+
+    def _load_in_background(self):
+        with background():
+            self.ensure_fresh()
+
+    def lookup(self, ticker):
+        """Returns a quote shaped like fetch_real_time_data_polygon's, or None if not in the table."""
+        with self.lock:
+            row = self.index.get(ticker)
+            if row is None:
+                return None
+            o, h, l, c, v, t = self.bars[row]
+        return {
+            "source": "Polygon.io",
+            "price": float(c),
+            "volume": float(v),
+            "high": float(h),
+            "low": float(l),
+            "open": float(o),
+            "timestamp": datetime.fromtimestamp(t / 1000.0).strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def stats(self):
+        with self.lock:
+            return {"session": self.session.isoformat() if self.session else None,
+                    "tickers": len(self.index), "loads": self.loads, "adopted": self.adopted}
+
+
+grouped_daily = GroupedDailyTable()
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import threading
+import time
+from array import array
+
+# -----------------------------------------
+# **🔹 POPULARITY CONFIGURATION**
+# -----------------------------------------
+
+POPULARITY_WIDTH = int(os.getenv("POPULARITY_WIDTH", "256"))
+POPULARITY_DEPTH = int(os.getenv("POPULARITY_DEPTH", "4"))
+POPULARITY_BUCKET_SECONDS = int(os.getenv("POPULARITY_BUCKET_SECONDS", "300"))
+POPULARITY_BUCKETS = int(os.getenv("POPULARITY_BUCKETS", "288"))  # 288 x 5 min = 24 h
+POPULARITY_TOP_K = int(os.getenv("POPULARITY_TOP_K", "64"))
+
+# -----------------------------------------
+# **🔹 COUNT-MIN SKETCH**
+# -----------------------------------------
+
+class CountMinSketch:
+    """Fixed-size frequency estimator; over-counts on collisions, never under-counts."""
+
+    def __init__(self, width=POPULARITY_WIDTH, depth=POPULARITY_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def slots(self, key):
+        """Column per row for a key; identical for every sketch of the same shape."""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * i:4 * i + 4], "little") % self.width
+                for i in range(self.depth)]
+
+    def add(self, key, count=1, slots=None):
+        for row, slot in zip(self.rows, slots or self.slots(key)):
+            row[slot] += count
+
+    def estimate(self, key, slots=None):
+        return min(row[slot] for row, slot in zip(self.rows, slots or self.slots(key)))
+
+    def clear(self):
+        for row in self.rows:
+            row[:] = array("I", bytes(4 * self.width))
+
+# -----------------------------------------
+# **🔹 SLIDING-WINDOW TRACKER**
+# -----------------------------------------
+
+class PopularityTracker:
+    """Per-ticker query counts over sliding windows with memory fixed at construction.
+
+    A ring of count-min sketches holds one time bucket each; a window is the
+    sum of its most recent buckets. A bounded candidate set remembers the
+    heavy hitters so the top tickers can be listed without storing every key.
+    """
+
+    def __init__(self, width=POPULARITY_WIDTH, depth=POPULARITY_DEPTH,
+                 bucket_seconds=POPULARITY_BUCKET_SECONDS, num_buckets=POPULARITY_BUCKETS,
+                 top_k=POPULARITY_TOP_K, clock=time.time):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.top_k = top_k
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.sketches = [CountMinSketch(width, depth) for _ in range(num_buckets)]
+        self.epochs = [-1] * num_buckets  # bucket epoch each ring slot currently holds
+        self.candidates = {}  # ticker -> windowed count at last sighting, at most top_k entries
+
+    def _epoch(self):
+        return int(self.clock() // self.bucket_seconds)
+
+    def _sketch_for(self, epoch):
+        slot = epoch % self.num_buckets
+        if self.epochs[slot] != epoch:
+            self.sketches[slot].clear()
+            self.epochs[slot] = epoch
+        return self.sketches[slot]
+
+    def _estimate(self, ticker, epoch, buckets):
+        slots = self.sketches[0].slots(ticker)
+        total = 0
+        for e in range(epoch - buckets + 1, epoch + 1):
+            ring = e % self.num_buckets
+            if self.epochs[ring] == e:
+                total += self.sketches[ring].estimate(ticker, slots)
+        return total
+
+    def _buckets(self, window_seconds):
+        if window_seconds is None:
+            return self.num_buckets
+        return max(1, min(self.num_buckets, -(-int(window_seconds) // self.bucket_seconds)))
+
+    def record(self, tickers):
+        """Counts one query for each distinct ticker."""
+        with self.lock:
+            epoch = self._epoch()
+            sketch = self._sketch_for(epoch)
+            for ticker in set(tickers):
+                sketch.add(ticker)
+                self.candidates[ticker] = self._estimate(ticker, epoch, self.num_buckets)
+            while len(self.candidates) > self.top_k:
+                del self.candidates[min(self.candidates, key=self.candidates.get)]
+
+    def estimate(self, ticker, window_seconds=None):
+        """Approximate number of queries for a ticker within the window (default: all buckets)."""
+        with self.lock:
+            return self._estimate(ticker, self._epoch(), self._buckets(window_seconds))
+
+    def top(self, n=10, window_seconds=None):
+        """Most-queried tickers in the window as [(ticker, count)], highest first."""
+        with self.lock:
+            epoch = self._epoch()
+            buckets = self._buckets(window_seconds)
+            counts = [(t, self._estimate(t, epoch, buckets)) for t in self.candidates]
+        counts = [(t, c) for t, c in counts if c > 0]
+        return sorted(counts, key=lambda item: (-item[1], item[0]))[:n]
+
+
+ticker_popularity = PopularityTracker()
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from popularity import ticker_popularity
+from ratelimit import PROVIDER_LIMITS, background
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# **🔹 PREFETCH CONFIGURATION**
+# -----------------------------------------
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "0") == "1"
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "300"))  # Seconds between cycles
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "0"))  # 0 walks the whole universe
+
+# Share of each provider's rate limit (ratelimit.PROVIDER_LIMITS) prefetch paces itself to;
+# the rest, and RATE_LIMIT_BACKGROUND_RESERVE of each bucket, stays with user requests
+PREFETCH_RATE_SHARE = float(os.getenv("PREFETCH_RATE_SHARE", "0.5"))
+
+PREFETCH_POPULARITY_WINDOW = float(os.getenv("PREFETCH_POPULARITY_WINDOW", "3600"))
+
+# Only the process holding this lock prefetches, so gunicorn workers do not each walk the
+# universe; the others wait on it and one takes over if the leader exits
+PREFETCH_LOCK_FILE = os.getenv("PREFETCH_LOCK_FILE", "/tmp/rag_prefetch.lock")
+
+
+def rank_tickers(universe):
+    """Orders the universe by recent query count, most-queried first (ties keep map order)."""
+    counts = {ticker: ticker_popularity.estimate(ticker, PREFETCH_POPULARITY_WINDOW)
+              for ticker in universe}
+    return sorted(universe, key=lambda ticker: -counts[ticker])
+
+
+def min_interval(provider, limits=PROVIDER_LIMITS, share=PREFETCH_RATE_SHARE):
+    """Spacing between prefetch calls that keeps them to `share` of the provider's token rate."""
+    if provider not in limits:
+        return 0.0
+    rate, _ = limits[provider]
+    return 1.0 / (rate * share)
+
+# -----------------------------------------
+# **🔹 BACKGROUND SCHEDULER**
+# -----------------------------------------
+
+class PrefetchScheduler:
+    """Walks the ticker universe on a cadence, one paced thread per provider.
+
+    Each job makes at most one provider call. Jobs run as rate-limit background
+    work: a call that would dip into the requests' reserve is refused at once,
+    and the provider's thread then yields for one more interval. Of all the
+    processes that start a scheduler, one at a time runs it (PREFETCH_LOCK_FILE).
+    """
+
+    def __init__(self, universe_fn, jobs, interval=PREFETCH_INTERVAL, top_n=PREFETCH_TOP_N,
+                 min_intervals=None, lock_path=PREFETCH_LOCK_FILE):
+        self.universe_fn = universe_fn  # -> iterable of tickers
+        self.jobs = jobs  # provider -> list of fn(ticker) that refresh its caches, one call each
+        self.interval = interval
+        self.top_n = top_n
+        self.min_intervals = min_intervals if min_intervals is not None else \
+            {provider: min_interval(provider) for provider in jobs}
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.cycles = Counter()
+        self.errors = Counter()
+        self.deferred = Counter()
+        self.lock_path = lock_path
+        self.lock_file = None
+        self.leader = False
+
+    def targets(self):
+        ranked = rank_tickers(list(dict.fromkeys(self.universe_fn())))
+        return ranked[:self.top_n] if self.top_n else ranked
+
+    def run_cycle(self, provider):
+        """Refreshes every target ticker once for a provider, respecting its spacing."""
+        min_interval = self.min_intervals.get(provider, 0)
+        last_call = 0.0
+        for ticker in self.targets():
+            for job in self.jobs[provider]:
+                wait = last_call + min_interval - time.monotonic()
+                if wait > 0 and self.stop_event.wait(wait):
+                    return
+                started = time.monotonic()
+                try:
+                    with background() as limits:
+                        served_locally = job(ticker) is False
+                    if limits["deferred"]:
+                        # Requests are using the budget: skip this ticker and back off an interval
+                        self.deferred[provider] += 1
+                        last_call = started + min_interval
+                    elif not served_locally:  # Jobs return False when they used no request
+                        last_call = started
+                except Exception as e:
+                    self.errors[provider] += 1
+                    logger.warning("Prefetch failed: %s", e, extra={"provider": provider, "ticker": ticker})
+        self.cycles[provider] += 1
+
+    def _loop(self, provider):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            self.run_cycle(provider)
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _lead(self):
+        """Blocks until this process holds PREFETCH_LOCK_FILE, then starts the provider threads."""
+        import fcntl
+        # Kept open for the life of the process: the kernel drops the lock when it exits
+        self.lock_file = open(self.lock_path, "a")
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        if self.stop_event.is_set():
+            return
+        for provider in self.jobs:
+            thread = threading.Thread(target=self._loop, args=(provider,),
+                                      name=f"prefetch-{provider}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        self.leader = True
+        logger.info("Prefetch scheduler started",
+                    extra={"providers": list(self.jobs), "interval_seconds": self.interval, "pid": os.getpid()})
+
+    def start(self):
+        """Prefetches from this process once it is the leader (at once if no other process is)."""
+        thread = threading.Thread(target=self._lead, name="prefetch-leader", daemon=True)
+        thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+    def stats(self):
+        return {"leader": self.leader, "cycles": dict(self.cycles), "errors": dict(self.errors),
+                "deferred": dict(self.deferred)}
@@ -0,0 +1,76 @@
+import gc
+import importlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# **🔹 PRE-FORK WARM-UP**
+# -----------------------------------------
+
+# Histories loaded in the master and inherited by every worker: a comma list, or "all" for
+# the whole ticker universe. ^GSPC is the Beta benchmark every analytics request reads.
+PRELOAD_HISTORY_TICKERS = os.getenv("PRELOAD_HISTORY_TICKERS", "^GSPC")
+PRELOAD_HISTORY_PERIOD = os.getenv("PRELOAD_HISTORY_PERIOD", "6mo")
+
+# Deferred by main.py so plain imports stay fast; a preloading master pays for them once
+HEAVY_MODULES = ["numpy", "pandas", "requests", "multitasking", "yfinance"]
+
+
+def _close_inherited_connections():
+    """Drops sockets and SQLite handles opened while warming, so no two workers share one."""
+    try:
+        from yfinance import cache as yf_cache
+        from yfinance.data import YfData
+        for instance in YfData._instances.values():
+            instance._session.close()  # Closes pooled sockets; the session and its cookie stay usable
+        yf_cache._TzDBManager.close_db()
+        yf_cache._CookieDBManager.close_db()
+    except Exception as e:
+        logger.warning("Could not close yfinance connections before fork: %s", e)
+
+
+def preload(app_module):
+    """Builds read-only state in the gunicorn master so workers share it copy-on-write.
+
+    Loads the heavy modules, the ticker map and index, the benchmark (and
+    optionally universe) history into the history cache and the Polygon
+    grouped-daily table, then freezes the collected objects so worker garbage
+    collection does not touch (and copy) the shared pages. On a shared cache
+    backend the histories are written through to it too, and workers read
+    them from the history cache's in-process tier. Must not start threads or
+    use the thread pools: neither survives fork.
+    """
+    start = time.perf_counter()
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    if os.getenv("LLM_BACKEND", "openai") == "openai":
+        importlib.import_module("openai")
+
+    ticker_map = app_module.load_ticker_map()
+
+    if PRELOAD_HISTORY_TICKERS == "all":
+        tickers = list(ticker_map.values()) + ["^GSPC"]
+    else:
+        tickers = [t.strip() for t in PRELOAD_HISTORY_TICKERS.split(",") if t.strip()]
+    loaded = 0
+    if tickers:
+        try:
+            frames = app_module.fetch_history_batch(tickers, period=PRELOAD_HISTORY_PERIOD)
+            loaded = sum(1 for frame in frames.values() if not frame.empty)
+        except Exception as e:
+            logger.warning("History preload failed, workers will fetch on demand: %s", e)
+    # Loaded before fork, the grouped-daily table is one copy shared by every worker; later
+    # sessions are loaded by one worker and read from the shared cache by the rest
+    grouped = False
+    if app_module.POLYGON_GROUPED_ENABLED:
+        grouped = app_module.grouped_daily.ensure_fresh()
+    _close_inherited_connections()
+
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded shared state before fork", extra={
+        "companies": len(ticker_map), "histories": loaded, "grouped_daily": grouped,
+        "frozen_objects": gc.get_freeze_count(), "seconds": round(time.perf_counter() - start, 3)})
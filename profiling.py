@@ -0,0 +1,171 @@
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# **🔹 PROFILER CONFIGURATION**
+# -----------------------------------------
+
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")  # sample | cprofile
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of requests profiled
+# Per-request profiling (X-Profile header or ?profile=) needs this token as the value; empty disables it
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000.0
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+# Leaf frames in these files are idle pool workers, not work done for the request
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "socketserver.py", "thread.py")
+
+_slots = threading.BoundedSemaphore(PROFILE_MAX_CONCURRENT)
+
+# -----------------------------------------
+# **🔹 PROFILERS**
+# -----------------------------------------
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Statistical profiler: snapshots every thread's stack each interval.
+
+    The request thread is always kept (time spent waiting on providers is
+    part of its latency); other threads are kept only while busy, which
+    covers the provider and quote pool workers doing the fetches. Stacks are
+    saved in collapsed format ("thread;outer;...;inner count"), which
+    flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    suffix = ".folded"
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.target = None
+
+    def _sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        me = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if ident != self.target and os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append("request" if ident == self.target else names.get(ident, str(ident)))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.target = threading.get_ident()
+        self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class DeterministicProfiler:
+    """cProfile on the request thread; writes a pstats file (snakeviz, flameprof, gprof2dot)."""
+
+    suffix = ".prof"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+PROFILERS = {"sample": StackSampler, "cprofile": DeterministicProfiler}
+
+# -----------------------------------------
+# **🔹 REQUEST HOOK**
+# -----------------------------------------
+
+class RequestProfile:
+    """Context manager around one request; `path` is set once the profile is on disk."""
+
+    def __init__(self, label, mode=PROFILE_MODE):
+        self.label = label
+        self.profiler = PROFILERS[mode]()
+        self.path = None
+        self.acquired = False
+
+    def __enter__(self):
+        # Bounded so a burst of profiled requests cannot multiply the overhead
+        self.acquired = _slots.acquire(blocking=False)
+        if self.acquired:
+            self.started = time.perf_counter()
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.acquired:
+            return False
+        try:
+            self.profiler.stop()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            elapsed_ms = (time.perf_counter() - self.started) * 1000
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.label}-{elapsed_ms:.0f}ms{self.profiler.suffix}"
+            self.path = os.path.join(PROFILE_DIR, name)
+            self.profiler.write(self.path)
+            logger.info("Request profile written", extra={"path": self.path, "elapsed_ms": elapsed_ms})
+        except Exception as e:
+            logger.warning("Request profile failed: %s", e)
+        finally:
+            _slots.release()
+        return False
+
+
+class _NoProfile:
+    path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PROFILE = _NoProfile()
+
+
+def request_profile(flag=None, label=None):
+    """Returns a profiler for this request if it asked with PROFILE_TOKEN or was sampled."""
+    requested = bool(PROFILE_TOKEN) and flag == PROFILE_TOKEN
+    if not requested and not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+        return _NO_PROFILE
+    return RequestProfile(label or uuid.uuid4().hex[:12])
@@ -0,0 +1,86 @@
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from resilience import PROVIDER_DEADLINE, providers
+from tracing import submit
+
+# -----------------------------------------
+# **🔹 QUOTE RESOLUTION POLICY**
+# -----------------------------------------
+
+# "all"          wait for every provider (previous behaviour)
+# "first_valid"  return as soon as one provider has a valid quote
+# "within:<ms>"  after the first valid quote, give the others <ms> more to answer
+QUOTE_POLICY = os.getenv("QUOTE_POLICY", "within:500")
+
+_fanout_executor = ThreadPoolExecutor(max_workers=int(os.getenv("QUOTE_POOL_SIZE", "16")),
+                                      thread_name_prefix="quote")
+
+
+def parse_policy(policy):
+    """Returns (kind, grace_seconds) for a policy string."""
+    if policy == "all":
+        return "all", None
+    if policy == "first_valid":
+        return "within", 0.0
+    if policy.startswith("within:"):
+        return "within", float(policy.split(":", 1)[1]) / 1000.0
+    raise ValueError(f"Unknown QUOTE_POLICY '{policy}'")
+
+
+def _is_valid(result):
+    return isinstance(result, dict) and "error" not in result
+
+# -----------------------------------------
+# **🔹 CONCURRENT RESOLUTION**
+# -----------------------------------------
+
+def resolve_quotes(tickers, fetchers, policy=None, fallbacks=None):
+    """Queries every provider for every ticker at once and returns per the quorum policy.
+
+    `fetchers` maps provider name -> fetch(ticker). Returns
+    {ticker: {provider: quote or {"error": ...}}}. Providers the policy did not
+    wait for are reported as errors; their calls keep running and fill the cache.
+    `fallbacks` maps provider name -> cached(ticker), served while its breaker is open.
+    """
+    kind, grace = parse_policy(policy or QUOTE_POLICY)
+    results = {ticker: {} for ticker in tickers}
+    first_valid_at = {}
+    pending = {}
+    for ticker in tickers:
+        for name, fetch in fetchers.items():
+            call = functools.partial(providers[name].call, fallback=(fallbacks or {}).get(name))
+            future = submit(_fanout_executor, call, fetch, ticker)
+            pending[future] = (ticker, name)
+
+    def satisfied(ticker, now):
+        if len(results[ticker]) == len(fetchers):
+            return True
+        if kind == "within" and ticker in first_valid_at:
+            return now >= first_valid_at[ticker] + grace
+        return False
+
+    start = time.monotonic()
+    # Every provider call already has its own deadline; this only guards the loop itself
+    deadline = start + PROVIDER_DEADLINE + 1.0
+    while pending:
+        now = time.monotonic()
+        open_tickers = [t for t in tickers if not satisfied(t, now)]
+        if not open_tickers or now >= deadline:
+            break
+        wakeups = [first_valid_at[t] + grace for t in open_tickers
+                   if kind == "within" and t in first_valid_at]
+        timeout = max(0.0, min(wakeups + [deadline]) - now)
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            ticker, name = pending.pop(future)
+            result = future.result()
+            results[ticker][name] = result
+            if _is_valid(result) and ticker not in first_valid_at:
+                first_valid_at[ticker] = time.monotonic()
+
+    for ticker, name in pending.values():
+        results[ticker][name] = {"error": f"{name} not awaited ({policy or QUOTE_POLICY})"}
+    return results
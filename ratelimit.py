@@ -0,0 +1,211 @@
+import bisect
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# -----------------------------------------
+# **🔹 RATE LIMIT CONFIGURATION**
+# -----------------------------------------
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "/tmp/rag_ratelimit.sqlite3")
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "2"))  # Seconds a request may queue
+# Share of each bucket's capacity background work (prefetch) must leave for requests
+RATE_LIMIT_BACKGROUND_RESERVE = float(os.getenv("RATE_LIMIT_BACKGROUND_RESERVE", "0.5"))
+
+# provider -> (tokens per second, bucket capacity)
+PROVIDER_LIMITS = {
+    "Polygon": (float(os.getenv("RATE_LIMIT_POLYGON_PER_MIN", "5")) / 60.0,
+                float(os.getenv("RATE_LIMIT_POLYGON_BURST", "5"))),
+    "Yahoo": (float(os.getenv("RATE_LIMIT_YAHOO_PER_MIN", "120")) / 60.0,
+              float(os.getenv("RATE_LIMIT_YAHOO_BURST", "10"))),
+}
+
+# -----------------------------------------
+# **🔹 TOKEN BUCKET BACKENDS**
+# -----------------------------------------
+
+class MemoryBucketBackend:
+    """Token buckets shared by the threads of one process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}  # provider -> [tokens, updated_at]
+
+    def try_acquire(self, provider, rate, capacity, floor=0.0):
+        """Takes a token and returns 0, or returns the seconds until one is available.
+
+        With a `floor`, a token is only taken if `floor` tokens remain afterwards.
+        """
+        with self.lock:
+            now = time.monotonic()
+            tokens, updated = self.buckets.get(provider, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1 + floor:
+                self.buckets[provider] = [tokens - 1, now]
+                return 0.0
+            self.buckets[provider] = [tokens, now]
+            return (1 + floor - tokens) / rate
+
+    def peek(self, provider, rate, capacity):
+        """Tokens available right now, without taking one."""
+        with self.lock:
+            now = time.monotonic()
+            tokens, updated = self.buckets.get(provider, (capacity, now))
+            return min(capacity, tokens + (now - updated) * rate)
+
+
+class SQLiteBucketBackend:
+    """Token buckets in a local SQLite file, shared by every gunicorn worker on the host."""
+
+    def __init__(self, path=RATE_LIMIT_DB):
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                         "(provider TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _connect(self):
+        # A connection opened in the gunicorn master must not be reused by forked workers
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def try_acquire(self, provider, rate, capacity, floor=0.0):
+        conn = self._connect()
+        now = time.time()  # Wall clock: monotonic clocks are not comparable across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE provider = ?",
+                               (provider,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= 1 + floor else (1 + floor - tokens) / rate
+            if wait == 0.0:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (provider, tokens, updated) VALUES (?, ?, ?)",
+                         (provider, tokens, now))
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def peek(self, provider, rate, capacity):
+        row = self._connect().execute("SELECT tokens, updated FROM buckets WHERE provider = ?",
+                                      (provider,)).fetchone()
+        if row is None:
+            return capacity
+        tokens, updated = row
+        return min(capacity, tokens + max(0.0, time.time() - updated) * rate)
+
+# -----------------------------------------
+# **🔹 WAIT-TIME HISTOGRAMS**
+# -----------------------------------------
+
+WAIT_BUCKETS = [0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class WaitHistogram:
+    """Cumulative-style histogram of how long callers queued for a token."""
+
+    def __init__(self, bounds=WAIT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.rejected = 0
+        self.deferred = 0  # Background acquires refused to keep the reserve
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+
+    def snapshot(self):
+        labels = [str(b) for b in self.bounds] + ["+Inf"]
+        return {"buckets": dict(zip(labels, self.counts)), "count": sum(self.counts),
+                "sum_seconds": self.total, "rejected": self.rejected, "deferred": self.deferred}
+
+# -----------------------------------------
+# **🔹 PROVIDER RATE LIMITER**
+# -----------------------------------------
+
+# Set while background work runs; counts the acquires refused to it
+_background = contextvars.ContextVar("rate_limit_background", default=None)
+
+
+@contextmanager
+def background():
+    """Marks provider calls in this context as background work; yields {"deferred": count}.
+
+    Background acquires never queue and only take a token while the bucket
+    keeps RATE_LIMIT_BACKGROUND_RESERVE of its capacity for requests.
+    """
+    state = {"deferred": 0}
+    token = _background.set(state)
+    try:
+        yield state
+    finally:
+        _background.reset(token)
+
+
+class RateLimiter:
+    """Queues callers until their provider's bucket has a token, up to max_wait."""
+
+    def __init__(self, backend, limits=PROVIDER_LIMITS):
+        self.backend = backend
+        self.limits = limits
+        self.lock = threading.Lock()
+        self.histograms = {provider: WaitHistogram() for provider in limits}
+
+    def acquire(self, provider, max_wait=RATE_LIMIT_MAX_WAIT):
+        """Returns True once a token is taken, False if it would take longer than max_wait."""
+        if provider not in self.limits:
+            return True
+        rate, capacity = self.limits[provider]
+        state = _background.get()
+        if state is not None:
+            if self.backend.try_acquire(provider, rate, capacity, capacity * RATE_LIMIT_BACKGROUND_RESERVE):
+                state["deferred"] += 1
+                with self.lock:
+                    self.histograms[provider].deferred += 1
+                return False
+            return True
+        start = time.monotonic()
+        while True:
+            wait = self.backend.try_acquire(provider, rate, capacity)
+            waited = time.monotonic() - start
+            if wait == 0.0:
+                with self.lock:
+                    self.histograms[provider].observe(waited)
+                return True
+            if waited + wait > max_wait:
+                with self.lock:
+                    self.histograms[provider].rejected += 1
+                return False
+            time.sleep(wait)
+
+    def has_spare_token(self, provider):
+        """True if a token is free right now beyond the reserve kept for requests (see background)."""
+        if provider not in self.limits:
+            return True
+        rate, capacity = self.limits[provider]
+        return self.backend.peek(provider, rate, capacity) >= 1 + capacity * RATE_LIMIT_BACKGROUND_RESERVE
+
+    def snapshot(self):
+        with self.lock:
+            return {provider: hist.snapshot() for provider, hist in self.histograms.items()}
+
+
+def _make_backend():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBucketBackend()
+    return MemoryBucketBackend()
+
+
+rate_limiter = RateLimiter(_make_backend())
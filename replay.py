@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import pickle
+import random
+import re
+import threading
+import time
+
+# -----------------------------------------
+# **🔹 RECORD / REPLAY CONFIGURATION**
+# -----------------------------------------
+
+# off: call providers; record: call and save every response; replay: serve saved responses only
+PROVIDER_REPLAY_MODE = os.getenv("PROVIDER_REPLAY_MODE", "off")
+PROVIDER_REPLAY_DIR = os.getenv("PROVIDER_REPLAY_DIR", "recordings")
+# Injected per-provider latency while replaying, e.g. "Yahoo=150,Polygon=90,OpenAI=2500"
+PROVIDER_REPLAY_LATENCY_MS = os.getenv("PROVIDER_REPLAY_LATENCY_MS", "")
+PROVIDER_REPLAY_JITTER = float(os.getenv("PROVIDER_REPLAY_JITTER", "0"))  # +/- fraction of latency
+
+
+class ReplayMiss(Exception):
+    """Raised in replay mode when no recording exists for a call."""
+
+
+def parse_latencies(spec):
+    """Parses "Yahoo=150,Polygon=90" into {"Yahoo": 0.15, "Polygon": 0.09} seconds."""
+    latencies = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, ms = part.split("=", 1)
+        latencies[name.strip()] = float(ms) / 1000.0
+    return latencies
+
+# -----------------------------------------
+# **🔹 RECORDER**
+# -----------------------------------------
+
+class Recorder:
+    """Saves provider responses to disk once and serves them back with simulated latency.
+
+    Recordings are pickles under <directory>/<provider>/<sha1 of key>.pkl; keys
+    must not contain secrets such as API keys.
+    """
+
+    def __init__(self, mode=PROVIDER_REPLAY_MODE, directory=PROVIDER_REPLAY_DIR,
+                 latencies=None, jitter=PROVIDER_REPLAY_JITTER, seed=0):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown PROVIDER_REPLAY_MODE '{mode}'")
+        self.mode = mode
+        self.directory = directory
+        self.latencies = parse_latencies(PROVIDER_REPLAY_LATENCY_MS) if latencies is None else latencies
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.mode != "off"
+
+    def _path(self, provider, key):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, provider, f"{digest}.pkl")
+
+    def save(self, provider, key, value):
+        path = self._path(provider, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"key": key, "value": value}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def load(self, provider, key):
+        try:
+            with open(self._path(provider, key), "rb") as f:
+                return pickle.load(f)["value"]
+        except FileNotFoundError:
+            raise ReplayMiss(f"No {provider} recording for {key}") from None
+
+    def simulate_latency(self, provider):
+        latency = self.latencies.get(provider, 0.0)
+        if latency and self.jitter:
+            with self.lock:
+                latency *= 1 + self.random.uniform(-self.jitter, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+    def call(self, provider, key, fn):
+        """Runs fn() live, records its result, or replays it, depending on the mode."""
+        if self.mode == "replay":
+            self.simulate_latency(provider)
+            return self.load(provider, key)
+        value = fn()
+        if self.mode == "record":
+            self.save(provider, key, value)
+        return value
+
+
+recorder = Recorder()
+
+# -----------------------------------------
+# **🔹 LLM BACKEND WRAPPER**
+# -----------------------------------------
+
+_NUMBER = re.compile(r"-?\d[\d,]*(\.\d+)?(e-?\d+)?")
+
+
+class ReplayLLMBackend:
+    """Records or replays chat completions around another backend (None when replaying)."""
+
+    name = "replay"
+
+    def __init__(self, inner, recorder=recorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    @staticmethod
+    def _key(messages, model, max_tokens, temperature):
+        # Prompts embed live prices and Monte Carlo draws; key on their shape, not the digits
+        shapes = [{"role": m["role"], "content": _NUMBER.sub("#", m["content"])} for m in messages]
+        return ["chat", model, max_tokens, temperature, shapes]
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        key = self._key(messages, model, max_tokens, temperature)
+        return self.recorder.call(
+            "OpenAI", key,
+            lambda: self.inner.complete(messages, model, max_tokens, temperature, timeout))
+
+    def stream(self, messages, model, max_tokens, temperature, timeout):
+        # Streams are recorded as the completed text and replayed word by word
+        content = self.complete(messages, model, max_tokens, temperature, timeout)["content"]
+        for i, word in enumerate(content.split(" ")):
+            yield word if i == 0 else " " + word
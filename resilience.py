@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from metrics import provider_latency
+from ratelimit import rate_limiter
+from tracing import set_attribute, span, submit
+
+# -----------------------------------------
+# **🔹 RESILIENCE CONFIGURATION**
+# -----------------------------------------
+
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "5"))  # Per HTTP call, seconds
+PROVIDER_DEADLINE = float(os.getenv("PROVIDER_DEADLINE", "6"))  # Whole call incl. hedge, seconds
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+# A hedge costs a second rate-limit token; Polygon's 5/min bucket cannot spare it
+HEDGE_PROVIDERS = set(os.getenv("HEDGE_PROVIDERS", "Yahoo").split(","))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.25"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "1.0"))  # Until enough samples exist
+HEDGE_MIN_SAMPLES = 20
+CACHE_HIT_SECONDS = 0.001
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PROVIDER_POOL_SIZE", "32")),
+                               thread_name_prefix="provider")
+
+# -----------------------------------------
+# **🔹 CIRCUIT BREAKER**
+# -----------------------------------------
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one trial call through after a cool-down."""
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.transitions = Counter()
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.transitions[state] += 1
+
+    def is_closed(self):
+        """True while calls flow normally; unlike allow() it never takes the half-open trial."""
+        with self.lock:
+            return self.state == "closed"
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state("half_open")
+            if self.state == "half_open":
+                if self.trial_in_flight:
+                    return False
+                self.trial_in_flight = True
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial_in_flight = False
+            self._set_state("closed")
+
+    def release(self):
+        """Ends a call that says nothing about the provider's health (e.g. rate-limited locally)."""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state("open")
+
+    def snapshot(self):
+        with self.lock:
+            return {"state": self.state, "consecutive_failures": self.failures,
+                    "transitions": dict(self.transitions)}
+
+# -----------------------------------------
+# **🔹 HEDGED CALLS**
+# -----------------------------------------
+
+# Error kinds fetchers return that are not the provider failing: the call was never made
+# (local rate limit) or the provider answered that it has nothing for this ticker
+NEUTRAL_ERRORS = {"rate_limited", "no_data"}
+
+
+def _is_error(result):
+    return isinstance(result, dict) and "error" in result
+
+
+def _is_failure(result):
+    """Errors that count against the breaker: exceptions, timeouts, upstream 5xx."""
+    return _is_error(result) and result.get("kind") not in NEUTRAL_ERRORS
+
+
+class ResilientProvider:
+    """Wraps one provider's fetcher with a circuit breaker, a deadline and a hedged retry.
+
+    If the first attempt has not answered by the provider's recent latency
+    percentile, a second identical attempt is fired, provided the rate limiter
+    has a token to spare, and whichever succeeds first wins. Attempts still
+    running at the deadline are abandoned; they finish in the background and
+    fill the caches. Only exceptions, timeouts and upstream errors trip the
+    breaker; while it is open, `fallback` (a cache lookup) still answers.
+    """
+
+    def __init__(self, name, deadline=PROVIDER_DEADLINE, hedge=None):
+        self.name = name
+        self.deadline = deadline
+        self.hedge = HEDGE_ENABLED and name in HEDGE_PROVIDERS if hedge is None else hedge
+        self.breaker = CircuitBreaker(name)
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=512)
+        self.counts = Counter()
+
+    def hedge_delay(self):
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        index = min(len(samples) - 1, int(HEDGE_PERCENTILE / 100.0 * len(samples)))
+        return max(HEDGE_MIN_DELAY, samples[index])
+
+    def _timed(self, fn, args):
+        start = time.monotonic()
+        result = fn(*args)
+        elapsed = time.monotonic() - start
+        # Sub-millisecond answers are cache hits and would drag the hedge threshold to zero
+        if not _is_error(result) and elapsed > CACHE_HIT_SECONDS:
+            with self.lock:
+                self.latencies.append(elapsed)
+        return result
+
+    def call(self, fn, *args, fallback=None):
+        """Runs fn(*args); returns its result or an {"error": ...} dict, never raises.
+
+        `fallback(*args)` is consulted when the breaker is open and returns a
+        cached result (fresh or stale) or None.
+        """
+        with span("provider.call", provider=self.name):
+            return self._call(fn, args, fallback)
+
+    def _call(self, fn, args, fallback=None):
+        start = time.monotonic()
+        if not self.breaker.allow():
+            cached = fallback(*args) if fallback is not None else None
+            self._finish("short_circuited", start)
+            return cached if cached is not None else {"error": f"{self.name} circuit open"}
+
+        first = submit(_executor, self._timed, fn, args)
+        pending = {first}
+        hedged = not self.hedge
+        hedge_at = start + self.hedge_delay()
+        last_failure = None
+        while pending:
+            now = time.monotonic()
+            remaining = self.deadline - (now - start)
+            if remaining <= 0:
+                break
+            timeout = remaining if hedged else min(remaining, max(0.0, hedge_at - now))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"error": str(e)}
+                if not _is_error(result):
+                    self.breaker.record_success()
+                    self._finish("hedge_wins" if future is not first else "success", start)
+                    return result
+                if not _is_failure(result):
+                    if future is first:
+                        self.breaker.release()
+                        self._finish("neutral", start, result["kind"])
+                        return result
+                    continue  # A declined hedge; keep waiting for the first attempt
+                last_failure = result
+            if pending and not done and not hedged:
+                hedged = True
+                # First attempt is slower than usual: race a second one, if a token is free right now
+                if rate_limiter.has_spare_token(self.name):
+                    self._count("hedges")
+                    set_attribute("hedged", True)
+                    pending.add(submit(_executor, self._timed, fn, args))
+                else:
+                    self._count("hedges_skipped")
+        if pending:
+            self._count("timeouts")
+            last_failure = {"error": f"{self.name} timed out after {self.deadline}s"}
+        self.breaker.record_failure()
+        self._finish("failures", start, "timeout" if pending else "failure")
+        return last_failure or {"error": f"{self.name} failed"}
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def _finish(self, key, start, outcome=None):
+        """Counts a call's final outcome and records its latency for /metrics."""
+        self._count(key)
+        provider_latency.observe(time.monotonic() - start, self.name, outcome or key)
+        set_attribute("outcome", outcome or key)
+
+    def snapshot(self):
+        with self.lock:
+            counts = dict(self.counts)
+        return {"breaker": self.breaker.snapshot(), "hedge_delay_seconds": self.hedge_delay(),
+                **counts}
+
+
+providers = {
+    "Yahoo": ResilientProvider("Yahoo"),
+    "Polygon": ResilientProvider("Polygon"),
+}
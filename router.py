@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from cache import LLM_CACHE_TTL, llm_cache
+from llm import LLM_MODEL, get_llm_client
+from timing import stage
+from tracing import set_attribute
+
+# -----------------------------------------
+# **🔹 QUERY CLASSIFICATION**
+# -----------------------------------------
+
+ROUTER_FAST_MODEL = os.getenv("ROUTER_FAST_MODEL", "gpt-3.5-turbo")
+
+STRATEGY_PATTERN = re.compile(
+    r"\b(should i|buy|sell|hold|invest\w*|strateg\w*|portfolio|outlook|forecast|predict\w*|"
+    r"recommend\w*|risk\w*|compare|versus|vs|why|plan|long[- ]term|diversif\w*)\b", re.IGNORECASE)
+INDICATOR_PATTERN = re.compile(
+    r"\b(rsi|sma|moving averages?|bollinger|beta|monte carlo|volatility|indicators?|technicals?)\b",
+    re.IGNORECASE)
+PRICE_PATTERN = re.compile(
+    r"\b(price|quote|trading at|worth|cost|how much|close|closing|open|volume|high|low)\b",
+    re.IGNORECASE)
+
+# Long free-form questions are treated as open-ended even without strategy keywords
+MAX_SIMPLE_QUERY_WORDS = 20
+
+
+def classify_query(user_query):
+    """Classifies a query as 'price_lookup', 'indicator' or 'strategy'."""
+    if STRATEGY_PATTERN.search(user_query) or len(user_query.split()) > MAX_SIMPLE_QUERY_WORDS:
+        return "strategy"
+    if INDICATOR_PATTERN.search(user_query):
+        return "indicator"
+    if PRICE_PATTERN.search(user_query):
+        return "price_lookup"
+    return "strategy"
+
+# -----------------------------------------
+# **🔹 ROUTE TABLE**
+# -----------------------------------------
+
+# mode "llm" sends the prompt to `model`; max_tokens=None keeps the caller's budget.
+# mode "template" answers from collected data and only falls back to `model` when it can't.
+ROUTES = {
+    "price_lookup": {"mode": "template", "model": ROUTER_FAST_MODEL, "max_tokens": 150},
+    "indicator": {"mode": "template", "model": ROUTER_FAST_MODEL, "max_tokens": 300},
+    "strategy": {"mode": "llm", "model": LLM_MODEL, "max_tokens": None},
+}
+
+
+def choose_route(user_query):
+    """Returns the route name and its config for a query."""
+    name = classify_query(user_query)
+    return name, ROUTES[name]
+
+# -----------------------------------------
+# **🔹 PER-ROUTE METRICS**
+# -----------------------------------------
+
+class RouteMetrics:
+    """Thread-safe per-route request counts, latency samples and token totals."""
+
+    def __init__(self, max_samples=1024):
+        self.lock = threading.Lock()
+        self.max_samples = max_samples
+        self.routes = {}
+
+    def _entry(self, route):
+        if route not in self.routes:
+            self.routes[route] = {"requests": 0, "errors": 0, "prompt_tokens": 0,
+                                  "completion_tokens": 0,
+                                  "latencies": deque(maxlen=self.max_samples)}
+        return self.routes[route]
+
+    def record(self, route, latency, usage=None, error=False):
+        with self.lock:
+            entry = self._entry(route)
+            entry["requests"] += 1
+            entry["errors"] += int(error)
+            entry["latencies"].append(latency)
+            if usage:
+                entry["prompt_tokens"] += usage.get("prompt_tokens", 0)
+                entry["completion_tokens"] += usage.get("completion_tokens", 0)
+
+    def snapshot(self):
+        """Returns a JSON-friendly summary with p50/p95 latency in milliseconds."""
+        with self.lock:
+            summary = {}
+            for route, entry in self.routes.items():
+                latencies = sorted(entry["latencies"])
+                summary[route] = {
+                    "requests": entry["requests"],
+                    "errors": entry["errors"],
+                    "prompt_tokens": entry["prompt_tokens"],
+                    "completion_tokens": entry["completion_tokens"],
+                    "p50_ms": _percentile(latencies, 50) * 1000,
+                    "p95_ms": _percentile(latencies, 95) * 1000,
+                }
+            return summary
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+route_metrics = RouteMetrics()
+
+# -----------------------------------------
+# **🔹 ROUTED COMPLETION**
+# -----------------------------------------
+
+def _completion_key(model, messages, max_tokens, temperature):
+    payload = json.dumps([model, messages, max_tokens, temperature], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def complete_routed(route_name, route, messages, max_tokens, temperature):
+    """Sends messages to the route's model and records latency and token usage.
+
+    Identical prompts (same data, same question) within LLM_CACHE_TTL are
+    answered from llm_cache, which every worker shares on a shared backend.
+    """
+    model = route["model"]
+    max_tokens = route["max_tokens"] or max_tokens
+    key = _completion_key(model, messages, max_tokens, temperature) if LLM_CACHE_TTL > 0 else None
+    if key is not None:
+        cached = llm_cache.get(key)
+        set_attribute("llm_cache", "hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
+    try:
+        with stage("llm"):
+            response = get_llm_client().complete(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+    except Exception:
+        route_metrics.record(route_name, time.perf_counter() - start, error=True)
+        raise
+    route_metrics.record(route_name, time.perf_counter() - start, response.get("usage"))
+    if key is not None:
+        llm_cache.set(key, response["content"])
+    return response["content"]
@@ -0,0 +1,328 @@
+import atexit
+import itertools
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# **🔹 SHARED-MEMORY FRAME TRANSPORT**
+# -----------------------------------------
+
+# Arrays start on cache-line boundaries so vectorised reads never straddle them
+SHM_ALIGNMENT = int(os.getenv("SHM_ALIGNMENT", "64"))
+
+# Segments a worker keeps mapped between tasks, so tickers of one batch attach once
+SHM_ATTACH_CACHE = int(os.getenv("SHM_ATTACH_CACHE", "8"))
+
+# Closed segments the owner keeps for later batches instead of unlinking. A fresh segment
+# page-faults on every page it is written to, which costs more than the copy itself.
+SHM_POOL_SEGMENTS = int(os.getenv("SHM_POOL_SEGMENTS", "2"))
+
+# Dtypes that can live in shared memory as plain arrays
+_RAW_KINDS = "biufM"
+
+
+def _align(offset):
+    return (offset + SHM_ALIGNMENT - 1) // SHM_ALIGNMENT * SHM_ALIGNMENT
+
+
+def _layout(frame, offset, indexes):
+    """Plans where one frame's arrays go; returns (descriptor, [(offset, array)], end offset).
+
+    Columns of the most common dtype (the OHLC floats of a price history) are
+    laid out as one (columns x rows) block, which `AttachedFrame.block`
+    exposes as a single 2-D array. Histories over the same
+    trading days share one stored index (`indexes` remembers those written).
+    """
+    import numpy as np
+    index = frame.index
+    tz = str(index.tz) if getattr(index, "tz", None) is not None else None
+    index_values = index.values  # For a tz-aware index: its UTC datetime64 values, no copy
+    columns = [(str(name), frame[name].to_numpy()) for name in frame.columns]
+    if index_values.dtype.kind not in _RAW_KINDS or any(v.dtype.kind not in _RAW_KINDS for _, v in columns):
+        raise TypeError("Only numeric or datetime frames can be shared")
+    rows = len(frame)
+    dtypes = [v.dtype.str for _, v in columns]
+    block_dtype = max(set(dtypes), key=dtypes.count) if dtypes else None
+    block = [(name, v) for name, v in columns if v.dtype.str == block_dtype]
+    extra = [(name, v) for name, v in columns if v.dtype.str != block_dtype]
+
+    writes = []
+    shared_index = next((at for at, values in indexes if values.dtype == index_values.dtype
+                         and np.array_equal(values, index_values)), None)
+    if shared_index is None:
+        offset = shared_index = _align(offset)
+        indexes.append((offset, index_values))
+        writes.append((offset, np.ascontiguousarray(index_values)))
+        offset += index_values.nbytes
+    descriptor = {"rows": rows, "order": [name for name, _ in columns],
+                  "index": {"offset": shared_index, "dtype": index_values.dtype.str, "tz": tz,
+                            "name": index.name}}
+    if block:
+        offset = _align(offset)
+        descriptor["block"] = {"offset": offset, "dtype": block_dtype, "columns": [n for n, _ in block]}
+        # Each column is copied straight into its row of the block; no stacked temporary
+        for _, values in block:
+            writes.append((offset, values))
+            offset += values.nbytes
+    descriptor["extra"] = []
+    for name, values in extra:
+        offset = _align(offset)
+        descriptor["extra"].append({"name": name, "offset": offset, "dtype": values.dtype.str})
+        writes.append((offset, np.ascontiguousarray(values)))
+        offset += values.nbytes
+    return descriptor, writes, offset
+
+
+class _SegmentPool:
+    """Owner-side free list of segments whose pages are already faulted in."""
+
+    def __init__(self, size=SHM_POOL_SEGMENTS):
+        self.size = size
+        self.lock = threading.Lock()
+        self.free = []
+        self.generations = itertools.count(1)
+
+    def take(self, nbytes):
+        """A segment of at least `nbytes` and the generation number of its new contents."""
+        with self.lock:
+            shm = next((shm for shm in self.free if shm.size >= nbytes), None)
+            if shm is not None:
+                self.free.remove(shm)
+            generation = next(self.generations)
+        if shm is None:
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        return shm, generation
+
+    def give_back(self, shm):
+        with self.lock:
+            if len(self.free) < self.size:
+                self.free.append(shm)
+                return
+        _unlink(shm)
+
+    def clear(self):
+        with self.lock:
+            free, self.free = self.free, []
+        for shm in free:
+            _unlink(shm)
+
+
+def _unlink(shm):
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+_pool = _SegmentPool()
+atexit.register(_pool.clear)
+# A forked child must not hand out (or unlink) its parent's free segments
+os.register_at_fork(after_in_child=_pool.__init__)
+
+
+class SharedFrames:
+    """Owner side: copies several frames into one shared memory segment, once.
+
+    `descriptors` maps each key to a small picklable dict (segment name,
+    offsets, dtypes) that is all a pool task needs to receive instead of
+    the pickled frame. The owner must keep this object alive until every
+    task using it has finished, then close() it. Closed segments go back to
+    a small pool (SHM_POOL_SEGMENTS) and are overwritten by the next batch;
+    each publish has a new generation, so workers drop frames built from an
+    earlier one.
+    """
+
+    def __init__(self, frames):
+        import numpy as np
+        plans = {}
+        indexes = []
+        end = 0
+        for key, frame in frames.items():
+            descriptor, writes, end = _layout(frame, end, indexes)
+            plans[key] = (descriptor, writes)
+        self.shm, generation = _pool.take(max(1, end))
+        tracker = _tracker_pid()
+        self.descriptors = {}
+        for frame_id, (key, (descriptor, writes)) in enumerate(plans.items()):
+            for offset, values in writes:
+                target = np.ndarray(values.shape, dtype=values.dtype, buffer=self.shm.buf, offset=offset)
+                target[...] = values
+            descriptor["segment"] = self.shm.name
+            descriptor["tracker"] = tracker
+            descriptor["generation"] = generation
+            descriptor["frame_id"] = frame_id
+            self.descriptors[key] = descriptor
+        self.nbytes = end
+
+    def close(self):
+        if self.shm is not None:
+            _pool.give_back(self.shm)
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+# -----------------------------------------
+# **🔹 WORKER SIDE**
+# -----------------------------------------
+
+def _tracker_pid():
+    return getattr(resource_tracker._resource_tracker, "_pid", None)
+
+
+def _open_segment(descriptor):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=descriptor["segment"], track=False)
+    shm = shared_memory.SharedMemory(name=descriptor["segment"])
+    # Before 3.13 attaching registers the segment with this process's resource tracker.
+    # Pool workers share the owner's tracker (forked: same pid; spawned: inherited fd,
+    # pid unknown), where that is a no-op. An unrelated process has its own tracker,
+    # which would unlink the segment when it exits, so the segment is deregistered there.
+    tracker = _tracker_pid()
+    if tracker is not None and tracker != descriptor["tracker"]:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class _SegmentCache:
+    """Per-process LRU of mapped segments and the indexes and frames built over them."""
+
+    def __init__(self, size=SHM_ATTACH_CACHE):
+        self.size = size
+        self.lock = threading.Lock()
+        # segment name -> (SharedMemory, {index or frame key: object}, [generation built from])
+        self.segments = OrderedDict()
+
+    def get(self, descriptor):
+        name = descriptor["segment"]
+        with self.lock:
+            entry = self.segments.get(name)
+            if entry is None:
+                entry = self.segments[name] = (_open_segment(descriptor), {}, [descriptor["generation"]])
+                while len(self.segments) > self.size:
+                    _, (shm, built, _) = self.segments.popitem(last=False)
+                    built.clear()  # Drops the cached frames' views so the mapping can close
+                    _close(shm)
+            elif entry[2][0] != descriptor["generation"]:
+                # The owner recycled the segment for a new batch: same mapping, new contents
+                entry[1].clear()
+                entry[2][0] = descriptor["generation"]
+            self.segments.move_to_end(name)
+            return entry[0], entry[1]
+
+    def clear(self):
+        with self.lock:
+            while self.segments:
+                _, (shm, built, _) = self.segments.popitem()
+                built.clear()
+                _close(shm)
+
+
+def _close(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # A view escaped a task and is still referenced; the mapping closes when it is collected
+        logger.debug("Shared frame still referenced, leaving it mapped", extra={"segment": shm.name})
+
+
+_segments = _SegmentCache()
+os.register_at_fork(after_in_child=_segments.__init__)
+
+
+class AttachedFrame:
+    """Worker side: read-only NumPy views of one shared frame, plus a DataFrame over them.
+
+    `arrays` maps each column name to a zero-copy view, and `frame` is a
+    DataFrame over those views, one pandas block per column, so nothing is
+    copied. The index is built once per segment and reused by every frame
+    over the same dates. Segments stay mapped in the worker (SHM_ATTACH_CACHE
+    of them) so later tasks on the same batch skip the attach, and
+    attached_frame() reuses the frame itself.
+    """
+
+    def __init__(self, descriptor):
+        import numpy as np
+        self.descriptor = descriptor
+        self.shm, self.indexes = _segments.get(descriptor)
+        rows = descriptor["rows"]
+        buf = self.shm.buf
+        self.arrays = {}
+        self.block = None
+        if "block" in descriptor:
+            spec = descriptor["block"]
+            self.block = np.ndarray((len(spec["columns"]), rows), dtype=spec["dtype"], buffer=buf,
+                                    offset=spec["offset"])
+            self.block.flags.writeable = False
+            for i, name in enumerate(spec["columns"]):
+                self.arrays[name] = self.block[i]
+        for spec in descriptor["extra"]:
+            values = np.ndarray((rows,), dtype=spec["dtype"], buffer=buf, offset=spec["offset"])
+            values.flags.writeable = False
+            self.arrays[spec["name"]] = values
+        spec = descriptor["index"]
+        self.index_values = np.ndarray((rows,), dtype=spec["dtype"], buffer=buf, offset=spec["offset"])
+        self.index_values.flags.writeable = False
+
+    @property
+    def index(self):
+        import pandas as pd
+        spec = self.descriptor["index"]
+        key = (spec["offset"], spec["tz"], spec["name"])
+        index = self.indexes.get(key)
+        if index is None:
+            if spec["tz"]:
+                index = pd.DatetimeIndex(self.index_values, name=spec["name"]).tz_localize("UTC") \
+                    .tz_convert(spec["tz"])
+            else:
+                index = pd.Index(self.index_values, name=spec["name"], copy=False)
+            self.indexes[key] = index  # Indexes are immutable, so frames can share one
+        return index
+
+    @property
+    def frame(self):
+        import pandas as pd
+        # One block per column: ~140 us against ~340 us for wrapping the block and inserting
+        # the other dtypes, and nothing is copied
+        return pd.DataFrame({name: self.arrays[name] for name in self.descriptor["order"]},
+                            index=self.index, copy=False)
+
+
+def detach_all():
+    """Unmaps every segment this process attached (e.g. when a pool worker is retired)."""
+    _segments.clear()
+
+
+def attached_frame(descriptor):
+    """The DataFrame `descriptor` points to, built once per worker and segment.
+
+    Later tasks on the same frame get a shallow copy of the cached one (~30 us
+    against ~250 us to build it): columns they add stay their own, and the
+    shared values are read-only.
+    """
+    _, built = _segments.get(descriptor)
+    key = ("frame", descriptor["frame_id"])
+    frame = built.get(key)
+    if frame is None:
+        frame = built[key] = AttachedFrame(descriptor).frame
+    return frame.copy(deep=False)
+
+
+def run_on_shared(fn, descriptor, *args):
+    """Pool task entry point: fn(frame, *args) on the shared frame `descriptor` points to.
+
+    Submit this instead of fn so only the descriptor is pickled; fn's result
+    must not hold views of the frame (indicator values and dicts do not).
+    """
+    return fn(attached_frame(descriptor), *args)
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from date_ranges import parse_date_ranges  # noqa: E402
+
+TODAY = "2024-06-28"  # A Friday
+
+CASES = [
+    # Relative days and periods
+    ("Apple price 3 weeks ago", [("2024-06-07", "2024-06-07")]),
+    ("Tesla two months ago", [("2024-04-28", "2024-04-28")]),
+    ("What did Apple close at yesterday?", [("2024-06-27", "2024-06-27")]),
+    ("Apple over the last 5 years", [("2019-06-28", "2024-06-28")]),
+    ("Apple over the past year", [("2023-06-28", "2024-06-28")]),
+    ("Apple last 10 trading days", [("2024-06-14", "2024-06-28")]),
+    ("Apple YTD", [("2024-01-01", "2024-06-28")]),
+    ("Apple this month", [("2024-06-01", "2024-06-28")]),
+    ("Apple 1 quarter back", [("2024-03-28", "2024-03-28")]),
+    # Explicit dates
+    ("Apple on 2020-03-15", [("2020-03-15", "2020-03-15")]),
+    ("Apple on 3/15/2020", [("2020-03-15", "2020-03-15")]),
+    ("Apple close on March 15th, 2020", [("2020-03-15", "2020-03-15")]),
+    ("Apple close on 15 March 2020", [("2020-03-15", "2020-03-15")]),
+    ("Apple in March 2020", [("2020-03-01", "2020-03-31")]),
+    ("Apple price for March 2020", [("2020-03-01", "2020-03-31")]),
+    ("Month-end Feb 2024 close", [("2024-02-01", "2024-02-29")]),
+    # Open and closed ranges
+    ("Apple since March 2020", [("2020-03-01", "2024-06-28")]),
+    ("Apple since 2020", [("2020-01-01", "2024-06-28")]),
+    ("Apple from 2020 on", [("2020-01-01", "2024-06-28")]),
+    ("Apple from 2019 to 2021", [("2019-01-01", "2021-12-31")]),
+    ("Apple between 2020-01-15 and March 2020", [("2020-01-15", "2020-03-31")]),
+    ("Apple from 2024-06-01 to 2024-12-31", [("2024-06-01", "2024-06-28")]),
+    # Bare years
+    ("Apple in 2020", [("2020-01-01", "2020-12-31")]),
+    ("How did Apple do in 2020?", [("2020-01-01", "2020-12-31")]),
+    ("Apple in 2020 vs 2021", [("2020-01-01", "2020-12-31")]),
+    ("Apple during 2008 crisis", [("2008-01-01", "2008-12-31")]),
+    ("Apple throughout 2022", [("2022-01-01", "2022-12-31")]),
+    # Several expressions, in order
+    ("Apple 1 year ago and yesterday", [("2023-06-28", "2023-06-28"), ("2024-06-27", "2024-06-27")]),
+    # Counts, not years
+    ("Apple price for 2000 shares", []),
+    ("What would I pay for 2000 shares of Tesla?", []),
+    ("Buy in 2000 shares of Apple", []),
+    ("Apple revenue from 2000 stores", []),
+    ("Apple price for 2020", []),
+    # Nothing to parse, impossible or future dates
+    ("What is the price of Apple?", []),
+    ("Apple on 2020-02-30", []),
+    ("Apple in 2030", []),
+    ("Apple on 13/45/2020", []),
+]
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_parse_date_ranges(text, expected):
+    assert parse_date_ranges(text, today=TODAY) == expected
@@ -0,0 +1,61 @@
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+from tracing import span
+
+# -----------------------------------------
+# **🔹 PER-STAGE TIMING**
+# -----------------------------------------
+
+# Stage timings of the request being handled, or None outside a timed request
+_timings = contextvars.ContextVar("stage_timings", default=None)
+
+# Callbacks fn(stage, seconds) fed every completed stage (e.g. metrics exporters)
+_sinks = []
+
+
+def add_sink(fn):
+    _sinks.append(fn)
+
+
+@contextmanager
+def timed_request():
+    """Collects the stages run in this context; yields {stage: total seconds}."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Times a pipeline stage; repeated stages in one request are summed.
+
+    Each stage is also a tracing span, so stages nest in request traces.
+    """
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+        for sink in _sinks:
+            sink(name, elapsed)
+
+
+def timed(name):
+    """Decorator form of stage() for functions that are a stage on their own."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,362 @@
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# **🔹 TRACING CONFIGURATION**
+# -----------------------------------------
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "rag-finance")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))  # Fraction of traces exported
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")  # JSON lines, one span per line
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL", "")  # OTLP/HTTP JSON, e.g. http://localhost:4318/v1/traces
+# Traces slower than this percentile of recent requests are kept whole, sampled or not, in
+# this JSON-lines file (off by default; point it into a log directory, e.g. /var/log/rag/slow_traces.jsonl)
+TRACE_SLOW_LOG = os.getenv("TRACE_SLOW_LOG", "")
+TRACE_SLOW_PERCENTILE = float(os.getenv("TRACE_SLOW_PERCENTILE", "99"))
+TRACE_SLOW_MIN_SAMPLES = int(os.getenv("TRACE_SLOW_MIN_SAMPLES", "100"))
+MAX_SPANS_PER_TRACE = 2000
+
+# -----------------------------------------
+# **🔹 SPANS**
+# -----------------------------------------
+
+class SpanContext:
+    """Identity of a span that may live in another process (from a traceparent header)."""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "root_id", "sampled",
+                 "start_ns", "end_ns", "_t0", "attributes", "status", "thread")
+
+    def __init__(self, name, trace_id, parent_id, root_id, sampled, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.root_id = root_id or self.span_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.status = None  # None for OK, else the error message
+        self.thread = threading.current_thread().name
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        self.end_ns = None
+
+    @property
+    def is_local_root(self):
+        return self.root_id == self.span_id
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._t0)
+
+    def to_dict(self):
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "name": self.name, "start_ns": self.start_ns, "end_ns": self.end_ns,
+                "duration_ms": self.duration_ms, "thread": self.thread,
+                "attributes": self.attributes, "status": self.status}
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span():
+    return _current.get()
+
+
+def set_attribute(key, value):
+    """Annotates the current span, if any."""
+    s = _current.get()
+    if s is not None:
+        s.attributes[key] = value
+
+
+@contextmanager
+def span(name, parent=None, **attributes):
+    """Starts a child of the current span (or of `parent`, a remote SpanContext).
+
+    With no current span this is a local root: its finished spans are buffered
+    and, when it ends, exported if the trace was sampled or is in the slow tail.
+    """
+    if not TRACE_ENABLED:
+        yield _NOOP
+        return
+    current = _current.get()
+    if current is not None:
+        s = Span(name, current.trace_id, current.span_id, current.root_id, current.sampled, attributes)
+    elif parent is not None:
+        s = Span(name, parent.trace_id, parent.span_id, None, parent.sampled, attributes)
+    else:
+        s = Span(name, f"{random.getrandbits(128):032x}", None, None,
+                 random.random() < TRACE_SAMPLE_RATE, attributes)
+    if s.is_local_root:
+        _collector.begin(s)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+        _collector.finish(s)
+
+
+def traced(name=None, **attributes):
+    """Decorator form of span(); the span is named after the function by default."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# -----------------------------------------
+# **🔹 CONTEXT PROPAGATION**
+# -----------------------------------------
+
+def submit(executor, fn, *args):
+    """executor.submit() that runs fn in a copy of the caller's context, so spans nest correctly.
+
+    A fresh copy is taken per call: one Context cannot be entered by two threads at once.
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def inject():
+    """Returns a W3C traceparent for the current span, for child processes or outgoing calls."""
+    s = _current.get()
+    if s is None:
+        return None
+    return f"00-{s.trace_id}-{s.span_id}-{'01' if s.sampled else '00'}"
+
+
+def extract(traceparent):
+    """Parses a traceparent header into a SpanContext; None if absent or malformed."""
+    try:
+        version, trace_id, span_id, flags = traceparent.strip().split("-")
+        if len(trace_id) != 32 or len(span_id) != 16:
+            return None
+        int(trace_id, 16), int(span_id, 16)
+        return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+    except (AttributeError, ValueError):
+        return None
+
+# -----------------------------------------
+# **🔹 COLLECTION & SLOW-TAIL DETECTION**
+# -----------------------------------------
+
+class TraceCollector:
+    """Buffers each local trace until its root ends, then hands it to the exporter.
+
+    Root durations feed a rolling window per root name (requests and
+    background jobs are judged separately); a trace at or above its window's
+    TRACE_SLOW_PERCENTILE is written whole to TRACE_SLOW_LOG (when set) as a nested tree.
+    Spans that end after their root (abandoned hedges, background prose)
+    are exported on their own if the trace was sampled.
+    """
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.window = window
+        self.active = {}  # local root span id -> finished spans
+        self.durations = {}  # root span name -> recent durations in ms
+        self.slow_traces = 0
+
+    def begin(self, root):
+        with self.lock:
+            self.active[root.span_id] = []
+
+    def finish(self, s):
+        with self.lock:
+            spans = self.active.get(s.root_id)
+            if spans is not None and len(spans) < MAX_SPANS_PER_TRACE:
+                spans.append(s)
+            if s.is_local_root:
+                self.active.pop(s.span_id, None)
+                durations = self.durations.setdefault(s.name, deque(maxlen=self.window))
+                threshold = self._threshold(durations)
+                durations.append(s.duration_ms)
+        if not s.is_local_root:
+            if spans is None and s.sampled:
+                _exporter.export([s])
+            return
+        slow = threshold is not None and s.duration_ms >= threshold
+        if s.sampled:
+            _exporter.export(spans)
+        if slow:
+            with self.lock:
+                self.slow_traces += 1
+            _exporter.export_slow(spans, threshold)
+
+    @staticmethod
+    def _threshold(durations):
+        if len(durations) < TRACE_SLOW_MIN_SAMPLES:
+            return None
+        ordered = sorted(durations)
+        return ordered[min(len(ordered) - 1, int(TRACE_SLOW_PERCENTILE / 100.0 * len(ordered)))]
+
+    def stats(self):
+        with self.lock:
+            return {"active_traces": len(self.active), "slow_traces": self.slow_traces,
+                    "slow_threshold_ms": {name: self._threshold(d) for name, d in self.durations.items()}}
+
+# -----------------------------------------
+# **🔹 EXPORT**
+# -----------------------------------------
+
+def build_tree(spans):
+    """Nests spans under their parents; spans whose parent is missing become roots."""
+    nodes = {s.span_id: dict(s.to_dict(), children=[]) for s in spans}
+    roots = []
+    for s in sorted(spans, key=lambda s: s.start_ns):
+        node = nodes[s.span_id]
+        parent = nodes.get(s.parent_id)
+        (parent["children"] if parent else roots).append(node)
+    return roots
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans):
+    """OTLP/HTTP JSON body for a batch of spans."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name",
+                                     "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [{
+            "traceId": s.trace_id, "spanId": s.span_id, "parentSpanId": s.parent_id or "",
+            "name": s.name, "kind": 1,
+            "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.status} if s.status else {"code": 1},
+        } for s in spans]}],
+    }]}
+
+
+class SpanExporter:
+    """Writes finished traces from a background thread so request threads never do I/O."""
+
+    def __init__(self, path=TRACE_EXPORT_FILE, url=TRACE_EXPORT_URL, slow_path=TRACE_SLOW_LOG):
+        self.path = path
+        self.url = url
+        self.slow_path = slow_path
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self.thread.start()
+                    atexit.register(self.flush)
+
+    def export(self, spans):
+        if spans and (self.path or self.url):
+            self._ensure_started()
+            self.queue.put(("spans", spans, None))
+
+    def export_slow(self, spans, threshold_ms):
+        if spans and self.slow_path:
+            self._ensure_started()
+            self.queue.put(("slow", spans, threshold_ms))
+
+    def flush(self, timeout=5.0):
+        if self.thread is None:
+            return
+        done = threading.Event()
+        self.queue.put(("flush", done, None))
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            kind, payload, extra = self.queue.get()
+            try:
+                if kind == "flush":
+                    payload.set()
+                elif kind == "spans":
+                    self._write_spans(payload)
+                else:
+                    self._write_slow(payload, extra)
+            except Exception as e:
+                logger.warning("Trace export failed: %s", e)
+
+    def _write_spans(self, spans):
+        if self.path:
+            with open(self.path, "a") as f:
+                for s in spans:
+                    f.write(json.dumps(s.to_dict(), default=str) + "\n")
+        if self.url:
+            import requests
+            requests.post(self.url, json=json.loads(json.dumps(to_otlp(spans), default=str)), timeout=5)
+
+    def _write_slow(self, spans, threshold_ms):
+        root = next((s for s in spans if s.is_local_root), spans[-1])
+        entry = {"trace_id": root.trace_id, "name": root.name, "duration_ms": root.duration_ms,
+                 "threshold_ms": threshold_ms, "tree": build_tree(spans)}
+        with open(self.slow_path, "a") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+
+
+_collector = TraceCollector()
+_exporter = SpanExporter()
+
+
+def _reset_after_fork():
+    # Forked workers start with no exporter thread and none of the parent's in-flight traces
+    global _collector, _exporter
+    _exporter.thread = None  # Its atexit flush must not wait on the parent's thread
+    _collector = TraceCollector()
+    _exporter = SpanExporter()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def trace_stats():
+    return _collector.stats()